@@ -0,0 +1,211 @@
+import os
+
+import cv2
+import numpy as np
+
+from metrics import metrics
+
+
+PERSON_CLASS = 0  # COCO index of "person"
+
+
+# Resize keeping the aspect ratio and pad to a size x size square (same as the ultralytics letterbox).
+# Returns the padded image, the scale ratio and the (left, top) padding.
+def letterbox(image, size=640, color=(114, 114, 114)):
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    new_width, new_height = round(width * ratio), round(height * ratio)
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_width) / 2, (size - new_height) / 2
+    left, right = round(pad_x - 0.1), round(pad_x + 0.1)
+    top, bottom = round(pad_y - 0.1), round(pad_y + 0.1)
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, ratio, (left, top)
+
+
+# Class-agnostic NMS on xyxy boxes, returns the indices to keep
+def nms(boxes, scores, iou_threshold=0.7):
+    if len(boxes) == 0:
+        return np.empty((0,), dtype=np.int64)
+    xywh = np.column_stack([boxes[:, 0], boxes[:, 1], boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]])
+    keep = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), 0.0, iou_threshold)
+    return np.asarray(keep, dtype=np.int64).reshape(-1)
+
+
+# Common interface of the inference backends.
+# detect() returns an (N, 4) int32 xyxy box array and an (N,) float32 confidence array of people only,
+# detect_batch() returns one such pair per frame, in order.
+class InferenceBackend:
+    name = "base"
+
+    def detect(self, frame, confidence_threshold):
+        raise NotImplementedError
+
+    def detect_batch(self, frames, confidence_threshold):
+        return [self.detect(frame, confidence_threshold) for frame in frames]
+
+    @staticmethod
+    def empty():
+        return np.empty((0, 4), dtype=np.int32), np.empty((0,), dtype=np.float32)
+
+    # Forget per-source state, if any (e.g. the motion state of tiling.TiledBackend)
+    def reset(self):
+        pass
+
+    # Release worker processes or sessions, if any
+    def close(self):
+        pass
+
+
+# PyTorch model through the ultralytics runtime, which does its own letterbox and NMS
+class UltralyticsBackend(InferenceBackend):
+    name = "pytorch"
+
+    def __init__(self, model_file="yolov8n.pt", half=False, person_label="person"):
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_file)
+        self.half = half
+        # Let the model drop every other class before NMS
+        self.classes = [i for i, name in self.model.names.items() if name == person_label] or [PERSON_CLASS]
+
+    def detect(self, frame, confidence_threshold):
+        return self.detect_batch([frame], confidence_threshold)[0]
+
+    # A list input is run by ultralytics as one batch
+    def detect_batch(self, frames, confidence_threshold):
+        options = {"half": True} if self.half else {}
+        with metrics.time("inference"):
+            results = self.model(list(frames), classes=self.classes, conf=confidence_threshold, verbose=False,
+                                 **options)
+        detections = []
+        with metrics.time("postprocess"):
+            for result in results:
+                data = result.boxes.data.cpu().numpy()  # x1, y1, x2, y2, conf, cls
+                mask = data[:, 4] > confidence_threshold
+                detections.append((data[mask, :4].astype(np.int32), data[mask, 4].astype(np.float32)))
+        return detections
+
+
+# Exported YOLOv8 ONNX graph, run with onnxruntime when it is installed and cv2.dnn otherwise.
+# Frames are treated like ultralytics treats numpy input (BGR, swapped to RGB for the network).
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+
+    def __init__(self, onnx_file="yolov8n.onnx", input_size=640, iou_threshold=0.7, runtime="auto",
+                 person_class=PERSON_CLASS):
+        self.input_size = input_size
+        self.iou_threshold = iou_threshold
+        self.person_class = person_class
+
+        try:
+            import onnxruntime
+        except ImportError:
+            onnxruntime = None
+
+        if runtime == "auto":
+            runtime = "onnxruntime" if onnxruntime is not None else "opencv"
+        self.runtime = runtime
+        if runtime == "onnxruntime":
+            if onnxruntime is None:
+                raise ImportError("onnxruntime is not installed")
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self.session = onnxruntime.InferenceSession(onnx_file, options, providers=["CPUExecutionProvider"])
+            self.input_name = self.session.get_inputs()[0].name
+            # Graphs exported with dynamic=True accept any batch size
+            self.dynamic_batch = not isinstance(self.session.get_inputs()[0].shape[0], int)
+        else:
+            self.dynamic_batch = False
+            self.net = cv2.dnn.readNetFromONNX(onnx_file)
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def detect(self, frame, confidence_threshold):
+        image, ratio, (left, top) = letterbox(frame, self.input_size)
+        blob = cv2.dnn.blobFromImage(image, 1 / 255.0, swapRB=True)
+        with metrics.time("inference"):
+            if self.runtime == "onnxruntime":
+                output = self.session.run(None, {self.input_name: blob})[0]
+            else:
+                self.net.setInput(blob)
+                output = self.net.forward()
+        with metrics.time("postprocess"):
+            return self.postprocess(output[0], confidence_threshold, ratio, left, top, frame.shape)
+
+    # One session run for the whole batch when the graph has a dynamic batch axis, else frame by frame
+    def detect_batch(self, frames, confidence_threshold):
+        if not self.dynamic_batch:
+            return super().detect_batch(frames, confidence_threshold)
+        letterboxed = [letterbox(frame, self.input_size) for frame in frames]
+        blob = cv2.dnn.blobFromImages([image for image, _, _ in letterboxed], 1 / 255.0, swapRB=True)
+        with metrics.time("inference"):
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+        with metrics.time("postprocess"):
+            return [self.postprocess(output, confidence_threshold, ratio, left, top, frame.shape)
+                    for output, frame, (_, ratio, (left, top)) in zip(outputs, frames, letterboxed)]
+
+    # output is (4 + classes, anchors): cx, cy, w, h followed by the class scores
+    def postprocess(self, output, confidence_threshold, ratio, left, top, shape):
+        scores = output[4 + self.person_class]
+        mask = scores > confidence_threshold
+        if not mask.any():
+            return self.empty()
+        cx, cy, w, h = output[:4, mask]
+        scores = scores[mask]
+        boxes = np.column_stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+        keep = nms(boxes, scores, self.iou_threshold)
+        boxes, scores = boxes[keep], scores[keep]
+
+        boxes -= (left, top, left, top)
+        boxes /= ratio
+        height, width = shape[:2]
+        np.clip(boxes, 0, (width, height, width, height), out=boxes)
+        return boxes.astype(np.int32), scores.astype(np.float32)
+
+
+# Export the PyTorch weights to ONNX next to the .pt file (once), optionally with
+# dynamically quantized int8 weights, and return the path of the ONNX graph
+def export_onnx(model_file="yolov8n.pt", input_size=640, quantize=False):
+    onnx_file = os.path.splitext(model_file)[0] + ".onnx"
+    if not os.path.exists(onnx_file):
+        from ultralytics import YOLO
+
+        onnx_file = YOLO(model_file).export(format="onnx", imgsz=input_size)
+    if not quantize:
+        return onnx_file
+
+    quantized_file = os.path.splitext(onnx_file)[0] + "_int8.onnx"
+    if not os.path.exists(quantized_file):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(onnx_file, quantized_file, weight_type=QuantType.QUInt8)
+    return quantized_file
+
+
+BACKENDS = ("pytorch", "pytorch-half", "onnx", "onnx-opencv", "onnx-int8")
+
+
+# Build a backend by name for the given PyTorch weights file.
+# With processes > 0 the backend runs in that many worker processes (process_pool.ProcessPoolBackend).
+def create_backend(name="pytorch", model_file="yolov8n.pt", input_size=640, processes=0):
+    if processes:
+        from process_pool import ProcessPoolBackend
+
+        return ProcessPoolBackend(name, model_file, processes, input_size)
+    if name == "pytorch":
+        backend = UltralyticsBackend(model_file)
+    elif name == "pytorch-half":
+        # FP16 needs a CUDA device in PyTorch, on CPU ultralytics falls back to FP32
+        backend = UltralyticsBackend(model_file, half=True)
+    elif name == "onnx":
+        backend = OnnxBackend(export_onnx(model_file, input_size), input_size)
+    elif name == "onnx-opencv":
+        backend = OnnxBackend(export_onnx(model_file, input_size), input_size, runtime="opencv")
+    elif name == "onnx-int8":
+        backend = OnnxBackend(export_onnx(model_file, input_size, quantize=True), input_size, runtime="onnxruntime")
+    else:
+        raise ValueError(f"Unknown inference backend: {name}")
+    backend.name = name
+    return backend
@@ -0,0 +1,65 @@
+# Detection throughput against batch size on a video file.
+#
+#   python benchmarks/batch_throughput.py --video sample.mp4 --batch-sizes 1 2 4 8 16
+#
+# Without --video a synthetic 720p video panning over Images/ is generated.
+# Decoding runs on the prefetch thread, overlapped with inference, as in PeopleDetection.detect_batches.
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+
+from common import make_synthetic_video
+
+from backends import BACKENDS, create_backend
+from detection import PeopleDetection
+from pipeline import iter_frames
+
+
+def run(people, video, batch_size, max_frames):
+    capture = cv2.VideoCapture(video)
+    frames = 0
+    people_found = 0
+    start = time.perf_counter()
+    results = people.detect_batches(iter_frames(capture, lambda frame: cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)),
+                                    batch_size)
+    for _, boxes, _ in results:
+        frames += 1
+        people_found += len(boxes)
+        if frames >= max_frames:
+            break
+    results.close()
+    elapsed = time.perf_counter() - start
+    capture.release()
+    return frames, elapsed, people_found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--video")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--backend", default="pytorch", choices=BACKENDS)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--frames", type=int, default=120)
+    args = parser.parse_args()
+
+    video = args.video
+    if video is None:
+        video = make_synthetic_video(os.path.join(tempfile.mkdtemp(), "synthetic.avi"), args.frames)
+
+    people = PeopleDetection(args.model, backend=create_backend(args.backend, args.model))
+    run(people, video, 1, 2)  # warm up
+
+    print(f"{'batch':>6}{'frames':>8}{'seconds':>10}{'FPS':>10}{'ms/frame':>10}{'people':>8}")
+    for batch_size in args.batch_sizes:
+        frames, elapsed, people_found = run(people, video, batch_size, args.frames)
+        print(f"{batch_size:>6}{frames:>8}{elapsed:>10.2f}{frames / elapsed:>10.2f}"
+              f"{elapsed * 1000 / max(frames, 1):>10.1f}{people_found:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+# Helpers shared by the benchmark scripts
+import glob
+import os
+import sys
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+IMAGES = os.path.join(ROOT, "Images")
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+# The sample images as (file name, RGB array) pairs
+def load_images(pattern=os.path.join(IMAGES, "*")):
+    images = []
+    for path in sorted(glob.glob(pattern)):
+        image = cv2.imread(path)
+        if image is not None:
+            images.append((os.path.basename(path), cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+    return images
+
+
+# Write a video that slowly pans across the sample images, so it has real people and motion
+def make_synthetic_video(path, frames=120, size=(1280, 720), fps=30.0):
+    width, height = size
+    images = [cv2.cvtColor(image, cv2.COLOR_RGB2BGR) for _, image in load_images()]
+    if not images:
+        images = [np.full((height, width, 3), 127, dtype=np.uint8)]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    per_image = max(frames // len(images), 1)
+    for index in range(frames):
+        image = images[min(index // per_image, len(images) - 1)]
+        scale = max(width / image.shape[1], height / image.shape[0]) * 1.2
+        resized = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+        offset = int((resized.shape[1] - width) * (index % per_image) / per_image)
+        top = (resized.shape[0] - height) // 2
+        writer.write(np.ascontiguousarray(resized[top:top + height, offset:offset + width]))
+    writer.release()
+    return path
@@ -0,0 +1,81 @@
+# Parity check and latency comparison of the inference backends on the sample images.
+#
+#   python benchmarks/compare_backends.py --model yolov8n.pt --backends pytorch onnx onnx-opencv onnx-int8
+#
+# The first backend is the reference: every other backend must find the same people
+# (boxes matched by IoU >= --parity-iou, same count) on every image, otherwise the exit code is 1.
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from common import IMAGES, load_images
+
+from backends import BACKENDS, create_backend
+from tracking import box_iou
+
+
+def boxes_match(reference, boxes, min_iou):
+    if len(reference) != len(boxes):
+        return False
+    if len(reference) == 0:
+        return True
+    iou = box_iou(reference, boxes)
+    return bool((iou.max(axis=1) >= min_iou).all() and (iou.max(axis=0) >= min_iou).all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "onnx", "onnx-opencv"], choices=BACKENDS)
+    parser.add_argument("--images", default=os.path.join(IMAGES, "*"))
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--confidence", type=float, default=0.7)
+    parser.add_argument("--parity-iou", type=float, default=0.9)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"No images found for {args.images}")
+        return 1
+
+    reference = None
+    parity_ok = True
+    print(f"{'backend':<14}{'load s':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'people':>8}  parity")
+    for name in args.backends:
+        start = time.perf_counter()
+        try:
+            backend = create_backend(name, args.model)
+        except Exception as e:
+            print(f"{name:<14}skipped: {e}")
+            continue
+        load_s = time.perf_counter() - start
+
+        detections = [backend.detect(image, args.confidence) for _, image in images]  # also warms up
+        latencies = []
+        for _ in range(args.runs):
+            for _, image in images:
+                start = time.perf_counter()
+                backend.detect(image, args.confidence)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        if reference is None:
+            reference = detections
+            parity = "reference"
+        else:
+            mismatched = [file_name for (file_name, _), (ref_boxes, _), (boxes, _)
+                          in zip(images, reference, detections)
+                          if not boxes_match(ref_boxes, boxes, args.parity_iou)]
+            parity = "ok" if not mismatched else "MISMATCH " + ", ".join(mismatched)
+            parity_ok = parity_ok and not mismatched
+
+        people = sum(len(boxes) for boxes, _ in detections)
+        print(f"{name:<14}{load_s:>8.2f}{np.mean(latencies):>10.1f}{np.percentile(latencies, 50):>10.1f}"
+              f"{np.percentile(latencies, 95):>10.1f}{people:>8}  {parity}")
+    return 0 if parity_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
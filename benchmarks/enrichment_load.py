@@ -0,0 +1,107 @@
+# End-to-end enrichment throughput and latency against the local mock server (or a real one with --url).
+#
+#   python benchmarks/enrichment_load.py --jobs 400 --batch-sizes 1 2 4 8 --latency 0.1 --per-crop-latency 0.01
+#
+# Person-sized crops cut from Images/ go through EnrichmentPool exactly as in the application
+# (crop encoding, multipart upload, response parsing). Latency is measured from submit until the
+# result (or the failure) was handed back. Jobs are submitted at --rate per second, or all at once.
+import argparse
+import sys
+import threading
+import time
+
+import numpy as np
+
+from common import load_images
+
+import detection
+from detection import JsonRead, PersonJob, enrich_people, enrich_person, upload_batches_supported
+from enrichment import DropPolicy, EnrichmentPool
+from mock_server import MockServer
+
+
+def make_crops(count, size=(160, 320), seed=0):
+    rng = np.random.default_rng(seed)
+    images = [image for _, image in load_images()] or [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8)]
+    width, height = size
+    crops = []
+    for i in range(count):
+        image = images[i % len(images)]
+        if image.shape[0] < height or image.shape[1] < width:
+            image = np.resize(image, (max(height, image.shape[0]), max(width, image.shape[1]), 3))
+        y = rng.integers(0, image.shape[0] - height + 1)
+        x = rng.integers(0, image.shape[1] - width + 1)
+        crops.append(np.ascontiguousarray(image[y:y + height, x:x + width]))
+    return crops
+
+
+def run(crops, workers, batch_size, rate):
+    JsonRead.batch_supported = None
+    submitted = {}
+    latencies = []
+    lock = threading.Lock()
+
+    def done(job):
+        with lock:
+            latencies.append(time.perf_counter() - submitted[job.track_id])
+
+    pool = EnrichmentPool(enrich_person, lambda job, attributes: None, workers=workers, queue_size=len(crops),
+                          policy=DropPolicy.BLOCK, timeout=detection.REQUEST_TIMEOUT,
+                          retries=detection.REQUEST_RETRIES, on_done=done, batch_handler=enrich_people,
+                          batch_size=batch_size, batch_enabled=upload_batches_supported)
+    pool.start()
+    start = time.perf_counter()
+    for i, crop in enumerate(crops):
+        if rate:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        submitted[i] = time.perf_counter()
+        pool.submit(PersonJob(i, crop))
+    pool.join()
+    elapsed = time.perf_counter() - start
+    pool.stop()
+    return elapsed, np.array(latencies) * 1000, pool.completed, pool.failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrichment throughput and latency against a mock server")
+    parser.add_argument("--url", help="use this server instead of starting the mock")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=detection.ENRICHMENT_WORKERS)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--rate", type=float, default=0, help="jobs submitted per second (0 = all at once)")
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--per-crop-latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-batch", action="store_true", help="mock a server that only accepts single crops")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        detection.server_url = args.url
+    else:
+        server = MockServer(latency=args.latency, per_crop_latency=args.per_crop_latency, jitter=args.jitter,
+                            error_rate=args.error_rate, batching=not args.no_batch, seed=0).start()
+        detection.server_url = server.url
+    crops = make_crops(args.jobs)
+
+    print(f"{args.jobs} crops, {args.workers} workers against {detection.server_url}")
+    print(f"{'batch':>6}{'seconds':>9}{'crops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'failed':>8}{'requests':>10}")
+    try:
+        for batch_size in args.batch_sizes:
+            requests_before = server.requests if server else 0
+            elapsed, latencies, completed, failed = run(crops, args.workers, batch_size, args.rate)
+            requests = server.requests - requests_before if server else "-"
+            print(f"{batch_size:>6}{elapsed:>9.2f}{completed / elapsed:>9.1f}{np.percentile(latencies, 50):>9.1f}"
+                  f"{np.percentile(latencies, 95):>9.1f}{np.percentile(latencies, 99):>9.1f}{failed:>8}"
+                  f"{requests:>10}")
+    finally:
+        if server is not None:
+            server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# Per-frame allocations of the GUI frame path (capture -> preprocess -> annotate -> preview image),
+# before and after the buffers were pooled.
+#
+#   python benchmarks/frame_allocations.py --frames 300 --size 1280x720
+#
+# The detector is a stub with fixed boxes, so only the frame handling is measured. Python and numpy
+# allocations are traced with tracemalloc; the QImage copy of the old path is a Qt allocation that
+# tracemalloc cannot see, it is listed in its own column.
+import argparse
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import cv2
+import numpy as np
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import QApplication
+
+from common import load_images
+
+from detection import PeopleDetection
+from pipeline import BufferPool
+from rendering import PreviewRenderer
+
+PREVIEW_SIZE = (1024, 768)
+BOXES = np.array([[100, 80, 300, 500], [400, 120, 620, 560], [700, 60, 900, 520]], dtype=np.int32)
+
+
+# Stands in for cv2.VideoCapture, decoding into the caller's buffer when one is given
+class StillCapture:
+    def __init__(self, frame):
+        self.frame = frame
+
+    def read(self, image=None):
+        if image is None or image.shape != self.frame.shape:
+            return True, self.frame.copy()
+        np.copyto(image, self.frame)
+        return True, image
+
+
+def annotate(frame):
+    for i, box in enumerate(BOXES):
+        PeopleDetection.draw_box(frame, box, f"#{i} person")
+    return frame
+
+
+# The frame path as it was: new arrays from the capture, flip and cvtColor, a detached QImage copy per frame.
+# The video preview was then scaled by the QLabel on the GUI thread, which is not included here.
+def old_path(capture, mode):
+    _, frame = capture.read()
+    frame = cv2.flip(frame, 1)
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    frame = annotate(frame)
+    height, width, channel = frame.shape
+    q_image = QImage(frame.data, width, height, channel * width, QImage.Format.Format_RGB888)
+    if mode == "image":
+        q_image = q_image.scaled(*PREVIEW_SIZE, Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+    else:
+        q_image = q_image.copy()
+    return QPixmap.fromImage(q_image)
+
+
+def make_new_path():
+    buffers = BufferPool()
+    renderer = PreviewRenderer(*PREVIEW_SIZE, buffers)
+    state = {"raw": None}
+
+    def new_path(capture, mode):
+        _, raw = capture.read(state["raw"])
+        state["raw"] = raw
+        frame = buffers.acquire(raw.shape)
+        cv2.cvtColor(raw, cv2.COLOR_BGR2RGB, dst=frame)
+        cv2.flip(frame, 1, dst=frame)
+        annotate(frame)
+        q_image, preview = renderer.render(frame)
+        buffers.release(frame)
+        pixmap = QPixmap.fromImage(q_image)
+        renderer.release(preview)
+        return pixmap
+
+    return new_path, buffers
+
+
+# Steady-state traced bytes per frame after `warmup` frames (peak above the baseline of each frame)
+def measure(path, capture, frames, warmup=10, mode="video"):
+    for _ in range(warmup):
+        path(capture, mode)
+    tracemalloc.start()
+    allocated = 0
+    start = time.perf_counter()
+    for _ in range(frames):
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        path(capture, mode)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - base
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return allocated / frames, elapsed * 1000 / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame allocations of the GUI frame path")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--size", default="1280x720", help="source frame size, WIDTHxHEIGHT")
+    args = parser.parse_args()
+
+    app = QApplication([])
+    width, height = (int(v) for v in args.size.split("x"))
+    images = load_images()
+    source = images[0][1] if images else np.full((height, width, 3), 127, dtype=np.uint8)
+    capture = StillCapture(np.ascontiguousarray(cv2.resize(source, (width, height))))
+    new_path, buffers = make_new_path()
+
+    print(f"{args.frames} frames of {width}x{height}, preview {PREVIEW_SIZE[0]}x{PREVIEW_SIZE[1]}")
+    print(f"{'path':<10}{'KiB/frame':>12}{'Qt copy KiB':>13}{'ms/frame':>10}")
+    for name, path, qt_copy in (("old", old_path, width * height * 3 / 1024), ("pooled", new_path, 0)):
+        allocated, ms = measure(path, capture, args.frames)
+        print(f"{name:<10}{allocated / 1024:>12.1f}{qt_copy:>13.1f}{ms:>10.2f}")
+    print(f"Pooled buffers allocated: {buffers.allocated}")
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
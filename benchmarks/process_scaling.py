@@ -0,0 +1,80 @@
+# Detection throughput against the number of inference worker processes.
+#
+#   python benchmarks/process_scaling.py --video sample.mp4 --processes 0 1 2 4 8 --size 1920x1080
+#
+# 0 runs the backend in this process. Without --video a synthetic video panning over Images/ is
+# generated at --size. Frames are decoded once up front, so only inference and the shared memory
+# transport are measured; each pool gets two frames per worker per call to keep every worker busy.
+# The boxes of every pool are compared against the in-process backend.
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from common import make_synthetic_video
+
+from backends import BACKENDS, create_backend
+from detection import CONFIDENCE_THRESHOLD
+from pipeline import iter_frames
+
+
+def run(backend, frames, batch_size):
+    detections = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        detections.extend(backend.detect_batch(frames[i:i + batch_size], CONFIDENCE_THRESHOLD))
+    return time.perf_counter() - start, detections
+
+
+def same(reference, detections):
+    return all(np.array_equal(a[0], b[0]) for a, b in zip(reference, detections))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection throughput against inference worker processes")
+    parser.add_argument("--video")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--backend", default="pytorch", choices=BACKENDS)
+    parser.add_argument("--processes", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--size", default="1920x1080", help="synthetic video size, WIDTHxHEIGHT")
+    args = parser.parse_args()
+
+    video = args.video
+    if video is None:
+        size = tuple(int(v) for v in args.size.split("x"))
+        video = make_synthetic_video(os.path.join(tempfile.mkdtemp(), "synthetic.avi"), args.frames, size)
+    capture = cv2.VideoCapture(video)
+    frames = list(iter_frames(capture, lambda frame: cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))[:args.frames]
+    capture.release()
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames of {width}x{height}, {os.cpu_count()} CPUs")
+
+    reference = None
+    baseline = None
+    print(f"{'processes':>10}{'start s':>9}{'seconds':>10}{'FPS':>10}{'speedup':>9}{'same boxes':>12}")
+    for processes in args.processes:
+        start = time.perf_counter()
+        backend = create_backend(args.backend, args.model, processes=processes)
+        startup = time.perf_counter() - start
+        batch_size = 2 * processes if processes else 1
+        try:
+            run(backend, frames[:batch_size], batch_size)  # warm up
+            elapsed, detections = run(backend, frames, batch_size)
+        finally:
+            backend.close()
+        if reference is None:
+            reference = detections
+        fps = len(frames) / elapsed
+        baseline = baseline or fps
+        print(f"{processes:>10}{startup:>9.1f}{elapsed:>10.2f}{fps:>10.2f}{fps / baseline:>9.2f}"
+              f"{str(same(reference, detections)):>12}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# GUI startup time: time to the first window and time to the first annotated frame.
+#
+#   python benchmarks/startup.py --runs 5
+#
+# Every run starts a fresh interpreter (so module imports are measured too) that opens the main window
+# offscreen, waits until the model is loaded and then shows one of the sample images, like a user
+# clicking File as soon as the button is enabled. Times are measured from before the interpreter starts.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import IMAGES, ROOT
+
+
+def child(start, image):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    sys.path.insert(0, ROOT)
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+
+    import group1_final
+
+    app = QApplication(sys.argv)
+    window = group1_final.MainWindow()
+    window.show()
+    app.processEvents()
+    times = {"window": time.time() - start}
+
+    def model_ready():
+        times["model"] = time.time() - start
+        window._displayImage(image)
+
+    def frame_ready():
+        times["first_frame"] = time.time() - start
+        QTimer.singleShot(0, app.quit)
+
+    window.modelReady.connect(model_ready)
+    # Queued after MainWindow._showLatestFrame, so the frame is on the label
+    window.frameReady.connect(frame_ready)
+    window.modelFailed.connect(lambda error: app.quit())
+    QTimer.singleShot(300000, app.quit)
+    app.exec()
+    window.close()
+    print(json.dumps(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GUI time to first window and to first annotated frame")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--image", default=os.path.join(IMAGES, sorted(os.listdir(IMAGES))[0]))
+    parser.add_argument("--child", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        child(args.child, args.image)
+        return 0
+
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, __file__, "--image", args.image, "--child", repr(time.time())],
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'':<14}{'median s':>10}{'min s':>8}{'max s':>8}")
+    for key, name in (("window", "first window"), ("model", "model ready"), ("first_frame", "first frame")):
+        values = [result[key] for result in results if key in result]
+        if values:
+            print(f"{name:<14}{statistics.median(values):>10.2f}{min(values):>8.2f}{max(values):>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
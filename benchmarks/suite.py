@@ -0,0 +1,306 @@
+# Reproducible CPU-only benchmark suite, no network needed. Results go to a JSON file that later runs
+# compare against to catch regressions, e.g. after an ultralytics upgrade or a config change.
+#
+#   python benchmarks/suite.py --output baseline.json
+#   python benchmarks/suite.py --output results.json --baseline baseline.json
+#   python benchmarks/suite.py --load results.json --baseline baseline.json   # compare saved results only
+#
+# Benchmarks (--only selects some of them):
+#   cropping             PeopleDetection.cropping on the sample images
+#   annotate_images      PeopleDetection.detect_and_annotate on the sample images
+#   annotate_video       PeopleDetection.detect_and_annotate on a synthetic video panning across the images
+#   crop_encoding        CropEncoder.encode on person-sized crops
+#   send_image           JsonRead.send_image_get_response against the local mock server (encode, upload, parse)
+#   preview_render       PreviewRenderer.render plus the QPixmap conversion of the GUI thread
+#   stream_cropped_image MainWindow.streamCroppedImage under Qt's offscreen platform
+#
+# Every benchmark reports latency per operation (mean, p50, p95, min in ms and operations per second).
+# Detection benchmarks also record how many people they found, so a model or library change that alters
+# the results is flagged as well. A benchmark regresses when its p50 is more than --tolerance slower
+# than in the baseline; the exit code is then 1.
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from common import load_images, make_synthetic_video
+from enrichment_load import make_crops
+
+import detection
+from backends import BACKENDS, create_backend
+from detection import JsonRead, PeopleDetection
+from encoding import CropEncoder
+from mock_server import MockServer
+from scheduling import DetectionScheduler
+
+BENCHMARKS = ("cropping", "annotate_images", "annotate_video", "crop_encoding", "send_image", "preview_render",
+              "stream_cropped_image")
+SUITE_VERSION = 1
+
+
+def summarize(latencies):
+    latencies = np.array(latencies)
+    return {"count": len(latencies), "mean_ms": float(latencies.mean()), "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)), "min_ms": float(latencies.min()),
+            "per_second": float(1000 / latencies.mean())}
+
+
+# Time `operation(item)` for every item, `runs` times over, after one untimed warm-up pass
+def measure(operation, items, runs, warmup=1):
+    for _ in range(warmup):
+        for item in items:
+            operation(item)
+    latencies = []
+    for _ in range(runs):
+        for item in items:
+            start = time.perf_counter()
+            operation(item)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)
+
+
+def video_frames(frames):
+    with tempfile.TemporaryDirectory() as directory:
+        capture = cv2.VideoCapture(make_synthetic_video(os.path.join(directory, "synthetic.avi"), frames))
+        decoded = []
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            decoded.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        capture.release()
+    return decoded
+
+
+# Detection on every frame, without enrichment, so the timings do not depend on the scheduler or the network
+def people_detection(args):
+    return PeopleDetection(args.model, backend=create_backend(args.backend, args.model),
+                           scheduler=DetectionScheduler("every_frame"))
+
+
+def bench_cropping(args, context):
+    people = context["people"]
+    result = measure(people.cropping, context["images"], args.runs)
+    result["people"] = int(sum(len(people.cropping(image)[0]) for image in context["images"]))
+    return result
+
+
+# Frames are annotated in place, so every pass starts from a clean copy (not timed).
+# The untimed warm-up pass counts the people, the timed passes run detect_and_annotate.
+def bench_annotate(people, frames, runs):
+    work = [np.empty_like(frame) for frame in frames]
+    people.reset()
+    found = 0
+    for frame, buffer in zip(frames, work):
+        np.copyto(buffer, frame)
+        found += len(people.detect_and_track(buffer)[0])
+    latencies = []
+    for _ in range(runs):
+        people.reset()
+        for frame, buffer in zip(frames, work):
+            np.copyto(buffer, frame)
+            start = time.perf_counter()
+            people.detect_and_annotate(buffer)
+            latencies.append((time.perf_counter() - start) * 1000)
+    result = summarize(latencies)
+    result["people"] = int(found)
+    return result
+
+
+def bench_annotate_images(args, context):
+    return bench_annotate(context["people"], context["images"], args.runs)
+
+
+def bench_annotate_video(args, context):
+    return bench_annotate(context["people"], video_frames(args.video_frames), 1)
+
+
+def bench_crop_encoding(args, context):
+    encoder = CropEncoder(detection.CROP_FORMAT, detection.CROP_QUALITY, detection.CROP_MAX_SIDE,
+                          detection.CROP_PNG_COMPRESSION)
+    result = measure(encoder.encode, context["crops"], args.runs)
+    result["bytes"] = int(encoder.total_bytes / encoder.encoded)
+    return result
+
+
+def bench_send_image(args, context):
+    import requests
+
+    server = MockServer(latency=0.0, seed=0).start()
+    detection.server_url = server.url
+    try:
+        with requests.Session() as session:
+            return measure(lambda crop: JsonRead.send_image_get_response(crop, session, detection.REQUEST_TIMEOUT),
+                           context["crops"], args.runs)
+    finally:
+        server.stop()
+
+
+_application = None
+
+
+# One offscreen QApplication for the Qt benchmarks, kept alive until the end of the run
+def qt_application():
+    global _application
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+
+    if _application is None:
+        _application = QApplication.instance() or QApplication(sys.argv)
+    return _application
+
+
+def bench_preview_render(args, context):
+    qt_application()
+    from PyQt6.QtGui import QPixmap
+
+    from rendering import PreviewRenderer
+
+    renderer = PreviewRenderer()
+
+    def render(frame):
+        q_image, buffer = renderer.render(frame)
+        QPixmap.fromImage(q_image)
+        renderer.release(buffer)
+
+    return measure(render, context["images"], args.runs * 10)
+
+
+def bench_stream_cropped_image(args, context):
+    app = qt_application()
+    import group1_final
+
+    window = group1_final.MainWindow()
+    # The model loads in the background; wait for it, so it does not compete with the measurement
+    window._MainWindow__modelLoader.join()
+    app.processEvents()
+    information = "Person #1\n" + JsonRead.format_information(
+        {"gesture": "Victory", "fingers": 2, "emotion": "happy", "gender": "Female", "age": 30})
+
+    def stream(crop):
+        window.streamCroppedImage(crop, information)
+        app.processEvents()
+
+    try:
+        return measure(stream, context["crops"], args.runs)
+    finally:
+        window.close()
+
+
+def environment(args):
+    versions = {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__}
+    for module in ("torch", "ultralytics", "onnxruntime", "PyQt6.QtCore"):
+        try:
+            imported = __import__(module, fromlist=["_"])
+        except ImportError:
+            continue
+        versions[module.split(".")[0]] = getattr(imported, "__version__", None) or getattr(imported, "PYQT_VERSION_STR")
+    return {"platform": platform.platform(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "threads": args.threads, "versions": versions}
+
+
+# Per benchmark: p50 change against the baseline and whether the detected people changed.
+# Returns the printed rows' statuses; "REGRESSION" and "CHANGED" fail the comparison.
+def compare(baseline, results, tolerance):
+    print(f"\nAgainst baseline from {baseline.get('created', '?')} (tolerance {tolerance:.0%})")
+    print(f"{'benchmark':<22}{'base p50':>10}{'p50 ms':>10}{'change':>9}  status")
+    failed = []
+    for name, current in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            print(f"{name:<22}{'-':>10}{current['p50_ms']:>10.2f}{'-':>9}  new")
+            continue
+        change = current["p50_ms"] / base["p50_ms"] - 1
+        if change > tolerance:
+            status = "REGRESSION"
+        elif change < -tolerance:
+            status = "faster"
+        else:
+            status = "ok"
+        if base.get("people") != current.get("people"):
+            status = f"CHANGED people {base.get('people')} -> {current.get('people')}"
+        if status == "REGRESSION" or status.startswith("CHANGED"):
+            failed.append(name)
+        print(f"{name:<22}{base['p50_ms']:>10.2f}{current['p50_ms']:>10.2f}{change:>+9.1%}  {status}")
+    if baseline.get("environment", {}).get("versions") != results.get("environment", {}).get("versions"):
+        print("Note: library versions differ from the baseline")
+    return failed
+
+
+def run(args):
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+        try:
+            import torch
+
+            torch.set_num_threads(args.threads)
+        except ImportError:
+            pass
+
+    names = args.only or BENCHMARKS
+    context = {"images": [image for _, image in load_images()]}
+    if not context["images"]:
+        raise SystemExit("No sample images found in Images/")
+    context["crops"] = make_crops(args.crops, seed=0)
+    if {"cropping", "annotate_images", "annotate_video"} & set(names):
+        context["people"] = people_detection(args)
+
+    results = {"suite": SUITE_VERSION, "created": datetime.datetime.now().isoformat(timespec="seconds"),
+               "environment": environment(args),
+               "config": {"model": args.model, "backend": args.backend, "runs": args.runs,
+                          "video_frames": args.video_frames, "crops": args.crops,
+                          "confidence": detection.CONFIDENCE_THRESHOLD, "crop_format": detection.CROP_FORMAT},
+               "benchmarks": {}}
+    print(f"{'benchmark':<22}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'per s':>9}{'people':>8}")
+    for name in names:
+        result = globals()[f"bench_{name}"](args, context)
+        results["benchmarks"][name] = result
+        print(f"{name:<22}{result['count']:>7}{result['mean_ms']:>10.2f}{result['p50_ms']:>10.2f}"
+              f"{result['p95_ms']:>10.2f}{result['per_second']:>9.1f}{result.get('people', '-'):>8}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU benchmark suite with JSON output and baseline comparison")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--backend", default="pytorch", choices=BACKENDS)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS)
+    parser.add_argument("--runs", type=int, default=5, help="timed passes over the inputs")
+    parser.add_argument("--video-frames", type=int, default=120)
+    parser.add_argument("--crops", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0, help="pin OpenCV and torch to this many threads")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--load", help="compare these saved results instead of running the suite")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed p50 slowdown before it counts")
+    args = parser.parse_args()
+
+    if args.load:
+        with open(args.load, encoding="utf-8") as file:
+            results = json.load(file)
+    else:
+        results = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        failed = compare(baseline, results, args.tolerance)
+        if failed:
+            print(f"Failed: {', '.join(failed)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# Cost and recall of tiled, region-of-interest and motion-region inference against the full-frame path
+# on high-resolution frames.
+#
+#   python benchmarks/tiling_recall.py --model yolov8n.pt --size 3840x2160 --scale 0.3
+#
+# The frames are synthetic: the sample images are shrunk by --scale and pasted onto a large canvas, so
+# the people in them become small, like distant people in a 4K camera view. The reference people are
+# what the model finds in the original images, mapped onto the canvas; recall is the share of them
+# found again (IoU >= --match-iou). For the motion mode the first image moves by --step pixels per frame
+# while the others stand still; the roi mode uses the left 40% of the canvas as region and counts
+# only the reference people whose box centre lies inside it.
+#
+# "tiles" runs the whole frame downscaled as one more model input next to the tiles, for people larger than
+# a tile; "tiles-only" leaves it out. "roi" runs the ROI tiles only, "roi-full" adds the full-frame pass
+# clipped to the ROI bounding box. The inputs column shows what the full-frame pass costs per frame.
+#
+# Per mode: model inputs, latency, people found and unmatched detections per frame, and the recall.
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from common import IMAGES, load_images
+
+from backends import BACKENDS, create_backend
+from tiling import tiled_backend
+from tracking import box_iou
+
+MODES = ("full", "tiles", "tiles-only", "roi", "roi-full", "motion")
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+# Shrunk images on a noisy grey canvas, one per grid cell at a random position in the cell.
+# Returns the canvas and the placements as (image index, x, y).
+def make_scene(images, size, scale, seed=0):
+    width, height = size
+    random = np.random.default_rng(seed)
+    canvas = random.normal(110, 12, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    canvas = cv2.GaussianBlur(canvas, (0, 0), 3)
+    columns = int(np.ceil(np.sqrt(len(images) * width / height)))
+    rows = int(np.ceil(len(images) / columns))
+    cell_width, cell_height = width // columns, height // rows
+    placements = []
+    for index, image in enumerate(images):
+        image_height, image_width = image.shape[:2]
+        cell_x, cell_y = index % columns * cell_width, index // columns * cell_height
+        x = cell_x + int(random.integers(0, max(cell_width - image_width, 0) + 1))
+        y = cell_y + int(random.integers(0, max(cell_height - image_height, 0) + 1))
+        placements.append((index, min(x, width - image_width), min(y, height - image_height)))
+    return canvas, placements
+
+
+def render(canvas, images, placements):
+    frame = canvas.copy()
+    for index, x, y in placements:
+        image = images[index]
+        frame[y:y + image.shape[0], x:x + image.shape[1]] = image
+    return frame
+
+
+# Reference boxes of a frame: the detections in the original images, scaled and shifted
+def reference_boxes(references, placements, scale):
+    boxes = [references[index] * scale + (x, y, x, y) for index, x, y in placements]
+    return np.concatenate(boxes).astype(np.float32) if boxes else np.empty((0, 4), dtype=np.float32)
+
+
+def inside(boxes, polygon):
+    centers = np.column_stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2])
+    contour = np.asarray(polygon, dtype=np.float32)
+    return np.array([cv2.pointPolygonTest(contour, (float(x), float(y)), False) >= 0 for x, y in centers],
+                    dtype=bool)
+
+
+# Matched reference boxes and unmatched detections, greedy by IoU
+def match(reference, boxes, min_iou):
+    if len(reference) == 0 or len(boxes) == 0:
+        return 0, len(boxes)
+    iou = box_iou(reference.astype(np.float32), boxes.astype(np.float32))
+    matched = 0
+    used = np.zeros(len(boxes), dtype=bool)
+    for row in iou:
+        row = np.where(used, 0, row)
+        best = int(row.argmax())
+        if row[best] >= min_iou:
+            used[best] = True
+            matched += 1
+    return matched, int((~used).sum())
+
+
+def run_mode(backend, frames, references, confidence, runs, min_iou):
+    latencies = []
+    found = matched = unmatched = 0
+    for run in range(runs + 1):
+        backend.reset()
+        for frame, reference in zip(frames, references):
+            start = time.perf_counter()
+            boxes, _ = backend.detect(frame, confidence)
+            elapsed = (time.perf_counter() - start) * 1000
+            if run == 0:
+                # Untimed warm-up pass, also the one that is scored
+                found += len(boxes)
+                frame_matched, frame_unmatched = match(reference, boxes, min_iou)
+                matched += frame_matched
+                unmatched += frame_unmatched
+            else:
+                latencies.append(elapsed)
+    return np.array(latencies), found, matched, unmatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiled and region inference against the full frame")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--backend", default="pytorch", choices=BACKENDS)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--images", default=os.path.join(IMAGES, "*"))
+    parser.add_argument("--size", type=parse_size, default=(3840, 2160), help="frame size WIDTHxHEIGHT")
+    parser.add_argument("--scale", type=float, default=0.3, help="scale of the sample images on the canvas")
+    parser.add_argument("--tile-size", type=int, default=960)
+    parser.add_argument("--tile-overlap", type=float, default=0.2)
+    parser.add_argument("--frames", type=int, default=30, help="frames of the motion sequence")
+    parser.add_argument("--step", type=int, default=8, help="pixels the moving image moves per frame")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--confidence", type=float, default=0.5)
+    parser.add_argument("--match-iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    images = [image for _, image in load_images(args.images)]
+    if not images:
+        print(f"No images found for {args.images}")
+        return 1
+    backend = create_backend(args.backend, args.model)
+    references = [backend.detect(image, args.confidence)[0].astype(np.float32) for image in images]
+    shrunk = [cv2.resize(image, None, fx=args.scale, fy=args.scale, interpolation=cv2.INTER_AREA) for image in images]
+    canvas, placements = make_scene(shrunk, args.size, args.scale)
+    width, height = args.size
+    roi = [(0, 0), (int(width * 0.4), 0), (int(width * 0.4), height), (0, height)]
+
+    still = render(canvas, shrunk, placements)
+    still_reference = reference_boxes(references, placements, args.scale)
+    moving_frames, moving_references = [], []
+    for index in range(args.frames):
+        _, x, y = placements[0]
+        moved = [(0, min(x + index * args.step, width - shrunk[0].shape[1]), y)] + placements[1:]
+        moving_frames.append(render(canvas, shrunk, moved))
+        moving_references.append(reference_boxes(references, moved, args.scale))
+
+    print(f"{width}x{height} frames, sample images at {args.scale:.0%}, {len(still_reference)} reference people")
+    print(f"{'mode':<12}{'inputs':>8}{'mean ms':>10}{'p50 ms':>10}{'found':>7}{'recall':>8}{'unmatched':>11}")
+    try:
+        for mode in args.modes:
+            if mode == "motion":
+                frames, frame_references = moving_frames, moving_references
+            else:
+                frames, frame_references = [still] * args.frames, [still_reference] * args.frames
+            if mode.startswith("roi"):
+                frame_references = [reference[inside(reference, roi)] for reference in frame_references]
+            tiled = tiled_backend(backend, mode.split("-")[0], args.tile_size, args.tile_overlap,
+                                  rois=[roi] if mode.startswith("roi") else None,
+                                  full_frame=mode in ("tiles", "roi-full", "motion"))
+            latencies, found, matched, unmatched = run_mode(tiled, frames, frame_references, args.confidence,
+                                                            args.runs, args.match_iou)
+            inputs = tiled.tiles_run / tiled.frames if tiled is not backend else 1.0
+            total = sum(len(reference) for reference in frame_references)
+            recall = f"{matched / total:.0%}" if total else "n/a"
+            print(f"{mode:<12}{inputs:>8.2f}{latencies.mean():>10.2f}{np.percentile(latencies, 50):>10.2f}"
+                  f"{found / len(frames):>7.1f}{recall:>8}{unmatched / len(frames):>11.1f}")
+    finally:
+        backend.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
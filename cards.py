@@ -0,0 +1,124 @@
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QRect, QSize, Qt
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import QListView, QStyle, QStyledItemDelegate
+
+
+# Fixed-capacity ring buffer; index 0 is the newest item.
+# Appending to a full buffer overwrites the oldest item in O(1).
+class RingBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._head = 0  # slot of the next append
+        self._size = 0
+
+    def append(self, item):
+        self._items[self._head] = item
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return self._items[(self._head - 1 - index) % self.capacity]
+
+    def __len__(self):
+        return self._size
+
+    def is_full(self):
+        return self._size == self.capacity
+
+    # Forget the oldest item
+    def pop_oldest(self):
+        self._size = max(self._size - 1, 0)
+
+
+# List model over the most recent person cards, newest first.
+# Each card is (thumbnail pixmap, information text); the thumbnail is scaled once on insertion.
+class CardModel(QAbstractListModel):
+    def __init__(self, capacity=1000, thumbnail_size=QSize(200, 150), parent=None):
+        super().__init__(parent)
+        self.thumbnail_size = thumbnail_size
+        self._cards = RingBuffer(capacity)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._cards)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._cards):
+            return None
+        thumbnail, information = self._cards[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return information
+        if role == Qt.ItemDataRole.DecorationRole:
+            return thumbnail
+        return None
+
+    # Add a card for an RGB crop; returns False for an unusable image
+    def addCard(self, crp_img, information):
+        height, width, channel = crp_img.shape
+        q_image = QImage(crp_img.data, width, height, channel * width, QImage.Format.Format_RGB888)
+        thumbnail = QPixmap.fromImage(q_image.scaled(self.thumbnail_size, Qt.AspectRatioMode.KeepAspectRatio,
+                                                     Qt.TransformationMode.SmoothTransformation))
+        if thumbnail.isNull():
+            return False
+
+        if self._cards.is_full():
+            last = len(self._cards) - 1
+            self.beginRemoveRows(QModelIndex(), last, last)
+            self._cards.pop_oldest()
+            self.endRemoveRows()
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._cards.append((thumbnail, information))
+        self.endInsertRows()
+        return True
+
+
+# Paints one card: the thumbnail on the left, the information text on the right
+class CardDelegate(QStyledItemDelegate):
+    def __init__(self, card_size=QSize(360, 160), thumbnail_size=QSize(200, 150), parent=None):
+        super().__init__(parent)
+        self.card_size = card_size
+        self.thumbnail_size = thumbnail_size
+
+    def sizeHint(self, option, index):
+        return self.card_size
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+
+        rect = option.rect
+        thumbnail = index.data(Qt.ItemDataRole.DecorationRole)
+        image_rect = QRect(rect.left(), rect.top() + (rect.height() - self.thumbnail_size.height()) // 2,
+                           self.thumbnail_size.width(), self.thumbnail_size.height())
+        if thumbnail is not None:
+            # Centre the pre-scaled thumbnail, no scaling at paint time
+            x = image_rect.left() + (image_rect.width() - thumbnail.width()) // 2
+            y = image_rect.top() + (image_rect.height() - thumbnail.height()) // 2
+            painter.drawPixmap(x, y, thumbnail)
+
+        text_rect = QRect(image_rect.right() + 8, rect.top(), rect.right() - image_rect.right() - 8, rect.height())
+        painter.drawText(text_rect, Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft,
+                         index.data(Qt.ItemDataRole.DisplayRole) or "")
+        painter.restore()
+
+
+# Scrollable grid of person cards; only the visible cards are painted
+class CardPanel(QListView):
+    def __init__(self, capacity=1000, card_size=QSize(360, 160), thumbnail_size=QSize(200, 150), parent=None):
+        super().__init__(parent)
+        self.cardModel = CardModel(capacity, thumbnail_size, self)
+        self.setModel(self.cardModel)
+        self.setItemDelegate(CardDelegate(card_size, thumbnail_size, self))
+        self.setUniformItemSizes(True)
+        self.setFlow(QListView.Flow.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setGridSize(card_size)
+        self.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.setSelectionMode(QListView.SelectionMode.NoSelection)
+
+    def addCard(self, crp_img, information):
+        return self.cardModel.addCard(crp_img, information)
@@ -0,0 +1,427 @@
+import json
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from backends import create_backend
+from encoding import CropEncoder
+from enrichment import DropPolicy
+from metrics import metrics
+from pipeline import prefetch_batches
+from quality import CropGate
+from scheduling import DetectionScheduler
+from tiling import tiled_backend
+from tracking import IouTracker, ResultCache
+
+
+PERSON_LABEL = "person"
+CONFIDENCE_THRESHOLD = 0.7
+BOX_COLOR = (255, 56, 56)  # RGB, the ultralytics colour of the person class
+# One of backends.BACKENDS: "pytorch", "pytorch-half", "onnx", "onnx-opencv", "onnx-int8"
+INFERENCE_BACKEND = "pytorch"
+# Worker processes running the backend (0 = in this process), see process_pool.ProcessPoolBackend
+INFERENCE_PROCESSES = 0
+server_url = "http://130.61.137.186/getinfo"
+# Where the model looks in high-resolution frames (tiling.TiledBackend): "full" (the whole frame scaled to
+# the model input), "tiles" (overlapping TILE_SIZE tiles in one batch, plus the whole frame with
+# TILE_FULL_FRAME), "roi" (the tiles overlapping ROI_POLYGONS, people inside them) or "motion" (the tiles
+# with motion, within ROI_POLYGONS if set; all tiles every MOTION_REFRESH_INTERVAL frames)
+INFERENCE_MODE = "full"
+TILE_SIZE = 960
+TILE_OVERLAP = 0.2
+TILE_FULL_FRAME = None  # one more model input per frame (the ROI bounding box with ROIs); None: off in roi mode
+ROI_POLYGONS = []  # [[(x, y), ...], ...] in frame pixels
+MOTION_REFRESH_INTERVAL = 15
+
+# Enrichment worker pool settings
+ENRICHMENT_WORKERS = 4
+ENRICHMENT_QUEUE_SIZE = 32
+ENRICHMENT_DROP_POLICY = DropPolicy.DROP_OLDEST
+REQUEST_TIMEOUT = 5.0
+REQUEST_RETRIES = 2
+# Crops packed into one request; servers that do not accept batches get one crop per request
+ENRICHMENT_BATCH_SIZE = 4
+
+# Upload encoding of the person crops; crops are downscaled to CROP_MAX_SIDE pixels on the longer side
+CROP_FORMAT = "png"
+CROP_QUALITY = 95  # JPEG and WebP
+CROP_PNG_COMPRESSION = 3  # 0 (fastest, largest) to 9 (slowest, smallest), lossless at every level
+CROP_MAX_SIDE = 640
+crop_encoder = CropEncoder(CROP_FORMAT, CROP_QUALITY, CROP_MAX_SIDE, CROP_PNG_COMPRESSION)
+
+# Person tracking; each track is enriched once and its result is cached for RESULT_TTL seconds
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_MAX_MISSED = 15
+RESULT_TTL = 30.0
+RESULT_CACHE_SIZE = 256
+
+# Crop quality gate in front of the uploads: crops that are too small, blurred, cut by the frame edge,
+# oddly shaped or unsure are not sent, and at most UPLOADS_PER_WINDOW crops go out per UPLOAD_WINDOW seconds
+CROP_GATING = True
+MIN_CROP_AREA = 48 * 96
+MIN_CROP_SHARPNESS = 40.0  # Laplacian variance of the crop scaled to 128 rows
+MAX_TRUNCATED_SIDES = 1
+MIN_CROP_ASPECT = 1.0  # height / width
+MAX_CROP_ASPECT = 5.0
+MIN_CROP_CONFIDENCE = 0.75
+UPLOADS_PER_WINDOW = 4
+UPLOAD_WINDOW = 1.0
+
+# Detection scheduling: "every_frame", "fixed" (every KEYFRAME_INTERVAL frames) or "adaptive".
+# Adaptive mode detects on keyframes only and tunes the interval to reach TARGET_FPS.
+DETECTION_SCHEDULE = "adaptive"
+TARGET_FPS = 30.0
+KEYFRAME_INTERVAL = 1
+MAX_KEYFRAME_INTERVAL = 8
+
+# Frames per model call for file-based sources (detect_batches)
+BATCH_SIZE = 8
+
+# Event store directory for every detection and enrichment result (events.EventStore), None = not
+# recorded. Segments rotate at EVENT_SEGMENT_BYTES, the oldest are deleted beyond EVENT_MAX_SEGMENTS
+EVENT_STORE_DIR = None
+EVENT_SEGMENT_BYTES = 16 * 1024 * 1024
+EVENT_MAX_SEGMENTS = 64
+
+
+# Enrichment job for one tracked person; stream_id tells the streams of a StreamManager apart
+PersonJob = namedtuple("PersonJob", ["track_id", "crop", "stream_id"], defaults=(None,))
+
+
+# EnrichmentPool handler for PersonJob
+def enrich_person(job, session, timeout):
+    return JsonRead.send_image_get_response(job.crop, session, timeout)
+
+
+# EnrichmentPool batch handler, several PersonJobs in one request
+def enrich_people(jobs, session, timeout):
+    return JsonRead.send_images_get_responses([job.crop for job in jobs], session, timeout)
+
+
+# EnrichmentPool batch_enabled, False once the server turned out not to accept several crops per request
+def upload_batches_supported():
+    return JsonRead.batch_supported is not False
+
+
+class PeopleDetection:
+    def __init__(self, model_file="yolov8n.pt", crop_sink=None, tracker=None, result_cache=None, backend=None,
+                 scheduler=None, stream_id=None, gate=None, events=None):
+        self.stream_id = stream_id
+        self.events = events
+        self.backend = backend or tiled_backend(create_backend(INFERENCE_BACKEND, model_file,
+                                                               processes=INFERENCE_PROCESSES),
+                                                INFERENCE_MODE, TILE_SIZE, TILE_OVERLAP, ROI_POLYGONS,
+                                                TILE_FULL_FRAME, MOTION_REFRESH_INTERVAL)
+        self.crop_sink = crop_sink
+        self.tracker = tracker or IouTracker(TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED)
+        self.result_cache = result_cache or ResultCache(RESULT_TTL, RESULT_CACHE_SIZE)
+        self.scheduler = scheduler or DetectionScheduler(DETECTION_SCHEDULE, TARGET_FPS, KEYFRAME_INTERVAL,
+                                                         MAX_KEYFRAME_INTERVAL)
+        self.gate = gate or CropGate(MIN_CROP_AREA, MIN_CROP_SHARPNESS, MAX_TRUNCATED_SIDES, MIN_CROP_ASPECT,
+                                     MAX_CROP_ASPECT, MIN_CROP_CONFIDENCE, UPLOADS_PER_WINDOW, UPLOAD_WINDOW,
+                                     enabled=CROP_GATING)
+
+    # Run the model once on a blank frame, so the first real frame does not pay for the cold start
+    def warm_up(self, shape=(480, 640, 3)):
+        self.cropping(np.zeros(shape, dtype=np.uint8))
+
+    # Forget the tracks and the motion state, e.g. when switching sources
+    def reset(self):
+        self.tracker.tracks = []
+        self.scheduler.reset()
+        self.backend.reset()
+
+    # Run the backend for the person class only, filtered by confidence.
+    # Return an (N, 4) int array of xyxy boxes and the matching (N,) confidence array
+    def cropping(self, frame):
+        boxes = np.empty((0, 4), dtype=np.int32)
+        confidences = np.empty((0,), dtype=np.float32)
+        try:
+            boxes, confidences = self.backend.detect(frame, CONFIDENCE_THRESHOLD)
+
+        except Exception as e:
+            print(f"PeopleDetection.cropping(), Error processing frame: {e}")
+        return boxes, confidences
+
+    # Views into the frame for each box, clipped to the frame borders
+    @staticmethod
+    def crops(frame, boxes):
+        height, width = frame.shape[:2]
+        clipped = np.clip(boxes, 0, [width, height, width, height])
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in clipped]
+
+    # Hand a crop of every new track (or track whose cached result expired) to crop_sink,
+    # e.g. EnrichmentPool.submit, so each person is only sent to the server once per TTL.
+    # Crops the quality gate rejects are not sent; their tracks are tried again on the next frame.
+    def enrich_tracks(self, frame, boxes, tracks, confidences=None):
+        if self.crop_sink is None:
+            return
+        claimed = [i for i, track in enumerate(tracks) if self.result_cache.claim(track.track_id)]
+        if not claimed:
+            return
+        selected = self.gate.select(frame, boxes[claimed], None if confidences is None else confidences[claimed])
+        for j in set(range(len(claimed))) - set(selected):
+            self.result_cache.release(tracks[claimed[j]].track_id)
+        claimed = [claimed[j] for j in selected]
+        for i, cropped_img in zip(claimed, self.crops(frame, boxes[claimed])):
+            # Copy, the frame buffer is annotated in place afterwards
+            self.crop_sink(PersonJob(tracks[i].track_id, cropped_img.copy(), self.stream_id))
+
+    # Cache the enrichment result of a track; with an event store it is recorded with a thumbnail of `crop`
+    def store_result(self, track_id, attributes, crop=None):
+        self.gate.record_result(attributes)
+        self.result_cache.put(track_id, attributes)
+        if self.events is not None:
+            self.events.append_result(self.stream_id, track_id, attributes, crop)
+
+    # Record the tracked boxes of a frame in the event store, if any
+    def record(self, boxes, confidences, tracks):
+        if self.events is not None:
+            self.events.append_detections(self.stream_id, tracks, boxes, confidences)
+
+    # Run the detector on keyframes and carry the boxes forward on the frames in between
+    def detect(self, frame):
+        if self.scheduler.should_detect(frame):
+            start = time.perf_counter()
+            boxes, confidences = self.cropping(frame)
+            self.scheduler.keyframe(frame, boxes, confidences, (time.perf_counter() - start) * 1000)
+            return boxes, confidences
+        with metrics.time("propagate"):
+            return self.scheduler.propagate(frame)
+
+    # Batched detection for sources whose frames are known ahead of time (video files, image sets).
+    # Frames are decoded on a background thread while the previous batch is inferred.
+    # Yields (frame, boxes, confidences) for every frame, in input order.
+    def detect_batches(self, frames, batch_size=BATCH_SIZE):
+        for batch in prefetch_batches(frames, batch_size):
+            for frame, (boxes, confidences) in zip(batch, self.detect_batch(batch)):
+                yield frame, boxes, confidences
+
+    # One model call for a list of frames, returns (boxes, confidences) per frame
+    def detect_batch(self, frames):
+        try:
+            return self.backend.detect_batch(frames, CONFIDENCE_THRESHOLD)
+        except Exception as e:
+            print(f"PeopleDetection.detect_batch(), Error processing batch: {e}")
+            return [(np.empty((0, 4), dtype=np.int32), np.empty((0,), dtype=np.float32)) for _ in frames]
+
+    # Detect (or propagate), track and enrich; return the boxes, confidences and tracks of the frame
+    def detect_and_track(self, frame):
+        boxes, confidences = self.detect(frame)
+        tracks = self.tracker.update(boxes)
+        self.record(boxes, confidences, tracks)
+        self.enrich_tracks(frame, boxes, tracks, confidences)
+        return boxes, confidences, tracks
+
+    def detect_and_annotate(self, frame):
+        boxes, confidences, tracks = self.detect_and_track(frame)
+        return self.annotate(frame, boxes, tracks)
+
+    # Annotate each person with its track ID and the cached server attributes
+    # Boxes are drawn directly into `frame`, which is returned
+    def annotate(self, frame, boxes, tracks):
+        with metrics.time("draw"):
+            line_width = max(round(sum(frame.shape[:2]) / 2 * 0.003), 2)
+            for box, track in zip(boxes, tracks):
+                label = f"#{track.track_id} {PERSON_LABEL}"
+                attributes = self.result_cache.get(track.track_id)
+                if attributes is not None:
+                    label += " " + JsonRead.format_label(attributes)
+                self.draw_box(frame, box, label, line_width)  # Annotate the person box
+        return frame
+
+    # Box with a filled label above it, in the style of the ultralytics Annotator
+    @staticmethod
+    def draw_box(frame, box, label, line_width=2, color=BOX_COLOR):
+        x1, y1, x2, y2 = (int(v) for v in box)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, line_width, cv2.LINE_AA)
+        font_thickness = max(line_width - 1, 1)
+        font_scale = line_width / 3
+        (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)
+        outside = y1 - text_height >= 3
+        y_text = y1 - text_height - 3 if outside else y1 + text_height + 3
+        cv2.rectangle(frame, (x1, y1), (x1 + text_width, y_text), color, -1, cv2.LINE_AA)
+        cv2.putText(frame, label, (x1, y1 - 2 if outside else y1 + text_height + 2), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, (255, 255, 255), font_thickness, cv2.LINE_AA)
+
+
+class JsonRead:
+    GESTURE_EMOJIS = {
+        "Closed_Fist": "👊",
+        "Open_Palm": "✋",
+        "Pointing_Up": "☝️",
+        "Thumb_Up": "👍",
+        "Thumb_Down": "👎",
+        "Victory": "✌️",
+        "ILoveYou": "❤️",
+    }
+    EMOTION_EMOJIS = {
+        "happy": ":grinning_face_with_big_eyes:",
+        "sad": ":disappointed_face:",
+        "angry": ":angry_face:",
+        "surprise": "😮",
+        "fear": ":fearful_face:",
+        "disgust": ":nauseated_face:",
+        "neutral": ":neutral_face:",
+    }
+    GENDER_EMOJIS = {
+        "Male": ":man:",
+        "Female": ":woman:",
+    }
+
+    # Whether the server accepts several crops per request, None until the first batched request
+    batch_supported = None
+
+    # Upload one RGB crop and return the parsed person attributes.
+    # Server errors (5xx) raise requests.HTTPError so that the caller can retry,
+    # other failures are reported and return None.
+    @staticmethod
+    def send_image_get_response(crp_image, session=None, timeout=None, encoder=None):
+        if session is None:
+            import requests
+
+            session = requests
+        encoded = (encoder or crop_encoder).encode(crp_image)
+        metrics.observe("encode", encoded.encode_ms)
+
+        files = {'file': (encoded.file_name, encoded.data, encoded.mime_type)}
+        with metrics.time("upload"):
+            response = session.post(server_url, files=files, timeout=timeout)
+        metrics.mark("uploads")
+        if response.status_code >= 500:
+            response.raise_for_status()
+
+        if response.status_code == 200:
+            with metrics.time("parse"):
+                return JsonRead.parse_response(response.content)
+        else:
+            print(f"Failed to upload. Status code: {response.status_code}", response.text)
+            return None
+
+    # Upload several RGB crops in one multipart request (one "file" part per crop) and return the parsed
+    # attributes per crop, None for the crops the server could not analyse. A batching server answers
+    # {"results": [response or null, ...]}; a server that only knows single crops answers with the
+    # response of the first crop or rejects the request (4xx), after which every crop is sent on its own
+    # (batch_supported = False).
+    @staticmethod
+    def send_images_get_responses(crp_images, session=None, timeout=None, encoder=None):
+        if len(crp_images) == 1:
+            return [JsonRead.send_image_get_response(crp_images[0], session, timeout, encoder)]
+        if JsonRead.batch_supported is False:
+            return JsonRead.send_images_one_by_one(crp_images, session, timeout, encoder)
+        if session is None:
+            import requests
+
+            session = requests
+
+        encoded = [(encoder or crop_encoder).encode(crp_image) for crp_image in crp_images]
+        for crop in encoded:
+            metrics.observe("encode", crop.encode_ms)
+        files = [('file', (crop.file_name, crop.data, crop.mime_type)) for crop in encoded]
+        with metrics.time("upload"):
+            response = session.post(server_url, files=files, data={'batch': str(len(files))}, timeout=timeout)
+        metrics.mark("uploads")
+        if response.status_code >= 500:
+            response.raise_for_status()
+        if response.status_code != 200:
+            print(f"Failed to upload. Status code: {response.status_code}", response.text)
+            if JsonRead.batch_supported:
+                return [None] * len(crp_images)
+            JsonRead.disable_batches()
+            return JsonRead.send_images_one_by_one(crp_images, session, timeout, encoder)
+
+        with metrics.time("parse"):
+            data_x = json.loads(response.content)
+            if isinstance(data_x, dict):
+                results = data_x.get("results")
+                if not isinstance(results, list) or len(results) != len(crp_images):
+                    print(f"JsonRead.send_images_get_responses(), Expected {len(crp_images)} results, "
+                          f"got: {response.text[:200]}")
+                    return [None] * len(crp_images)
+                JsonRead.batch_supported = True
+                return [JsonRead.parse_data(data) if data is not None else None for data in results]
+
+        JsonRead.disable_batches()
+        rest = JsonRead.send_images_one_by_one(crp_images[1:], session, timeout, encoder)
+        return [JsonRead.parse_data(data_x)] + rest
+
+    @staticmethod
+    def disable_batches():
+        if JsonRead.batch_supported is not False:
+            print("Server does not accept batched crops, sending one crop per request")
+        JsonRead.batch_supported = False
+
+    # One request per crop; a crop whose request fails gives None, the crops already sent are not sent again
+    @staticmethod
+    def send_images_one_by_one(crp_images, session=None, timeout=None, encoder=None):
+        from requests import RequestException
+
+        results = []
+        for crp_image in crp_images:
+            try:
+                results.append(JsonRead.send_image_get_response(crp_image, session, timeout, encoder))
+            except RequestException as e:
+                print(f"JsonRead.send_images_one_by_one(), Request failed: {e}")
+                results.append(None)
+        return results
+
+    # Server response: [json string of the hand analysis, emotion dict, [face dict]]
+    @staticmethod
+    def parse_response(content):
+        return JsonRead.parse_data(json.loads(content))
+
+    @staticmethod
+    def parse_data(data_x):
+        data_x = list(data_x)
+        data_x[0] = json.loads(data_x[0])
+        gestures = data_x[0]['gestures']
+        return {
+            "gesture": gestures[0]['name'] if len(gestures) != 0 else None,
+            "fingers": data_x[0]['totalFingersAmount'],
+            "emotion": data_x[1]['predicted_emotion'],
+            "gender": data_x[2][0]['gender'],
+            "age": data_x[2][0]['age'],
+        }
+
+    # Multi-line text of a personal card
+    @staticmethod
+    def format_information(attributes):
+        import emoji
+
+        gesture_str = "Gestures: "
+        fingers_str = "Fingers: "
+        predicted_emotion_str = "Emotion: "
+        gender_str = "Gender: "
+        age_str = "Age: "
+
+        if attributes["gesture"] is not None:
+            gesture_str += attributes["gesture"] + JsonRead.GESTURE_EMOJIS.get(attributes["gesture"], "")
+        else:
+            gesture_str += "No Detection"
+
+        fingers_str += str(attributes["fingers"])
+
+        if attributes["emotion"] is not None:
+            predicted_emotion_str += attributes["emotion"]
+            predicted_emotion_str += emoji.emojize(JsonRead.EMOTION_EMOJIS.get(attributes["emotion"], ""))
+
+        if attributes["gender"] is not None:
+            gender_str += attributes["gender"]
+            gender_str += emoji.emojize(JsonRead.GENDER_EMOJIS.get(attributes["gender"], ""))
+        else:
+            gender_str += "No Detection"
+
+        age_str += str(attributes["age"])
+
+        return (gesture_str + "\n" + fingers_str + "\n"
+                + predicted_emotion_str + "\n" + gender_str + "\n" + age_str)
+
+    # Short single-line summary drawn next to the box
+    @staticmethod
+    def format_label(attributes):
+        parts = [attributes[key] for key in ("emotion", "gender") if attributes[key] is not None]
+        if attributes["age"] is not None:
+            parts.append(str(attributes["age"]))
+        return " ".join(parts)
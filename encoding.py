@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+
+# Encoded upload payload for one crop, with the cost of producing it
+EncodedCrop = namedtuple("EncodedCrop", ["data", "mime_type", "file_name", "width", "height", "size", "encode_ms"])
+
+
+# Encodes RGB crops for upload entirely in memory with cv2.imencode.
+# format is "png", "jpeg" or "webp"; quality (0-100) applies to JPEG and WebP, png_compression (0-9,
+# OpenCV's default 3) to the lossless PNG.
+# Crops whose longer side exceeds max_side are downscaled first, keeping the aspect ratio.
+class CropEncoder:
+    FORMATS = {
+        "png": (".png", "image/png"),
+        "jpeg": (".jpg", "image/jpeg"),
+        "webp": (".webp", "image/webp"),
+    }
+
+    def __init__(self, image_format="png", quality=95, max_side=None, png_compression=3):
+        image_format = image_format.lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in self.FORMATS:
+            raise ValueError(f"Unsupported crop format: {image_format}")
+        self.image_format = image_format
+        self.quality = quality
+        self.max_side = max_side
+        self.png_compression = png_compression
+
+        self.extension, self.mime_type = self.FORMATS[image_format]
+        if image_format == "jpeg":
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        elif image_format == "webp":
+            self.params = [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+        else:
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+
+        self.encoded = 0
+        self.total_bytes = 0
+        self.total_encode_ms = 0.0
+        self._lock = threading.Lock()
+
+    def encode(self, crp_image):
+        start = time.perf_counter()
+        height, width = crp_image.shape[:2]
+        longest = max(height, width)
+        if self.max_side and longest > self.max_side:
+            scale = self.max_side / longest
+            width, height = max(1, round(width * scale)), max(1, round(height * scale))
+            crp_image = cv2.resize(crp_image, (width, height), interpolation=cv2.INTER_AREA)
+
+        bgr_image = cv2.cvtColor(crp_image, cv2.COLOR_RGB2BGR)
+        ok, buffer = cv2.imencode(self.extension, bgr_image, self.params)
+        if not ok:
+            raise ValueError(f"CropEncoder.encode(), Could not encode crop as {self.image_format}")
+        data = buffer.tobytes()
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self.encoded += 1
+            self.total_bytes += len(data)
+            self.total_encode_ms += encode_ms
+        return EncodedCrop(data, self.mime_type, "output_image" + self.extension, width, height, len(data), encode_ms)
+
+    # Average size and encode time over all crops so far
+    def stats(self):
+        with self._lock:
+            count = max(self.encoded, 1)
+            return {
+                "encoded": self.encoded,
+                "total_bytes": self.total_bytes,
+                "avg_bytes": self.total_bytes / count,
+                "avg_encode_ms": self.total_encode_ms / count,
+            }
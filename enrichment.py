@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import deque
+from enum import Enum
+from queue import Empty
+
+
+# What JobQueue.put does when the queue is already full
+class DropPolicy(Enum):
+    BLOCK = 0  # wait (up to block_timeout) for a free slot, then drop the new job
+    DROP_NEWEST = 1  # reject the job being submitted
+    DROP_OLDEST = 2  # evict the oldest pending job to make room
+
+
+# Thread-safe bounded job queue with a selectable backpressure policy
+class JobQueue:
+    def __init__(self, maxsize=32, policy=DropPolicy.DROP_OLDEST, block_timeout=None):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._items = deque()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, job):
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                if self.policy == DropPolicy.DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                elif self.policy == DropPolicy.DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                elif not self._cond.wait_for(lambda: len(self._items) < self.maxsize or self._closed,
+                                             self.block_timeout) or self._closed:
+                    self.dropped += 1
+                    return False
+            self._items.append(job)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout) or not self._items:
+                raise Empty
+            job = self._items.popleft()
+            self._cond.notify_all()
+            return job
+
+    # Wait for one job like get(), then take up to max_jobs - 1 more that are already queued
+    def get_batch(self, max_jobs, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout) or not self._items:
+                raise Empty
+            jobs = [self._items.popleft() for _ in range(min(max_jobs, len(self._items)))]
+            self._cond.notify_all()
+            return jobs
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+# Pool of worker threads that enrich person crops through the analysis server.
+# All workers share one requests.Session, so connections are kept alive and reused.
+# `handler(job, session, timeout)` performs one request and returns the result (or None),
+# `on_result(job, result)` is called from the worker thread for every successful result,
+# `on_done(job)` (optional) after every processed job, successful or not.
+# With a `batch_handler(jobs, session, timeout)` returning one result per job, a worker takes up to
+# batch_size queued jobs at once; it never waits for a batch to fill. While `batch_enabled()` (optional)
+# returns False, e.g. once the server turned out not to accept batches, jobs are taken one at a time.
+# Requests failing with a requests.RequestException are retried with exponential backoff.
+class EnrichmentPool:
+    def __init__(self, handler, on_result, workers=4, queue_size=32, policy=DropPolicy.DROP_OLDEST,
+                 block_timeout=None, timeout=5.0, retries=2, backoff=0.25, on_done=None, batch_handler=None,
+                 batch_size=1, batch_enabled=None):
+        self.handler = handler
+        self.on_result = on_result
+        self.on_done = on_done
+        self.batch_handler = batch_handler
+        self.batch_size = batch_size if batch_handler is not None else 1
+        self.batch_enabled = batch_enabled
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+        self.session = None
+
+        self._queue = JobQueue(queue_size, policy, block_timeout)
+        self._running = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @property
+    def dropped(self):
+        return self._queue.dropped
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    def start(self):
+        # requests is imported here, not at module level, to keep it off the application startup path
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        if self.session is None:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+        self._running.set()
+        self._threads = [threading.Thread(target=self._work, name=f"enrichment-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        self._running.clear()
+        self._queue.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    # Wait until every submitted job was processed or dropped. Returns False on timeout, or when no
+    # worker is left to process the remaining jobs (pool not started or already stopped)
+    def join(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.completed + self.failed + self.dropped < self.submitted:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            if not any(thread.is_alive() for thread in self._threads):
+                print("EnrichmentPool.join(), No worker running, "
+                      f"{self.submitted - self.completed - self.failed - self.dropped} jobs left unprocessed")
+                return False
+            time.sleep(0.05)
+        return True
+
+    # Returns False when the job was rejected by the drop policy
+    def submit(self, job):
+        with self._lock:
+            self.submitted += 1
+        return self._queue.put(job)
+
+    def _work(self):
+        while self._running.is_set():
+            try:
+                if self.batch_size > 1 and (self.batch_enabled is None or self.batch_enabled()):
+                    jobs = self._queue.get_batch(self.batch_size, timeout=0.1)
+                else:
+                    jobs = [self._queue.get(timeout=0.1)]
+            except Empty:
+                continue
+            if len(jobs) > 1:
+                results = self._process(self.batch_handler, jobs) or [None] * len(jobs)
+            else:
+                results = [self._process(self.handler, jobs[0])]
+            for job, result in zip(jobs, results):
+                # A failing callback must not take the worker down with it
+                if result is not None:
+                    try:
+                        self.on_result(job, result)
+                    except Exception as e:
+                        print(f"EnrichmentPool._work(), Error in on_result: {e}")
+                if self.on_done is not None:
+                    try:
+                        self.on_done(job)
+                    except Exception as e:
+                        print(f"EnrichmentPool._work(), Error in on_done: {e}")
+                # Counted after the callbacks, so join() returns once they ran
+                with self._lock:
+                    if result is None:
+                        self.failed += 1
+                    else:
+                        self.completed += 1
+
+    def _process(self, handler, job):
+        from requests import RequestException
+
+        for attempt in range(self.retries + 1):
+            try:
+                return handler(job, self.session, self.timeout)
+            except RequestException as e:
+                if attempt == self.retries or not self._running.is_set():
+                    print(f"EnrichmentPool._process(), Request failed after {attempt + 1} attempts: {e}")
+                    return None
+                time.sleep(self.backoff * 2 ** attempt)
+            except Exception as e:
+                print(f"EnrichmentPool._process(), Error processing response: {e}")
+                return None
@@ -0,0 +1,404 @@
+# Append-only store of detection and enrichment events, for looking at what was seen after the fact.
+#
+#   python events.py events/ --count emotion --interval 60
+#   python events.py events/ --last 3600 --count gender --emotion happy
+#
+# Events are written column by column into fixed-size memory-mapped segment files (events-000001.seg, ...).
+# A segment holds `capacity` rows; every column is one contiguous fixed-width block of the file, so an
+# append is a few array assignments into the page cache and a query only touches the columns it reads.
+# When a segment is full the next one is started (and with max_segments the oldest is deleted).
+# Queries run over the segments with NumPy masks; segments whose time range lies outside the query
+# are skipped using the min / max time kept in every segment header.
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+
+DETECTION = 0  # a tracked person box on a processed frame
+RESULT = 1  # enrichment result of a track (box is -1)
+
+# Category columns store the index into these tuples, -1 for None and -2 for values not listed here
+GESTURES = ("Closed_Fist", "Open_Palm", "Pointing_Up", "Thumb_Down", "Thumb_Up", "Victory", "ILoveYou")
+EMOTIONS = ("angry", "disgust", "fear", "happy", "neutral", "sad", "surprise")
+GENDERS = ("Male", "Female")
+CATEGORIES = {"gesture": GESTURES, "emotion": EMOTIONS, "gender": GENDERS}
+NONE, OTHER = -1, -2
+
+# name, dtype, shape per row; missing numbers are -1 (NaN for the confidence)
+COLUMNS = (
+    ("time", "<f8", ()),
+    ("kind", "u1", ()),
+    ("stream", "<i2", ()),
+    ("track_id", "<i4", ()),
+    ("box", "<i4", (4,)),
+    ("confidence", "<f4", ()),
+    ("gesture", "i1", ()),
+    ("fingers", "i1", ()),
+    ("emotion", "i1", ()),
+    ("gender", "i1", ()),
+    ("age", "<i2", ()),
+    ("thumbnail", "<i8", ()),  # sequence number of the row when it has thumbnails/<sequence>.jpg
+)
+ROW_BYTES = sum(np.dtype(dtype).itemsize * int(np.prod(shape)) for _, dtype, shape in COLUMNS)
+
+MAGIC = b"PDEV"
+VERSION = 1
+HEADER = np.dtype([("magic", "S4"), ("version", "<u4"), ("capacity", "<u8"), ("rows", "<u8"),
+                   ("first_sequence", "<u8"), ("min_time", "<f8"), ("max_time", "<f8")])
+HEADER_BYTES = 64
+ALIGNMENT = 64
+
+
+def encode_category(column, value):
+    if value is None:
+        return NONE
+    try:
+        return CATEGORIES[column].index(value)
+    except ValueError:
+        return OTHER
+
+
+# Numeric attribute (fingers, age) as stored: -1 when missing or not a whole number, like "30" or "25-32"
+def integer_or_missing(value):
+    if isinstance(value, bool):
+        return -1
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return -1
+    return int(number) if number.is_integer() and 0 <= number < 32767 else -1
+
+
+def decode_category(column, code):
+    code = int(code)
+    if code == NONE:
+        return None
+    return CATEGORIES[column][code] if code >= 0 else "other"
+
+
+# One segment file: header followed by one block per column
+class Segment:
+    def __init__(self, path, capacity=None, first_sequence=0, writable=False):
+        self.path = path
+        self.writable = writable or capacity is not None
+        if capacity is not None and not os.path.exists(path):
+            self._map = np.memmap(path, np.uint8, "w+", shape=(self.file_size(capacity),))
+            header = self._map[:HEADER.itemsize].view(HEADER)
+            header[0] = (MAGIC, VERSION, capacity, 0, first_sequence, np.inf, -np.inf)
+        else:
+            self._map = np.memmap(path, np.uint8, "r+" if writable else "r")
+        self.header = self._map[:HEADER.itemsize].view(HEADER)
+        if self.header["magic"][0] != MAGIC or self.header["version"][0] != VERSION:
+            raise ValueError(f"Segment(), Not an event segment: {path}")
+        self.capacity = int(self.header["capacity"][0])
+
+        self.columns = {}
+        offset = HEADER_BYTES
+        for name, dtype, shape in COLUMNS:
+            dtype = np.dtype(dtype)
+            size = self.capacity * dtype.itemsize * int(np.prod(shape))
+            self.columns[name] = self._map[offset:offset + size].view(dtype).reshape((self.capacity,) + shape)
+            offset += -(-size // ALIGNMENT) * ALIGNMENT
+
+    @staticmethod
+    def file_size(capacity):
+        size = HEADER_BYTES
+        for _, dtype, shape in COLUMNS:
+            size += -(-capacity * np.dtype(dtype).itemsize * int(np.prod(shape)) // ALIGNMENT) * ALIGNMENT
+        return size
+
+    @property
+    def rows(self):
+        return int(self.header["rows"][0])
+
+    @property
+    def first_sequence(self):
+        return int(self.header["first_sequence"][0])
+
+    @property
+    def time_range(self):
+        return float(self.header["min_time"][0]), float(self.header["max_time"][0])
+
+    @property
+    def free(self):
+        return self.capacity - self.rows
+
+    # Write len(values["time"]) rows; columns not given are filled with their missing value.
+    # The row count in the header is raised last, so readers never see half written rows.
+    def append(self, values):
+        start = self.rows
+        count = len(values["time"])
+        end = start + count
+        for name, column in self.columns.items():
+            if name in values:
+                column[start:end] = values[name]
+            else:
+                column[start:end] = np.nan if name == "confidence" else -1
+        times = values["time"]
+        self.header["min_time"] = min(self.time_range[0], float(np.min(times)))
+        self.header["max_time"] = max(self.time_range[1], float(np.max(times)))
+        self.header["rows"] = end
+
+    # Column views over the written rows
+    def view(self, names=None):
+        rows = self.rows
+        return {name: self.columns[name][:rows] for name in (names or self.columns)}
+
+    def flush(self):
+        if self.writable and self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        self.flush()
+        self.columns = {}
+        self._map = None
+
+
+# Writer and reader of an event directory. The append methods are thread safe and meant for the hot
+# path (a handful of array assignments per frame); crop thumbnails of the results are small JPEGs in
+# <directory>/thumbnails, named by the row's sequence number kept in the "thumbnail" column.
+class EventStore:
+    def __init__(self, directory="events", segment_bytes=16 * 1024 * 1024, max_segments=None, thumbnails=True,
+                 thumbnail_height=96):
+        self.directory = directory
+        self.capacity = max((segment_bytes - HEADER_BYTES) // ROW_BYTES, 1)
+        self.max_segments = max_segments
+        self.thumbnails = thumbnails
+        self.thumbnail_height = thumbnail_height
+        os.makedirs(os.path.join(directory, "thumbnails"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._paths = sorted(glob.glob(os.path.join(directory, "events-*.seg")))
+        self._active = None
+        if self._paths:
+            last = Segment(self._paths[-1], writable=True)
+            if last.free:
+                self._active = last
+            else:
+                last.close()
+
+    @property
+    def rows(self):
+        return sum(segment.rows for segment in self.segments())
+
+    def append_detections(self, stream_id, tracks, boxes, confidences=None, timestamp=None):
+        if len(tracks) == 0:
+            return
+        values = {"time": np.full(len(tracks), time.time() if timestamp is None else timestamp), "kind": DETECTION,
+                  "stream": -1 if stream_id is None else stream_id,
+                  "track_id": [track.track_id for track in tracks], "box": boxes}
+        if confidences is not None:
+            values["confidence"] = confidences
+        self.append(values)
+
+    def append_result(self, stream_id, track_id, attributes, crop=None, timestamp=None):
+        values = {"time": np.array([time.time() if timestamp is None else timestamp]), "kind": RESULT,
+                  "stream": -1 if stream_id is None else stream_id, "track_id": track_id,
+                  "fingers": integer_or_missing(attributes.get("fingers")),
+                  "age": integer_or_missing(attributes.get("age"))}
+        for column in CATEGORIES:
+            values[column] = encode_category(column, attributes.get(column))
+        thumbnail = crop is not None and self.thumbnails
+        sequence = self.append(values, sequence_column="thumbnail" if thumbnail else None)
+        if thumbnail:
+            self._save_thumbnail(sequence, crop)
+
+    # Append a dict of column values (scalars are repeated), returns the sequence number of the first row.
+    # `sequence_column` is filled with the sequence numbers of the rows.
+    def append(self, values, sequence_column=None):
+        count = len(values["time"])
+        with self._lock:
+            first = None
+            written = 0
+            while written < count:
+                segment = self._writable()
+                part = min(segment.free, count - written)
+                sequence = segment.first_sequence + segment.rows
+                rows = {name: value[written:written + part] if np.ndim(value) else value
+                        for name, value in values.items()}
+                if sequence_column is not None:
+                    rows[sequence_column] = np.arange(sequence, sequence + part)
+                segment.append(rows)
+                first = sequence if first is None else first
+                written += part
+            return first
+
+    def flush(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.flush()
+
+    def close(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+
+    def thumbnail_path(self, sequence):
+        return os.path.join(self.directory, "thumbnails", f"{int(sequence)}.jpg")
+
+    # Segments oldest first, optionally only those overlapping [start, end]. Every segment, the active one
+    # too, is opened read-only of its own, so rotation and retention in the writer do not pull it away
+    # from under a query; segments deleted since the paths were copied are skipped.
+    def segments(self, start=None, end=None):
+        with self._lock:
+            paths = list(self._paths)
+        for path in paths:
+            try:
+                segment = Segment(path)
+            except FileNotFoundError:
+                continue
+            min_time, max_time = segment.time_range
+            if segment.rows == 0 or (start is not None and max_time < start) or (end is not None and min_time > end):
+                continue
+            yield segment
+
+    # Rows matching all conditions as a dict of column arrays (only `columns`, default all).
+    # Conditions: time range [start, end), kind, stream and column filters: category values by name
+    # (emotion="happy"), exact values (track_id=3) or ranges with a min_ / max_ prefix (min_age=18).
+    def query(self, start=None, end=None, kind=None, stream=None, columns=None, **filters):
+        if kind is not None:
+            filters["kind"] = kind
+        if stream is not None:
+            filters["stream"] = stream
+        names = list(columns or (name for name, _, _ in COLUMNS))
+        parts = {name: [] for name in names}
+        for segment in self.segments(start, end):
+            view = segment.view()
+            mask = self._mask(view, start, end, filters)
+            for name in names:
+                parts[name].append(view[name][mask])
+        return {name: np.concatenate(values) if values else self._empty(name) for name, values in parts.items()}
+
+    # Counts per value of `column` per `interval` seconds (None = over the whole range), e.g. emotions per
+    # minute of the enrichment results. Returns (bucket start times, value labels, counts[bucket, value]).
+    def count_by(self, column, interval=60.0, start=None, end=None, kind=RESULT, stream=None, **filters):
+        counts = Counter()
+        if kind is not None:
+            filters["kind"] = kind
+        if stream is not None:
+            filters["stream"] = stream
+        for segment in self.segments(start, end):
+            view = segment.view(["time", column, *self._filter_columns(filters)])
+            mask = self._mask(view, start, end, filters)
+            values = view[column][mask].astype(np.int64)
+            buckets = np.floor(view["time"][mask] / interval).astype(np.int64) if interval else np.zeros_like(values)
+            if not len(values):
+                continue
+            keys, key_counts = np.unique(np.stack([buckets, values]), axis=1, return_counts=True)
+            counts.update(dict(zip(map(tuple, keys.T.tolist()), key_counts.tolist())))
+
+        buckets = sorted({bucket for bucket, _ in counts})
+        values = sorted({value for _, value in counts})
+        table = np.zeros((len(buckets), len(values)), dtype=np.int64)
+        bucket_index = {bucket: i for i, bucket in enumerate(buckets)}
+        value_index = {value: i for i, value in enumerate(values)}
+        for (bucket, value), count in counts.items():
+            table[bucket_index[bucket], value_index[value]] = count
+        times = np.array(buckets, dtype=np.float64) * interval if interval else np.zeros(len(buckets))
+        labels = [decode_category(column, value) for value in values] if column in CATEGORIES else values
+        return times, labels, table
+
+    @staticmethod
+    def _filter_columns(filters):
+        return [name.split("_", 1)[1] if name.startswith(("min_", "max_")) else name for name in filters]
+
+    @staticmethod
+    def _mask(view, start, end, filters):
+        times = view["time"]
+        mask = np.ones(len(times), dtype=bool)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times < end
+        for name, value in filters.items():
+            if name.startswith("min_"):
+                mask &= view[name[4:]] >= value
+            elif name.startswith("max_"):
+                mask &= view[name[4:]] <= value
+            elif name in CATEGORIES:
+                mask &= view[name] == encode_category(name, value)
+            else:
+                mask &= view[name] == value
+        return mask
+
+    @staticmethod
+    def _empty(name):
+        for column, dtype, shape in COLUMNS:
+            if column == name:
+                return np.empty((0,) + shape, dtype=dtype)
+        raise KeyError(name)
+
+    # The active segment, rotating to a new one when it is full
+    def _writable(self):
+        if self._active is not None and self._active.free:
+            return self._active
+        first_sequence = 0
+        if self._active is not None:
+            first_sequence = self._active.first_sequence + self._active.capacity
+            self._active.close()
+        elif self._paths:
+            last = Segment(self._paths[-1])
+            first_sequence = last.first_sequence + last.rows
+        index = int(os.path.basename(self._paths[-1])[7:13]) + 1 if self._paths else 1
+        path = os.path.join(self.directory, f"events-{index:06d}.seg")
+        self._active = Segment(path, self.capacity, first_sequence, writable=True)
+        self._paths.append(path)
+        if self.max_segments and len(self._paths) > self.max_segments:
+            self._drop_oldest(len(self._paths) - self.max_segments)
+        return self._active
+
+    def _drop_oldest(self, count):
+        removed, self._paths = self._paths[:count], self._paths[count:]
+        for path in removed:
+            os.remove(path)
+        oldest = Segment(self._paths[0]).first_sequence
+        for path in glob.glob(os.path.join(self.directory, "thumbnails", "*.jpg")):
+            name = os.path.splitext(os.path.basename(path))[0]
+            if name.isdigit() and int(name) < oldest:
+                os.remove(path)
+
+    def _save_thumbnail(self, sequence, crop):
+        try:
+            scale = self.thumbnail_height / crop.shape[0]
+            if scale < 1.0:
+                crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            cv2.imwrite(self.thumbnail_path(sequence), cv2.cvtColor(crop, cv2.COLOR_RGB2BGR),
+                        [cv2.IMWRITE_JPEG_QUALITY, 85])
+        except Exception as e:
+            print(f"EventStore._save_thumbnail(), Error writing thumbnail {sequence}: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Counts per attribute from an event store")
+    parser.add_argument("directory")
+    parser.add_argument("--count", default="emotion", help="column to count, e.g. emotion, gender, gesture, age")
+    parser.add_argument("--interval", type=float, default=60.0, help="seconds per row (0 = one total row)")
+    parser.add_argument("--last", type=float, default=0, help="only the last N seconds (0 = everything)")
+    parser.add_argument("--stream", type=int)
+    for column in CATEGORIES:
+        parser.add_argument(f"--{column}", help=f"only results with this {column}")
+    args = parser.parse_args(argv)
+
+    store = EventStore(args.directory)
+    filters = {column: getattr(args, column) for column in CATEGORIES if getattr(args, column)}
+    start = time.time() - args.last if args.last else None
+    times, labels, table = store.count_by(args.count, args.interval or None, start=start, stream=args.stream,
+                                          **filters)
+    print(f"{store.rows} events in {args.directory}")
+    print(f"{'time':<20}" + "".join(f"{str(label):>10}" for label in labels))
+    for bucket, counts in zip(times, table):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(bucket)) if args.interval else "total"
+        print(f"{stamp:<20}" + "".join(f"{count:>10}" for count in counts))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,169 +1,62 @@
+import os
 import sys
-import threading
+import time
 import cv2
-import os
+import queue
+import threading
 
-import emoji
-import matplotlib.pyplot as plt
-import numpy as np
-import json
-import time
-import requests
-from PyQt6.QtCore import QTimer, Qt
-from PyQt6.QtGui import QImage, QPixmap, QFont, QIcon
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QPixmap, QFont, QIcon, QKeySequence, QShortcut
 from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QPushButton, QLabel, QFileDialog, QHBoxLayout, QVBoxLayout
-from ultralytics import YOLO
-from ultralytics.utils.plotting import Annotator
 from enum import Enum
-from PIL import Image
-
+import detection
+from cards import CardPanel
+from detection import (ENRICHMENT_BATCH_SIZE, ENRICHMENT_DROP_POLICY, ENRICHMENT_QUEUE_SIZE, ENRICHMENT_WORKERS,
+                       EVENT_MAX_SEGMENTS, EVENT_SEGMENT_BYTES, EVENT_STORE_DIR, REQUEST_RETRIES, REQUEST_TIMEOUT,
+                       JsonRead, PeopleDetection, enrich_people, enrich_person, upload_batches_supported)
+from enrichment import EnrichmentPool
+from events import EventStore
+from metrics import MetricsServer, metrics
+from pipeline import BufferPool, FramePipeline, ImageSource, LatestQueue
+from rendering import PreviewRenderer
+from replay import RecordingCapture, RecordingSession, ReplayServer, ReplaySource, SessionRecorder, load_responses
 
-PERSON_LABEL = "person"
-CONFIDENCE_THRESHOLD = 0.7
-FLAG = True
-cropped_image_list = []
-server_url = "http://130.61.137.186/getinfo"
-
-
-class PeopleDetection:
-    def __init__(self, model_file="yolov8n.pt"):
-        self.model = YOLO(model_file)
-
-    # Crop people from the frame and put each person in a list
-    # Arrange the variable Flag such that personal card changes but main stream does not affected
-    # Return the coordinates of each person in a list
-    def cropping(self, frame):
-        global FLAG, cropped_image_list
-        coordinates = []
-        results = self.model(frame)[0]
-        try:
-            for r in results:
-                boxes = r.boxes
-                for box in boxes:
-                    c = box.cls
-                    if self.model.names[int(c)] == PERSON_LABEL and box.conf > CONFIDENCE_THRESHOLD:
-                        coordinates.append(box.xyxy[0])
-                        if FLAG:
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            cropped_img_bgr = frame[y1:y2, x1:x2]
-                            cropped_img = cv2.cvtColor(cropped_img_bgr, cv2.COLOR_BGR2RGB)
-                            cropped_image_list.append(cropped_img)
-
-        except Exception as e:
-            print(f"PeopleDetection.cropping(), Error processing frame: {e}")
-        FLAG = False
-        return coordinates
 
-    # Annotate each person by using coordinates
-    def detect_and_annotate(self, frame):
-        coordinates = self.cropping(frame)
+# Number of person cards kept in the scrollable card panel
+CARD_HISTORY = 1000
 
-        annotator = Annotator(frame)
+# Per-stage latency, FPS and queue metrics. When enabled they are shown on the preview (F3 toggles the
+# overlay) and served in the Prometheus text format on http://127.0.0.1:METRICS_PORT/metrics (0 = not served)
+METRICS_ENABLED = False
+METRICS_OVERLAY = True
+METRICS_PORT = 9100
 
-        for coord in coordinates:
-            annotator.box_label(coord, PERSON_LABEL)  # Annotate the person box
-
-        img = annotator.result()  # Get the annotated image
-        return img
-
-
-class JsonRead:
-
-    @staticmethod
-    def send_image_get_response(crp_image):
-        global cropped_image_list
-
-        file_path = "output_image.png"
-        crp_image = cv2.cvtColor(crp_image, cv2.COLOR_BGR2RGB)
-        plt.imsave(file_path, crp_image)
-
-        with open(file_path, 'rb') as file:
-            file_contents = file.read()
-
-        files = {'file': (file_path, file_contents, 'image/png')}
-        response = requests.post(server_url, files=files)
-
-        if response.status_code == 200:
-            data_x = json.loads(response.content)
-            data_x[0] = json.loads(data_x[0])
-            gesture_str = "Gestures: "
-            fingers_str = "Fingers: "
-            predicted_emotion_str = "Emotion: "
-            gender_str = "Gender: "
-            age_str = "Age: "
-
-            if len(data_x[0]['gestures']) != 0:
-                gesture_str += data_x[0]['gestures'][0]['name']
-                if data_x[0]['gestures'][0]['name'] == "Closed_Fist":
-                    gesture_str += "👊"
-                elif data_x[0]['gestures'][0]['name'] == "Open_Palm":
-                    gesture_str += "✋"
-                elif data_x[0]['gestures'][0]['name'] == "Pointing_Up":
-                    gesture_str += "☝️"
-                elif data_x[0]['gestures'][0]['name'] == "Thumb_Up":
-                    gesture_str += "👍"
-                elif data_x[0]['gestures'][0]['name'] == "Thumb_Down":
-                    gesture_str += "👎"
-                elif data_x[0]['gestures'][0]['name'] == "Victory":
-                    gesture_str += "✌️"
-                elif data_x[0]['gestures'][0]['name'] == "ILoveYou":
-                    gesture_str += "❤️"
-            else:
-                gesture_str += "No Detection"
-
-            if str(data_x[0]['totalFingersAmount']) is not None:
-                fingers_str += str(data_x[0]['totalFingersAmount'])
-            else:
-                fingers_str += "No Detection"
-
-            if data_x[1]['predicted_emotion'] is not None:
-                predicted_emotion_str += data_x[1]['predicted_emotion']
-                if data_x[1]['predicted_emotion'] == "happy":
-                    predicted_emotion_str += emoji.emojize(":grinning_face_with_big_eyes:")
-                elif data_x[1]['predicted_emotion'] == "sad":
-                    predicted_emotion_str += emoji.emojize(":disappointed_face:")
-                elif data_x[1]['predicted_emotion'] == "angry":
-                    predicted_emotion_str += emoji.emojize(":angry_face:")
-                elif data_x[1]['predicted_emotion'] == "surprise":
-                    predicted_emotion_str += "😮"
-                elif data_x[1]['predicted_emotion'] == "fear":
-                    predicted_emotion_str += emoji.emojize(":fearful_face:")
-                elif data_x[1]['predicted_emotion'] == "disgust":
-                    predicted_emotion_str += emoji.emojize(":nauseated_face:")
-                elif data_x[1]['predicted_emotion'] == "neutral":
-                    predicted_emotion_str += emoji.emojize(":neutral_face:")
-
-            if (data_x[2][0]['gender']) is not None:
-                gender_str += (data_x[2][0]['gender'])
-                if (data_x[2][0]['gender']) == "Male":
-                    gender_str += emoji.emojize(":man:")
-                elif (data_x[2][0]['gender']) == "Female":
-                    gender_str += emoji.emojize(":woman:")
-            else:
-                gender_str += "No Detection"
-
-            if str((data_x[2][0]['age'])) is not None:
-                age_str += str((data_x[2][0]['age']))
-            else:
-                age_str += "No Detection"
-
-            result_str = (gesture_str + "\n" + fingers_str + "\n"
-                          + predicted_emotion_str + "\n" + gender_str + "\n" + age_str)
-
-            mainWindow.streamCroppedImage(crp_image, result_str)
-        else:
-            print(f"Failed to upload. Status code: {response.status_code}", response.text)
+# Camera sessions are recorded to SESSION_RECORD_DIR/<date>-<time> (None = not recorded), see replay.py.
+# A recorded session plays back through File by selecting its session.json.
+SESSION_RECORD_DIR = None
 
 
 class ButtonState(Enum):
     ENABLED = 1
     DISABLED = 0
+    LOADING = 2
 
 
 class MainWindow(QMainWindow):
     __CAMERA_FPS = 30
     __VIDEO_FPS = 33
     __BUTTON_WIDTH = 180
+    __PREVIEW_WIDTH = 1024
+    __PREVIEW_HEIGHT = 768
+
+    # Emitted from the pipeline render thread, handled on the GUI thread
+    frameReady = pyqtSignal()
+    sourceFinished = pyqtSignal()
+    # Emitted from the enrichment workers with (crop, information)
+    enrichmentReady = pyqtSignal(object, str)
+    # Emitted from the model loader thread
+    modelReady = pyqtSignal()
+    modelFailed = pyqtSignal(str)
 
     def __init__(self):
         super().__init__()
@@ -173,19 +66,38 @@ class MainWindow(QMainWindow):
         self.__fileButton = None
         self.__cameraButton = None
         self.__previewLabel = None
-        self.__verticalLayoutInfo_1 = None
+        self.__cardPanel = None
         self.__horizontalLayout2 = None
         self.__horizontalLayout1 = None
-        self.__cameraTimer = None
-        self.__videoTimer = None
         self.__cameraCap = None
         self.__videoCap = None
-
-        # Additional thread for the personal cards.
-        # I add this not to slow down the main stream
-        self.control_timer_thread = threading.Thread(target=self.control_flag_thread)
-        self.control_timer_thread.daemon = True
-        self.control_timer_thread.start()
+        self.__imageSource = None
+        self.__replaySource = None
+        self.__replayServer = None
+        self.__serverUrl = None
+        self.__recorder = None
+        self.__pipeline = None
+        # Frame buffers shared by the pipeline stages and the preview, recycled instead of reallocated
+        self.__buffers = BufferPool()
+        self.__renderer = PreviewRenderer(self.__PREVIEW_WIDTH, self.__PREVIEW_HEIGHT, self.__buffers)
+        self.__displayQueue = self._createDisplayQueue()
+        self.__metricsOverlay = None
+        self.__metricsServer = None
+
+        self.frameReady.connect(self._showLatestFrame)
+        self.sourceFinished.connect(self._sourceFinished)
+        self.enrichmentReady.connect(self.streamCroppedImage)
+        self.modelReady.connect(self._modelReady)
+        self.modelFailed.connect(self._modelFailed)
+        self.__detection = None
+        self.__events = None
+
+        # Worker pool for the personal cards, server round trips never block the main stream
+        self.__enrichment = EnrichmentPool(enrich_person, self._personEnriched,
+                                           workers=ENRICHMENT_WORKERS, queue_size=ENRICHMENT_QUEUE_SIZE,
+                                           policy=ENRICHMENT_DROP_POLICY, timeout=REQUEST_TIMEOUT,
+                                           retries=REQUEST_RETRIES, batch_handler=enrich_people,
+                                           batch_size=ENRICHMENT_BATCH_SIZE, batch_enabled=upload_batches_supported)
 
         self.setWindowTitle("Machine Learning Project")
         self.setFixedSize(1800, 900)
@@ -193,201 +105,103 @@ class MainWindow(QMainWindow):
         self.centralWidget = QWidget(self)
         self.setCentralWidget(self.centralWidget)
         self._initializeUI()
-        self.__detection = PeopleDetection()
+        if METRICS_ENABLED:
+            self._enableMetrics()
 
-    # Checks in each 0.2ms that does model return a list consisting of cropped images
-    @staticmethod
-    def control_flag_thread():
-        global FLAG, cropped_image_list
-        while True:
-            time.sleep(0.02)
-            if not FLAG:
-                for img_cropped in cropped_image_list:
-                    JsonRead.send_image_get_response(img_cropped)
-                FLAG = True
-                cropped_image_list.clear()
+        # The model loads in the background, the window shows up right away
+        self._setSourceButtonsState(ButtonState.LOADING)
+        self.__modelLoader = threading.Thread(target=self._loadModel, name="model-loader", daemon=True)
+        self.__modelLoader.start()
+
+    # Runs on the model loader thread: load the model and run it once so the first frame is not slow
+    def _loadModel(self):
+        try:
+            self.__enrichment.start()
+            # Every detection and result is kept on disk, the card panel only shows the latest ones
+            if EVENT_STORE_DIR:
+                self.__events = EventStore(EVENT_STORE_DIR, EVENT_SEGMENT_BYTES, EVENT_MAX_SEGMENTS)
+            people = PeopleDetection(crop_sink=self.__enrichment.submit, events=self.__events)
+            people.warm_up((self.__PREVIEW_HEIGHT, self.__PREVIEW_WIDTH, 3))
+        except Exception as e:
+            print(f"MainWindow._loadModel(), Error loading model: {e}")
+            self.modelFailed.emit(str(e))
+            return
+        self.__detection = people
+        self.modelReady.emit()
+
+    def _modelReady(self):
+        self._setSourceButtonsState(ButtonState.ENABLED)
+
+    def _modelFailed(self, error):
+        self._setSourceButtonsState(ButtonState.DISABLED)
+        self.__previewLabel.setText(f"Model could not be loaded: {error}")
+
+    # Runs on an enrichment worker thread
+    def _personEnriched(self, job, attributes):
+        self.__detection.store_result(job.track_id, attributes, job.crop)
+        self.enrichmentReady.emit(job.crop, f"Person #{job.track_id}\n" + JsonRead.format_information(attributes))
+
+    def closeEvent(self, event):
+        self._stopPipeline()
+        self.__enrichment.stop()
+        if self.__metricsServer is not None:
+            self.__metricsServer.stop()
+        if self.__detection is not None:
+            self.__detection.backend.close()
+        if self.__events is not None:
+            self.__events.close()
+        super().closeEvent(event)
 
     # Arrange personal cards
     def streamCroppedImage(self, crp_img, information):
-        height, width, channel = crp_img.shape
-        bytes_per_line = 3 * width
-        q_image = QImage(crp_img.data, width, height, bytes_per_line, QImage.Format.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_image)
-
-        if not pixmap.isNull():
-            self.__cardLabelImage_10.setPixmap(self.__cardLabelImage_9.pixmap())
-            self.__cardLabelImage_10.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__cardLabelImage_10.setScaledContents(True)
-            self.__cardLabel_10.setText(self.__cardLabel_9.text())
-
-            self.__cardLabelImage_9.setPixmap(self.__cardLabelImage_8.pixmap())
-            self.__cardLabelImage_9.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__cardLabelImage_9.setScaledContents(True)
-            self.__cardLabel_9.setText(self.__cardLabel_8.text())
-
-            self.__cardLabelImage_8.setPixmap(self.__cardLabelImage_7.pixmap())
-            self.__cardLabelImage_8.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__cardLabelImage_8.setScaledContents(True)
-            self.__cardLabel_8.setText(self.__cardLabel_7.text())
-
-            self.__cardLabelImage_7.setPixmap(self.__cardLabelImage_6.pixmap())
-            self.__cardLabelImage_7.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__cardLabelImage_7.setScaledContents(True)
-            self.__cardLabel_7.setText(self.__cardLabel_6.text())
-
-            self.__cardLabelImage_6.setPixmap(self.__cardLabelImage_5.pixmap())
-            self.__cardLabelImage_6.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__cardLabelImage_6.setScaledContents(True)
-            self.__cardLabel_6.setText(self.__cardLabel_5.text())
-
-            self.__cardLabelImage_5.setPixmap(self.__cardLabelImage_4.pixmap())
-            self.__cardLabelImage_5.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__cardLabelImage_5.setScaledContents(True)
-            self.__cardLabel_5.setText(self.__cardLabel_4.text())
-
-            self.__cardLabelImage_4.setPixmap(self.__cardLabelImage_3.pixmap())
-            self.__cardLabelImage_4.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__cardLabelImage_4.setScaledContents(True)
-            self.__cardLabel_4.setText(self.__cardLabel_3.text())
-
-            self.__cardLabelImage_3.setPixmap(self.__cardLabelImage_2.pixmap())
-            self.__cardLabelImage_3.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__cardLabelImage_3.setScaledContents(True)
-            self.__cardLabel_3.setText(self.__cardLabel_2.text())
-
-            self.__cardLabelImage_2.setPixmap(self.__cardLabelImage_1.pixmap())
-            self.__cardLabelImage_2.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__cardLabelImage_2.setScaledContents(True)
-            self.__cardLabel_2.setText(self.__cardLabel_1.text())
-
-            self.__cardLabelImage_1.setPixmap(pixmap)
-            self.__cardLabelImage_1.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__cardLabelImage_1.setScaledContents(True)
-            self.__cardLabel_1.setText(information)
-
-        else:
+        with metrics.time("card"):
+            added = self.__cardPanel.addCard(crp_img, information)
+        if not added:
             print("Invalid image file")
 
+    def _enableMetrics(self):
+        metrics.enable()
+        metrics.gauge("dropped_frames", lambda: self.__pipeline.dropped if self.__pipeline is not None else 0)
+        metrics.gauge("pending_uploads", lambda: self.__enrichment.pending)
+        if METRICS_PORT:
+            try:
+                self.__metricsServer = MetricsServer(metrics, port=METRICS_PORT).start()
+                print(f"Metrics on {self.__metricsServer.url}")
+            except OSError as e:
+                print(f"MainWindow._enableMetrics(), Error starting the metrics endpoint: {e}")
+
+        # Drawn over the top left corner of the preview, refreshed twice a second
+        self.__metricsOverlay = QLabel(self.__previewLabel)
+        self.__metricsOverlay.setFont(QFont("Monospace", 9))
+        self.__metricsOverlay.setStyleSheet("background-color: rgba(0, 0, 0, 160); color: #ffffff; padding: 4px;")
+        self.__metricsOverlay.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.__metricsOverlay.move(0, 0)
+        self.__metricsOverlay.setVisible(METRICS_OVERLAY)
+        self.__metricsTimer = QTimer(self)
+        self.__metricsTimer.timeout.connect(self._updateMetricsOverlay)
+        self.__metricsTimer.start(500)
+        QShortcut(QKeySequence("F3"), self).activated.connect(
+            lambda: self.__metricsOverlay.setHidden(not self.__metricsOverlay.isHidden()))
+
+    def _updateMetricsOverlay(self):
+        if self.__metricsOverlay.isHidden():
+            return
+        self.__metricsOverlay.setText("\n".join(metrics.summary_lines()))
+        self.__metricsOverlay.adjustSize()
+
     def _initializeUI(self):
         self.__horizontalLayout1 = QHBoxLayout()
         self.__horizontalLayout2 = QHBoxLayout()
-        self.__verticalLayoutInfo_1 = QVBoxLayout()
-        self.__verticalLayoutInfo_2 = QVBoxLayout()
 
         self.__previewLabel = QLabel(self.centralWidget)
         self.__previewLabel.setFixedWidth(1024)
         self.__previewLabel.setFixedHeight(768)
+        self.__previewLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.__horizontalLayout1.addWidget(self.__previewLabel, 4)
 
-        self.__personCardHL1 = QHBoxLayout()
-        self.__personCardHL2 = QHBoxLayout()
-        self.__personCardHL3 = QHBoxLayout()
-        self.__personCardHL4 = QHBoxLayout()
-        self.__personCardHL5 = QHBoxLayout()
-
-        self.__personCardHL6 = QHBoxLayout()
-        self.__personCardHL7 = QHBoxLayout()
-        self.__personCardHL8 = QHBoxLayout()
-        self.__personCardHL9 = QHBoxLayout()
-        self.__personCardHL10 = QHBoxLayout()
-
-        self.__cardLabelImage_1 = QLabel(self.centralWidget)
-        self.__cardLabelImage_1.setFixedWidth(200)
-        self.__cardLabelImage_1.setFixedHeight(150)
-
-        self.__cardLabelImage_2 = QLabel(self.centralWidget)
-        self.__cardLabelImage_2.setFixedWidth(200)
-        self.__cardLabelImage_2.setFixedHeight(150)
-
-        self.__cardLabelImage_3 = QLabel(self.centralWidget)
-        self.__cardLabelImage_3.setFixedWidth(200)
-        self.__cardLabelImage_3.setFixedHeight(150)
-
-        self.__cardLabelImage_4 = QLabel(self.centralWidget)
-        self.__cardLabelImage_4.setFixedWidth(200)
-        self.__cardLabelImage_4.setFixedHeight(150)
-
-        self.__cardLabelImage_5 = QLabel(self.centralWidget)
-        self.__cardLabelImage_5.setFixedWidth(200)
-        self.__cardLabelImage_5.setFixedHeight(150)
-
-        self.__cardLabelImage_6 = QLabel(self.centralWidget)
-        self.__cardLabelImage_6.setFixedWidth(200)
-        self.__cardLabelImage_6.setFixedHeight(150)
-
-        self.__cardLabelImage_7 = QLabel(self.centralWidget)
-        self.__cardLabelImage_7.setFixedWidth(200)
-        self.__cardLabelImage_7.setFixedHeight(150)
-
-        self.__cardLabelImage_8 = QLabel(self.centralWidget)
-        self.__cardLabelImage_8.setFixedWidth(200)
-        self.__cardLabelImage_8.setFixedHeight(150)
-
-        self.__cardLabelImage_9 = QLabel(self.centralWidget)
-        self.__cardLabelImage_9.setFixedWidth(200)
-        self.__cardLabelImage_9.setFixedHeight(150)
-
-        self.__cardLabelImage_10 = QLabel(self.centralWidget)
-        self.__cardLabelImage_10.setFixedWidth(200)
-        self.__cardLabelImage_10.setFixedHeight(150)
-
-        self.__cardLabel_1 = QLabel("Information Cards\n", self.centralWidget)
-        self.__cardLabel_2 = QLabel("Information Cards\n", self.centralWidget)
-        self.__cardLabel_3 = QLabel("Information Cards\n", self.centralWidget)
-        self.__cardLabel_4 = QLabel("Information Cards\n", self.centralWidget)
-        self.__cardLabel_5 = QLabel("Information Cards\n", self.centralWidget)
-
-        self.__cardLabel_6 = QLabel("Information Cards\n", self.centralWidget)
-        self.__cardLabel_7 = QLabel("Information Cards\n", self.centralWidget)
-        self.__cardLabel_8 = QLabel("Information Cards\n", self.centralWidget)
-        self.__cardLabel_9 = QLabel("Information Cards\n", self.centralWidget)
-        self.__cardLabel_10 = QLabel("Information Cards\n", self.centralWidget)
-
-        self.__personCardHL1.addWidget(self.__cardLabelImage_1)
-        self.__personCardHL1.addWidget(self.__cardLabel_1)
-
-        self.__personCardHL2.addWidget(self.__cardLabelImage_2)
-        self.__personCardHL2.addWidget(self.__cardLabel_2)
-
-        self.__personCardHL3.addWidget(self.__cardLabelImage_3)
-        self.__personCardHL3.addWidget(self.__cardLabel_3)
-
-        self.__personCardHL4.addWidget(self.__cardLabelImage_4)
-        self.__personCardHL4.addWidget(self.__cardLabel_4)
-
-        self.__personCardHL5.addWidget(self.__cardLabelImage_5)
-        self.__personCardHL5.addWidget(self.__cardLabel_5)
-
-        self.__personCardHL6.addWidget(self.__cardLabelImage_6)
-        self.__personCardHL6.addWidget(self.__cardLabel_6)
-
-        self.__personCardHL7.addWidget(self.__cardLabelImage_7)
-        self.__personCardHL7.addWidget(self.__cardLabel_7)
-
-        self.__personCardHL8.addWidget(self.__cardLabelImage_8)
-        self.__personCardHL8.addWidget(self.__cardLabel_8)
-
-        self.__personCardHL9.addWidget(self.__cardLabelImage_9)
-        self.__personCardHL9.addWidget(self.__cardLabel_9)
-
-        self.__personCardHL10.addWidget(self.__cardLabelImage_10)
-        self.__personCardHL10.addWidget(self.__cardLabel_10)
-
-        self.__verticalLayoutInfo_1.addLayout(self.__personCardHL1)
-        self.__verticalLayoutInfo_1.addLayout(self.__personCardHL2)
-        self.__verticalLayoutInfo_1.addLayout(self.__personCardHL3)
-        self.__verticalLayoutInfo_1.addLayout(self.__personCardHL4)
-        self.__verticalLayoutInfo_1.addLayout(self.__personCardHL5)
-
-        self.__verticalLayoutInfo_2.addLayout(self.__personCardHL6)
-        self.__verticalLayoutInfo_2.addLayout(self.__personCardHL7)
-        self.__verticalLayoutInfo_2.addLayout(self.__personCardHL8)
-        self.__verticalLayoutInfo_2.addLayout(self.__personCardHL9)
-        self.__verticalLayoutInfo_2.addLayout(self.__personCardHL10)
-
-        # End of Right part
-        self.__horizontalLayout1.addLayout(self.__verticalLayoutInfo_1, 2)
-        self.__horizontalLayout1.addLayout(self.__verticalLayoutInfo_2, 2)
+        # Person cards, newest first, keeping the last CARD_HISTORY people scrollable
+        self.__cardPanel = CardPanel(CARD_HISTORY, parent=self.centralWidget)
+        self.__horizontalLayout1.addWidget(self.__cardPanel, 4)
 
         self.__cameraButton = self._createButton("Camera", "icons/glow-icon-video.png", "#4a90e2", "#357ABD",
                                                  self._cameraButtonClicked)
@@ -419,6 +233,12 @@ class MainWindow(QMainWindow):
 
         return button
 
+    # Camera and file buttons stay disabled and say so while the model is loading
+    def _setSourceButtonsState(self, state):
+        for button, text in ((self.__cameraButton, "Camera"), (self.__fileButton, "File (Image/Video)")):
+            button.setEnabled(state == ButtonState.ENABLED)
+            button.setText("Model loading..." if state == ButtonState.LOADING else text)
+
     def _setButtonStyle(self, button, color, hover_color):
         button.setStyleSheet(f"QPushButton {{"
                              f"border: 2px solid {color};"
@@ -457,96 +277,165 @@ class MainWindow(QMainWindow):
         self.__cameraCap.set(cv2.CAP_PROP_FRAME_WIDTH, desired_width)
         self.__cameraCap.set(cv2.CAP_PROP_FRAME_HEIGHT, desired_height)
 
-        self.__cameraTimer = QTimer(self)
-        self.__cameraTimer.timeout.connect(self._updateCamera)
-        self.__cameraTimer.start(30)
+        self._startPipeline(self._recordSession(self.__cameraCap), self._prepareCameraFrame, stop_on_read_error=False)
         self.__stopButton.setEnabled(True)
 
-    def _updateCamera(self):
-        ret, frame = self.__cameraCap.read()
-        if not ret:
-            print("Error: Could not read frame from camera.")
+    # With SESSION_RECORD_DIR the frames, detections and server responses of the session are recorded
+    def _recordSession(self, capture):
+        if not SESSION_RECORD_DIR:
+            return capture
+        directory = os.path.join(SESSION_RECORD_DIR, time.strftime("%Y%m%d-%H%M%S"))
+        self.__recorder = SessionRecorder(directory, fps=self.__CAMERA_FPS, events=self.__detection.events,
+                                          source="camera")
+        self.__detection.events = self.__recorder
+        self.__enrichment.session = self.__recorder.session(self.__enrichment.session)
+        print(f"Recording session to {directory}")
+        return RecordingCapture(capture, self.__recorder)
+
+    def _stopRecording(self):
+        if self.__recorder is None:
+            return
+        self.__detection.events = self.__recorder.events
+        if isinstance(self.__enrichment.session, RecordingSession):
+            self.__enrichment.session = self.__enrichment.session.session
+        self.__recorder.close()
+        self.__recorder = None
+
+    # Preprocess steps write into the pooled frame buffer `out` instead of returning new arrays
+    @staticmethod
+    def _prepareCameraFrame(raw, out):
+        cv2.cvtColor(raw, cv2.COLOR_BGR2RGB, dst=out)
+        cv2.flip(out, 1, dst=out)
+
+    @staticmethod
+    def _prepareFileFrame(raw, out):
+        cv2.cvtColor(raw, cv2.COLOR_BGR2RGB, dst=out)
+
+    # Capture, detection and QImage conversion run on the pipeline threads,
+    # the GUI thread only swaps in the newest finished frame
+    def _startPipeline(self, capture, preprocess, source_fps=None, stop_on_read_error=True):
+        self.__displayQueue.close()
+        self.__displayQueue = self._createDisplayQueue()
+        self.__detection.reset()
+        self.__pipeline = FramePipeline(capture, self.__detection, self._renderFrame, preprocess=preprocess,
+                                        on_finished=self.sourceFinished.emit, source_fps=source_fps,
+                                        stop_on_read_error=stop_on_read_error, buffers=self.__buffers)
+        self.__pipeline.start()
+
+    # Holds (QImage, preview buffer) pairs; a replaced or discarded frame hands its buffer back to the pool
+    def _createDisplayQueue(self):
+        return LatestQueue(1, on_drop=lambda item: self.__renderer.release(item[1]))
+
+    # Render stage, runs on the pipeline render thread.
+    # The frame is scaled to the preview size into a pooled buffer which the QImage wraps without copying
+    def _renderFrame(self, frame):
+        with metrics.time("preview"):
+            rendered = self.__renderer.render(frame)
+        self.__displayQueue.put(rendered)
+        self.frameReady.emit()
+
+    def _showLatestFrame(self):
+        try:
+            q_image, buffer = self.__displayQueue.get(timeout=0)
+        except queue.Empty:
+            return
+        with metrics.time("pixmap"):
+            pixmap = QPixmap.fromImage(q_image)
+        self.__renderer.release(buffer)
+        metrics.mark("frames_rendered")
+        if pixmap.isNull():
+            self.__previewLabel.setText("Invalid image file")
             return
-        frame = cv2.flip(frame, 1)
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame = self.__detection.detect_and_annotate(frame)
-
-        height, width, channel = frame.shape
-        bytes_per_line = 3 * width
-        q_image = QImage(frame.data, width, height, bytes_per_line, QImage.Format.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_image)
         self.__previewLabel.setPixmap(pixmap)
 
+    def _sourceFinished(self):
+        self._stopPipeline()
+
+    def _stopPipeline(self):
+        if self.__pipeline is not None:
+            self.__pipeline.stop()
+            self.__pipeline = None
+        if self.__cameraCap is not None:
+            self.__cameraCap.release()
+        if self.__videoCap is not None:
+            self.__videoCap.release()
+        if self.__imageSource is not None:
+            self.__imageSource.release()
+        if self.__replaySource is not None:
+            self.__replaySource.release()
+            self._stopReplay()
+        self._stopRecording()
+
     def _fileButtonClicked(self):
         print("File button clicked")
         self.__stopButton.click()
         file_dialog = QFileDialog()
         file_dialog.setWindowTitle("Open File")
-        file_dialog.setNameFilter("Media Files (*.png *jpeg *.jpg *.bmp *.gif *.mp4 *.avi);;All Files (*)")
+        file_dialog.setNameFilter("Media Files (*.png *jpeg *.jpg *.bmp *.gif *.mp4 *.avi session.json);;All Files (*)")
         if file_dialog.exec() == QFileDialog.DialogCode.Accepted:
             selected_file = file_dialog.selectedUrls()[0].toLocalFile()
             if selected_file.lower().endswith((".png", ".jpeg", ".jpg", ".bmp", ".gif")):
                 self._displayImage(selected_file)
             elif selected_file.lower().endswith((".mp4", ".avi")):
                 self._playVideo(selected_file)
+            elif os.path.basename(selected_file) == "session.json":
+                self._playSession(os.path.dirname(selected_file))
             else:
                 print("Unsupported file format")
 
     def _displayImage(self, selected_file):
         image = cv2.imread(selected_file)
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        image = self.__detection.detect_and_annotate(image)
-        h, w, ch = image.shape
-        bytes_per_line = ch * w
-        q_image = QImage(image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_image)
-        self.__stopButton.setEnabled(True)
-
-        if not pixmap.isNull():
-
-            scaled_pixmap = pixmap.scaled(1024, 768, Qt.AspectRatioMode.KeepAspectRatio,
-                                          Qt.TransformationMode.SmoothTransformation)
-
-            self.__previewLabel.setPixmap(scaled_pixmap)
-        else:
+        if image is None:
             self.__previewLabel.setText("Invalid image file")
+            return
+        self.__imageSource = ImageSource(image)
+        self._startPipeline(self.__imageSource, self._prepareFileFrame)
+        self.__stopButton.setEnabled(True)
 
     def _playVideo(self, video_file):
         self.__stopButton.setEnabled(True)
         self.__videoCap = cv2.VideoCapture(video_file)
         if not self.__videoCap.isOpened():
             print("Error opening video file")
-        self.__videoTimer = QTimer(self)
-        self.__videoTimer.timeout.connect(self._updateVideo)
-        self.__videoTimer.start(33)
-
-    def _updateVideo(self):
-        ret, frame = self.__videoCap.read()
-        if ret:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            rgb_frame = self.__detection.detect_and_annotate(rgb_frame)
-
-            height, width, channel = rgb_frame.shape
-            bytes_per_line = 3 * width
-            q_image = QImage(rgb_frame.data, width, height, bytes_per_line, QImage.Format.Format_RGB888)
-            pixmap = QPixmap.fromImage(q_image)
-            self.__previewLabel.setPixmap(pixmap)
-            self.__previewLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.__previewLabel.setScaledContents(True)
+            return
+        source_fps = self.__videoCap.get(cv2.CAP_PROP_FPS) or self.__VIDEO_FPS
+        self._startPipeline(self.__videoCap, self._prepareFileFrame, source_fps=source_fps)
+
+    # Replays a recorded session at its recorded pace. The person cards are filled from the recorded
+    # server responses through a local ReplayServer, the real server is not contacted; a session without
+    # recorded responses plays without cards.
+    def _playSession(self, directory):
+        self.__stopButton.setEnabled(True)
+        try:
+            self.__replaySource = ReplaySource(directory, realtime=True)
+            responses, _ = load_responses(directory)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"MainWindow._playSession(), Error opening session {directory}: {e}")
+            self.__previewLabel.setText(f"Session could not be opened: {e}")
+            self.__replaySource = None
+            return
+        self.__serverUrl = detection.server_url
+        if responses:
+            self.__replayServer = ReplayServer(directory).start()
+            detection.server_url = self.__replayServer.url
         else:
-            self.__videoTimer.stop()
-            self.__videoCap.release()
+            print(f"No recorded server responses in {directory}, replaying without person cards")
+            self.__detection.crop_sink = None
+        camera = self.__replaySource.metadata.get("source") == "camera"
+        self._startPipeline(self.__replaySource, self._prepareCameraFrame if camera else self._prepareFileFrame)
+
+    def _stopReplay(self):
+        self.__replaySource = None
+        if self.__replayServer is not None:
+            self.__replayServer.stop()
+            self.__replayServer = None
+        if self.__serverUrl is not None:
+            detection.server_url = self.__serverUrl
+            self.__serverUrl = None
+        self.__detection.crop_sink = self.__enrichment.submit
 
     def _stopButtonClicked(self):
-        if self.__cameraTimer is not None:
-            self.__cameraTimer.stop()
-        if self.__cameraCap is not None:
-            self.__cameraCap.release()
-
-        if self.__videoTimer is not None:
-            self.__videoTimer.stop()
-        if self.__videoCap is not None:
-            self.__videoCap.release()
+        self._stopPipeline()
         self.__previewLabel.clear()
         self.__stopButton.setEnabled(False)
 
@@ -0,0 +1,510 @@
+# Headless processing of video files and camera streams, without the Qt GUI.
+#
+#   python headless.py video.mp4 --output annotated.mp4 --jsonl detections.jsonl --enrich
+#   python headless.py 0 --max-frames 300
+#   python headless.py 0 1 entrance.mp4 --stream-fps 10 --jsonl detections.jsonl
+#   python headless.py 0 --record sessions/entrance --enrich
+#   python headless.py sessions/entrance --enrich --replay-responses --workers 1
+#
+# Several sources share one model through the cross-stream batch scheduler (streams.StreamManager);
+# their records carry the stream index and --output writes one file per stream (annotated_0.mp4, ...).
+# A recorded session directory (--record, see replay.py) can be given as source instead of a video.
+# High-resolution sources can be run in tiles, limited to regions of interest or to moving regions
+# (--inference-mode, see tiling.py):
+#   python headless.py street_4k.mp4 --inference-mode roi --roi "0,900 3840,900 3840,2160 0,2160"
+#
+# Frames are processed as fast as the hardware allows. At the end the throughput,
+# per-stage latency percentiles and total wall time are printed. With --metrics-port the hot path
+# metrics (metrics.Metrics) are collected too, served for Prometheus while running and printed at the end.
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import detection
+from backends import BACKENDS, create_backend
+from detection import PeopleDetection, enrich_people, enrich_person, upload_batches_supported
+from enrichment import EnrichmentPool
+from events import EventStore
+from metrics import MetricsServer, metrics
+from pipeline import iter_frames, prefetch_batches
+from replay import RecordingCapture, ReplayServer, ReplaySource, SessionRecorder, is_session, load_responses
+from scheduling import SCHEDULE_MODES, DetectionScheduler
+from streams import StreamManager
+from tiling import INFERENCE_MODES, TiledBackend, tiled_backend
+
+
+# Latency samples per pipeline stage, in milliseconds
+class StageTimes:
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, start):
+        self.add_value(stage, (time.perf_counter() - start) * 1000)
+        return time.perf_counter()
+
+    def add_value(self, stage, elapsed_ms):
+        self.samples.setdefault(stage, []).append(elapsed_ms)
+
+    def summary(self):
+        return {stage: {"count": len(values),
+                        "mean": float(np.mean(values)),
+                        "p50": float(np.percentile(values, 50)),
+                        "p95": float(np.percentile(values, 95)),
+                        "p99": float(np.percentile(values, 99))}
+                for stage, values in self.samples.items()}
+
+
+# Thread-safe JSON Lines writer, enrichment results arrive from the worker threads.
+# With append=True every line is flushed as it is written, so the file survives an interrupted run.
+class JsonlWriter:
+    def __init__(self, path, append=False):
+        self._file = open(path, "a" if append else "w", encoding="utf-8", buffering=1 if append else -1)
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# Camera index, video file or recorded session directory
+def open_source(source, realtime=False):
+    if is_session(source):
+        return ReplaySource(source, realtime)
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        raise IOError(f"Could not open source {source}")
+    return capture
+
+
+def detections_record(frame_index, timestamp, boxes, confidences, tracks, result_cache):
+    return {
+        "type": "frame",
+        "frame": frame_index,
+        "time": round(timestamp, 4),
+        "detections": [{"track_id": track.track_id,
+                        "box": [int(v) for v in box],
+                        "confidence": round(float(confidence), 4),
+                        "attributes": result_cache.get(track.track_id)}
+                       for box, confidence, track in zip(boxes, confidences, tracks)],
+    }
+
+
+def start_enrichment(args, on_result, policy=detection.ENRICHMENT_DROP_POLICY, on_done=None):
+    if not args.enrich:
+        return None
+    enrichment = EnrichmentPool(enrich_person, on_result, workers=args.workers,
+                                queue_size=detection.ENRICHMENT_QUEUE_SIZE, policy=policy,
+                                timeout=detection.REQUEST_TIMEOUT, retries=detection.REQUEST_RETRIES, on_done=on_done,
+                                batch_handler=enrich_people, batch_size=args.upload_batch,
+                                batch_enabled=upload_batches_supported)
+    enrichment.start()
+    return enrichment
+
+
+def stop_enrichment(enrichment):
+    if enrichment is not None:
+        # Let the requests in flight finish so their results reach the JSONL file
+        enrichment.join(detection.REQUEST_TIMEOUT * (detection.REQUEST_RETRIES + 1))
+        enrichment.stop()
+
+
+def start_metrics(args, enrichment):
+    if not args.metrics_port:
+        return None
+    metrics.enable()
+    if enrichment is not None:
+        metrics.gauge("pending_uploads", lambda: enrichment.pending)
+    server = MetricsServer(metrics, port=args.metrics_port).start()
+    print(f"Metrics on {server.url}")
+    return server
+
+
+def stop_metrics(server):
+    if server is None:
+        return
+    server.stop()
+    snapshot = metrics.snapshot()
+    print(f"{'hot path':<12}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, values in snapshot["stages"].items():
+        print(f"{stage:<12}{values['count']:>8}{values['mean']:>10.2f}{values['p50']:>10.2f}"
+              f"{values['p95']:>10.2f}{values['p99']:>10.2f}")
+
+
+# --roi "x,y x,y x,y ..." -> [(x, y), ...]
+def parse_polygon(text):
+    try:
+        points = [tuple(int(value) for value in point.split(",")) for point in text.split()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected \"x,y x,y x,y ...\", got {text!r}")
+    if len(points) < 3 or any(len(point) != 2 for point in points):
+        raise argparse.ArgumentTypeError(f"a polygon needs at least three x,y points, got {text!r}")
+    return points
+
+
+# The model backend, wrapped for --inference-mode
+def inference_backend(args):
+    backend = create_backend(args.backend, args.model, processes=args.processes)
+    return tiled_backend(backend, args.inference_mode, args.tile_size, args.tile_overlap,
+                         args.roi or detection.ROI_POLYGONS, detection.TILE_FULL_FRAME,
+                         detection.MOTION_REFRESH_INTERVAL)
+
+
+def print_tiling_report(backend):
+    if isinstance(backend, TiledBackend) and backend.frames:
+        print(f"Tiled inference: {backend.tiles_run} model inputs for {backend.frames} frames "
+              f"({backend.tiles_run / backend.frames:.2f} per frame)")
+
+
+def open_events(args):
+    if not args.events:
+        return None
+    return EventStore(args.events, detection.EVENT_SEGMENT_BYTES, detection.EVENT_MAX_SEGMENTS)
+
+
+# annotated.mp4 -> annotated_<stream_id>.mp4
+def stream_output(path, stream_id):
+    base, extension = os.path.splitext(path)
+    return f"{base}_{stream_id}{extension}"
+
+
+def print_gate_report(gate):
+    stats = gate.stats()
+    reasons = ", ".join(f"{reason} {count}" for reason, count in sorted(stats["rejected"].items())) or "none"
+    hit_rate = "n/a" if stats["hit_rate"] is None else f"{stats['hit_rate']:.0%}"
+    state = "on" if stats["enabled"] else "off (counts show what it would reject)"
+    print(f"Crop gate {state}: {stats['scored']} crops scored, {stats['passed']} uploaded, "
+          f"{stats['avoided']} uploads avoided (rejected: {reasons}; over budget {stats['over_budget']}), "
+          f"hit rate {hit_rate} of {stats['results']} results")
+
+
+def print_report(frames, wall_time, stages, enrichment=None, unit="frames", rate="FPS"):
+    print(f"\nProcessed {frames} {unit} in {wall_time:.2f} s ({frames / max(wall_time, 1e-9):.2f} {rate})")
+    print(f"{'stage':<12}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, values in stages.summary().items():
+        print(f"{stage:<12}{values['count']:>8}{values['mean']:>10.2f}{values['p50']:>10.2f}"
+              f"{values['p95']:>10.2f}{values['p99']:>10.2f}")
+    if enrichment is not None:
+        print(f"Enrichment: {enrichment.submitted} submitted, {enrichment.completed} completed, "
+              f"{enrichment.failed} failed, {enrichment.dropped} dropped")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detect people in a video file or camera stream without the GUI")
+    parser.add_argument("source", nargs="+", help="video file paths or camera indices, several sources share one model")
+    parser.add_argument("--output", help="write the annotated video to this file")
+    parser.add_argument("--jsonl", help="write per-frame detections and enrichment results to this file")
+    parser.add_argument("--events", help="record detections and enrichment results in this event store directory")
+    parser.add_argument("--record", help="record the session (frames, detections, server responses) to this directory")
+    parser.add_argument("--record-format", default="video", choices=("video", "raw"),
+                        help="recorded frames as MJPG video or lossless raw frame chunks")
+    parser.add_argument("--realtime", action="store_true", help="replay recorded sessions at their recorded pace")
+    parser.add_argument("--replay-responses", action="store_true",
+                        help="answer enrichment from the responses recorded in the session given as source")
+    parser.add_argument("--enrich", action="store_true", help="send new tracks to the analysis server")
+    parser.add_argument("--server-url", default=detection.server_url)
+    parser.add_argument("--workers", type=int, default=detection.ENRICHMENT_WORKERS)
+    parser.add_argument("--upload-batch", type=int, default=detection.ENRICHMENT_BATCH_SIZE,
+                        help="crops per request to the analysis server")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--backend", default=detection.INFERENCE_BACKEND, choices=BACKENDS)
+    parser.add_argument("--processes", type=int, default=detection.INFERENCE_PROCESSES,
+                        help="run the model in this many worker processes (0 = in this process); "
+                             "file sources are then batched over the workers")
+    parser.add_argument("--inference-mode", default=detection.INFERENCE_MODE, choices=INFERENCE_MODES,
+                        help="run the model on the full frame, on overlapping tiles, on the tiles of the --roi "
+                             "regions or on the tiles with motion")
+    parser.add_argument("--tile-size", type=int, default=detection.TILE_SIZE, help="tile side in frame pixels")
+    parser.add_argument("--tile-overlap", type=float, default=detection.TILE_OVERLAP)
+    parser.add_argument("--roi", action="append", type=parse_polygon,
+                        help="region of interest polygon \"x,y x,y x,y ...\" in frame pixels, may be repeated")
+    parser.add_argument("--schedule", default=detection.DETECTION_SCHEDULE, choices=SCHEDULE_MODES)
+    parser.add_argument("--target-fps", type=float, default=detection.TARGET_FPS)
+    parser.add_argument("--keyframe-interval", type=int, default=detection.KEYFRAME_INTERVAL)
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="run video files through the model in batches of this size (detects every frame)")
+    parser.add_argument("--max-frames", type=int, default=0, help="stop after this many frames (0 = no limit)")
+    parser.add_argument("--mirror", action="store_true", help="flip frames horizontally like the GUI camera view")
+    parser.add_argument("--no-gate", action="store_true",
+                        help="upload every new track without the crop quality gate (still scored for the report)")
+    parser.add_argument("--stream-fps", type=float, default=0,
+                        help="with several sources, process at most this many frames per second of each (0 = no cap)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="collect per-stage metrics and serve them on http://127.0.0.1:PORT/metrics (0 = off)")
+    args = parser.parse_args(argv)
+    if args.inference_mode == "roi" and not (args.roi or detection.ROI_POLYGONS):
+        parser.error("--inference-mode roi needs at least one --roi polygon")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    detection.server_url = args.server_url
+    detection.CROP_GATING = not args.no_gate
+    if len(args.source) > 1:
+        if args.record or args.replay_responses:
+            print("--record and --replay-responses work with a single source")
+            return 2
+        if args.inference_mode == "motion":
+            print("--inference-mode motion works with a single source")
+            return 2
+        return run_streams(args)
+    source = args.source[0]
+    if args.replay_responses and not (is_session(source) and load_responses(source)[0]):
+        print(f"--replay-responses needs a recorded session with server responses, {source} has none")
+        return 2
+    try:
+        capture = open_source(source, args.realtime)
+    except (OSError, ValueError, KeyError) as e:
+        print(e)
+        return 2
+    replay_server = None
+    if args.replay_responses:
+        replay_server = ReplayServer(source).start()
+        detection.server_url = replay_server.url
+
+    jsonl = JsonlWriter(args.jsonl) if args.jsonl else None
+    frame_index = 0
+    people = None
+
+    def person_enriched(job, attributes):
+        people.store_result(job.track_id, attributes, job.crop)
+        if jsonl is not None:
+            jsonl.write({"type": "enrichment", "frame": frame_index, "track_id": job.track_id,
+                         "attributes": attributes})
+
+    enrichment = start_enrichment(args, person_enriched)
+    metrics_server = start_metrics(args, enrichment)
+    events = open_events(args)
+    recorder = None
+    if args.record:
+        recorder = SessionRecorder(args.record, args.record_format, capture.get(cv2.CAP_PROP_FPS) or 30.0,
+                                   events=events)
+        capture = RecordingCapture(capture, recorder)
+        events = recorder
+        if enrichment is not None:
+            enrichment.session = recorder.session(enrichment.session)
+    people = PeopleDetection(args.model, crop_sink=enrichment.submit if enrichment else None, events=events,
+                             backend=inference_backend(args),
+                             scheduler=DetectionScheduler(args.schedule, args.target_fps, args.keyframe_interval,
+                                                          detection.MAX_KEYFRAME_INTERVAL))
+
+    writer = None
+    stages = StageTimes()
+    source_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def prepare(frame):
+        if args.mirror:
+            frame = cv2.flip(frame, 1)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def frame_by_frame():
+        while True:
+            start = time.perf_counter()
+            ret, frame = capture.read()
+            if not ret:
+                return
+            start = stages.add("read", start)
+            frame = prepare(frame)
+            start = stages.add("convert", start)
+            boxes, confidences = people.detect(frame)
+            stages.add("detect", start)
+            yield frame, boxes, confidences
+
+    # Reading and converting run on the prefetch thread, overlapped with inference
+    def batched():
+        for batch in prefetch_batches(iter_frames(capture, prepare), args.batch_size):
+            start = time.perf_counter()
+            detections = people.detect_batch(batch)
+            per_frame_ms = (time.perf_counter() - start) * 1000 / len(batch)
+            for frame, (boxes, confidences) in zip(batch, detections):
+                stages.add_value("detect", per_frame_ms)
+                yield frame, boxes, confidences
+
+    if args.processes and args.batch_size == 1 and not source.isdigit():
+        # Keep every worker busy: two frames per worker in flight
+        args.batch_size = 2 * args.processes
+    if args.batch_size > 1 and source.isdigit():
+        print("Batched inference needs a file source, processing the camera frame by frame")
+    frames = batched() if args.batch_size > 1 and not source.isdigit() else frame_by_frame()
+
+    wall_start = time.perf_counter()
+    try:
+        for frame, boxes, confidences in frames:
+            start = time.perf_counter()
+            tracks = people.tracker.update(boxes)
+            people.record(boxes, confidences, tracks)
+            people.enrich_tracks(frame, boxes, tracks, confidences)
+            start = stages.add("track", start)
+
+            if jsonl is not None:
+                jsonl.write(detections_record(frame_index, frame_index / source_fps, boxes, confidences, tracks,
+                                              people.result_cache))
+            if args.output:
+                annotated = people.annotate(frame, boxes, tracks)
+                start = stages.add("annotate", start)
+                if writer is None:
+                    height, width = annotated.shape[:2]
+                    writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*"mp4v"), source_fps,
+                                             (width, height))
+                writer.write(cv2.cvtColor(annotated, cv2.COLOR_RGB2BGR))
+                stages.add("write", start)
+            frame_index += 1
+            if args.max_frames and frame_index >= args.max_frames:
+                break
+    except KeyboardInterrupt:
+        print("Interrupted")
+    finally:
+        wall_time = time.perf_counter() - wall_start
+        frames.close()
+        capture.release()
+        people.backend.close()
+        if writer is not None:
+            writer.release()
+        stop_enrichment(enrichment)
+        if jsonl is not None:
+            jsonl.close()
+        if events is not None:
+            events.close()
+        if recorder is not None and recorder.events is not None:
+            recorder.events.close()
+        if replay_server is not None:
+            replay_server.stop()
+
+    print_report(frame_index, wall_time, stages, enrichment)
+    print_tiling_report(people.backend)
+    stop_metrics(metrics_server)
+    if enrichment is not None:
+        print_gate_report(people.gate)
+    return 0
+
+
+# Several sources through one shared model, batched across the streams by StreamManager
+def run_streams(args):
+    # All sources are opened before any thread starts, so a bad source or session ends the run cleanly
+    captures = []
+    for source in args.source:
+        try:
+            captures.append(open_source(source, args.realtime))
+        except (OSError, ValueError, KeyError) as e:
+            print(e)
+            for capture in captures:
+                capture.release()
+            return 2
+
+    jsonl = JsonlWriter(args.jsonl) if args.jsonl else None
+    manager = None
+
+    def person_enriched(job, attributes):
+        manager.store_result(job.stream_id, job.track_id, attributes, job.crop)
+        if jsonl is not None:
+            jsonl.write({"type": "enrichment", "stream": job.stream_id, "track_id": job.track_id,
+                         "attributes": attributes})
+
+    enrichment = start_enrichment(args, person_enriched)
+    metrics_server = start_metrics(args, enrichment)
+    events = open_events(args)
+    frame_counts = {}
+    source_fps = {}
+    writers = {}
+    done = set()
+    all_done = threading.Event()
+    stages = StageTimes()
+
+    def stream_done(stream_id):
+        done.add(stream_id)
+        if len(done) == len(args.source):
+            all_done.set()
+
+    # Runs on the scheduler thread
+    def stream_result(result):
+        stream_id = result.stream_id
+        processed = frame_counts.get(stream_id, 0)
+        if jsonl is not None:
+            record = detections_record(result.frame_index, result.timestamp, result.boxes, result.confidences,
+                                       result.tracks, manager.stream(stream_id).people.result_cache)
+            record["stream"] = stream_id
+            jsonl.write(record)
+        if args.output:
+            start = time.perf_counter()
+            if stream_id not in writers:
+                height, width = result.frame.shape[:2]
+                writers[stream_id] = cv2.VideoWriter(stream_output(args.output, stream_id),
+                                                     cv2.VideoWriter_fourcc(*"mp4v"), source_fps[stream_id],
+                                                     (width, height))
+            writers[stream_id].write(cv2.cvtColor(result.frame, cv2.COLOR_RGB2BGR))
+            stages.add("write", start)
+        frame_counts[stream_id] = processed + 1
+        if args.max_frames and processed + 1 >= args.max_frames:
+            manager.remove_stream(stream_id)
+            stream_done(stream_id)
+
+    def prepare(raw, out):
+        cv2.cvtColor(raw, cv2.COLOR_BGR2RGB, dst=out)
+        if args.mirror:
+            cv2.flip(out, 1, dst=out)
+
+    manager = StreamManager(inference_backend(args), stream_result,
+                            on_finished=stream_done,
+                            crop_sink=enrichment.submit if enrichment else None,
+                            max_batch=max(args.batch_size, len(args.source)), annotate=bool(args.output),
+                            events=events)
+    gates = {}
+    for stream_id, (source, capture) in enumerate(zip(args.source, captures)):
+        source_fps[stream_id] = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        # Cameras (and sessions replayed in real time) keep only their newest frame; files are read
+        # frame by frame as fast as the manager takes them, so every frame is processed and written
+        live = source.isdigit() or (args.realtime and is_session(source))
+        stream = manager.add_stream(stream_id, capture, prepare, max_fps=args.stream_fps or None,
+                                    source_fps=None if source.isdigit() else source_fps[stream_id],
+                                    stop_on_read_error=not source.isdigit(), schedule=args.schedule,
+                                    drop_frames=live)
+        gates[stream_id] = stream.people.gate
+
+    wall_start = time.perf_counter()
+    manager.start()
+    try:
+        while not all_done.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        print("Interrupted")
+    finally:
+        wall_time = time.perf_counter() - wall_start
+        manager.stop()
+        manager.backend.close()
+        for capture in captures:
+            capture.release()
+        for writer in writers.values():
+            writer.release()
+        stop_enrichment(enrichment)
+        if jsonl is not None:
+            jsonl.close()
+        if events is not None:
+            events.close()
+
+    frames = sum(frame_counts.values())
+    print_report(frames, wall_time, stages, enrichment)
+    print_tiling_report(manager.backend)
+    stop_metrics(metrics_server)
+    for stream_id, source in enumerate(args.source):
+        count = frame_counts.get(stream_id, 0)
+        print(f"Stream {stream_id} ({source}): {count} frames, {count / max(wall_time, 1e-9):.2f} FPS")
+        if enrichment is not None:
+            print_gate_report(gates[stream_id])
+    if manager.batches:
+        print(f"Model calls: {manager.batches}, {manager.batched_frames / manager.batches:.2f} frames per batch")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# Bulk detection (and optionally enrichment) of still images, without the Qt GUI.
+#
+#   python ingest.py Images/ --manifest manifest.jsonl --enrich
+#   python ingest.py "photos/**/*.jpg" --manifest manifest.jsonl --batch-size 16 --decode-workers 8
+#
+# Images are decoded on a thread pool and run through the model in batches. Every finished image
+# gets one line in the manifest; running the same command again skips the images already listed
+# there, so an interrupted run resumes where it stopped. With --enrich an image only counts as
+# finished once the server answered for all of its people; an image with a failed request is recorded
+# with status "failed" and processed again on the next run (the last record of a file counts).
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+import detection
+from backends import BACKENDS, create_backend
+from detection import PeopleDetection
+from enrichment import DropPolicy
+from headless import JsonlWriter, StageTimes, print_report, start_enrichment, stop_enrichment
+
+IMAGE_EXTENSIONS = (".png", ".jpeg", ".jpg", ".bmp", ".gif")
+
+# Enrichment job for one person of an image; person is the index into the record's detections
+ImageJob = namedtuple("ImageJob", ["person", "crop", "path"])
+
+
+# Image files of a directory (recursively) or a glob pattern, sorted
+def list_images(source):
+    if os.path.isdir(source):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(source) for name in names]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(path for path in paths if path.lower().endswith(IMAGE_EXTENSIONS))
+
+
+# Files whose last record in the manifest is not a failed enrichment
+def finished_files(manifest):
+    if not os.path.exists(manifest):
+        return set()
+    statuses = {}
+    with open(manifest, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # last line of an interrupted run
+            statuses[record.get("file")] = record.get("status")
+    return {path for path, status in statuses.items() if status != "failed"}
+
+
+def decode(path):
+    start = time.perf_counter()
+    image = cv2.imread(path)
+    if image is not None:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return path, image, (time.perf_counter() - start) * 1000
+
+
+# Decode on `workers` threads (cv2 releases the GIL), yielding (path, RGB image or None, decode ms)
+# in input order. At most `lookahead` images are decoded ahead of the consumer.
+def decode_images(paths, workers=4, lookahead=32):
+    paths = deque(paths)
+    pending = deque()
+    with ThreadPoolExecutor(workers, thread_name_prefix="decode") as executor:
+        while paths or pending:
+            while paths and len(pending) < lookahead:
+                pending.append(executor.submit(decode, paths.popleft()))
+            yield pending.popleft().result()
+
+
+# Collects the enrichment results of an image and writes its manifest record once all are in
+class ImageRecords:
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.written = 0
+        self.failed = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, record, people):
+        if people == 0:
+            self._write(record)
+            return
+        with self._lock:
+            self._pending[record["file"]] = [record, people]
+
+    def enriched(self, job, attributes):
+        with self._lock:
+            record, _ = self._pending[job.path]
+            record["detections"][job.person]["attributes"] = attributes
+
+    # People without attributes once all jobs are done failed after every retry
+    def done(self, job):
+        with self._lock:
+            entry = self._pending[job.path]
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._pending[job.path]
+        record = entry[0]
+        failed = sum("attributes" not in person for person in record["detections"])
+        if failed:
+            record["status"] = "failed"
+            record["error"] = f"enrichment failed for {failed} of {len(record['detections'])} people"
+            self.failed += 1
+        self._write(record)
+
+    def _write(self, record):
+        self.manifest.write(record)
+        with self._lock:
+            self.written += 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detect people in a directory or glob of images")
+    parser.add_argument("source", help="image directory (searched recursively) or glob pattern")
+    parser.add_argument("--manifest", default="manifest.jsonl",
+                        help="results, one line per image; images listed here are skipped")
+    parser.add_argument("--enrich", action="store_true", help="send every detected person to the analysis server")
+    parser.add_argument("--server-url", default=detection.server_url)
+    parser.add_argument("--workers", type=int, default=detection.ENRICHMENT_WORKERS)
+    parser.add_argument("--upload-batch", type=int, default=detection.ENRICHMENT_BATCH_SIZE,
+                        help="crops per request to the analysis server")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--backend", default=detection.INFERENCE_BACKEND, choices=BACKENDS)
+    parser.add_argument("--processes", type=int, default=detection.INFERENCE_PROCESSES)
+    parser.add_argument("--batch-size", type=int, default=detection.BATCH_SIZE)
+    parser.add_argument("--decode-workers", type=int, default=4)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    detection.server_url = args.server_url
+
+    paths = list_images(args.source)
+    finished = finished_files(args.manifest)
+    todo = [path for path in paths if path not in finished]
+    print(f"{len(paths)} images, {len(paths) - len(todo)} already in {args.manifest}, {len(todo)} to process")
+
+    manifest = JsonlWriter(args.manifest, append=True)
+    records = ImageRecords(manifest)
+    # Wait for a free queue slot instead of dropping people, every image has to be completed
+    enrichment = start_enrichment(args, records.enriched, policy=DropPolicy.BLOCK, on_done=records.done)
+    people = PeopleDetection(args.model, backend=create_backend(args.backend, args.model, processes=args.processes))
+    stages = StageTimes()
+
+    def process(batch):
+        start = time.perf_counter()
+        detections = people.detect_batch([image for _, image in batch])
+        per_image_ms = (time.perf_counter() - start) * 1000 / len(batch)
+        for (path, image), (boxes, confidences) in zip(batch, detections):
+            stages.add_value("detect", per_image_ms)
+            start = time.perf_counter()
+            height, width = image.shape[:2]
+            record = {"file": path, "status": "done", "width": width, "height": height,
+                      "detections": [{"box": [int(v) for v in box], "confidence": round(float(confidence), 4)}
+                                     for box, confidence in zip(boxes, confidences)]}
+            if enrichment is None:
+                records.add(record, 0)
+            else:
+                records.add(record, len(boxes))
+                for i, crop in enumerate(people.crops(image, boxes)):
+                    enrichment.submit(ImageJob(i, crop.copy(), path))
+            stages.add("submit", start)
+
+    wall_start = time.perf_counter()
+    batch = []
+    try:
+        for path, image, decode_ms in decode_images(todo, args.decode_workers, 4 * args.batch_size):
+            stages.add_value("decode", decode_ms)
+            if image is None:
+                records.add({"file": path, "status": "error", "error": "could not decode image"}, 0)
+                continue
+            batch.append((path, image))
+            if len(batch) == args.batch_size:
+                process(batch)
+                batch = []
+        if batch:
+            process(batch)
+        if enrichment is not None and not enrichment.join():
+            print("Enrichment did not finish, run the same command again to resume")
+    except KeyboardInterrupt:
+        print("Interrupted, run the same command again to resume")
+    finally:
+        stop_enrichment(enrichment)
+        wall_time = time.perf_counter() - wall_start
+        people.backend.close()
+        manifest.close()
+
+    print_report(records.written, wall_time, stages, enrichment, unit="images", rate="images/s")
+    if records.failed:
+        print(f"{records.failed} images with failed enrichment, run the same command again to retry them")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+QUANTILES = (0.5, 0.95, 0.99)
+_DISABLED = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, (time.perf_counter() - self.start) * 1000)
+
+
+# Process-wide hot path metrics: per-stage latency over a rolling window of samples, event counters
+# with a rolling rate (e.g. FPS) and gauges read on demand (e.g. pending uploads).
+# Everything is a no-op while disabled: time() then returns a shared null context and the other calls
+# return right away, so the instrumentation can stay in the hot path.
+#
+#   with metrics.time("inference"):
+#       ...
+#   metrics.mark("frames_rendered")
+class Metrics:
+    def __init__(self, enabled=False, window=1024, rate_window=2.0):
+        self.enabled = enabled
+        self.window = window
+        self.rate_window = rate_window
+        self._samples = {}
+        self._totals = {}  # stage -> [count, sum ms]
+        self._counters = {}
+        self._events = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def time(self, stage):
+        return _Timer(self, stage) if self.enabled else _DISABLED
+
+    def observe(self, stage, elapsed_ms):
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+                self._totals[stage] = [0, 0.0]
+            samples.append(elapsed_ms)
+            totals = self._totals[stage]
+            totals[0] += 1
+            totals[1] += elapsed_ms
+
+    # Count an event; its rate over the last rate_window seconds is available through rate()
+    def mark(self, event, count=1):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._counters[event] = self._counters.get(event, 0) + count
+            events = self._events.get(event)
+            if events is None:
+                events = self._events[event] = deque(maxlen=4096)
+            events.append(now)
+
+    # Value read when the metrics are shown or scraped, e.g. lambda: pool.pending
+    def gauge(self, name, read):
+        with self._lock:
+            self._gauges[name] = read
+
+    def remove_gauge(self, name):
+        with self._lock:
+            self._gauges.pop(name, None)
+
+    def rate(self, event):
+        now = time.monotonic()
+        with self._lock:
+            events = self._events.get(event)
+            recent = [t for t in events if now - t <= self.rate_window] if events else []
+        if len(recent) < 2:
+            return 0.0
+        return (len(recent) - 1) / max(recent[-1] - recent[0], 1e-9)
+
+    # {stage: {"count", "mean", "p50", "p95", "p99"}}, {counter: total}, {event: rate}, {gauge: value}
+    def snapshot(self):
+        with self._lock:
+            samples = {stage: np.fromiter(values, dtype=np.float64) for stage, values in self._samples.items()}
+            totals = {stage: tuple(values) for stage, values in self._totals.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        stages = {}
+        for stage, values in samples.items():
+            percentiles = np.percentile(values, [q * 100 for q in QUANTILES])
+            stages[stage] = {"count": totals[stage][0], "sum": totals[stage][1], "mean": float(values.mean()),
+                             **{f"p{round(q * 100)}": float(p) for q, p in zip(QUANTILES, percentiles)}}
+        gauge_values = {}
+        for name, read in gauges.items():
+            try:
+                gauge_values[name] = float(read())
+            except Exception:
+                continue
+        return {"stages": stages, "counters": counters, "rates": {event: self.rate(event) for event in counters},
+                "gauges": gauge_values}
+
+    # Prometheus text exposition format
+    def prometheus(self, prefix="people"):
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {prefix}_stage_latency_ms summary"]
+        for stage, values in snapshot["stages"].items():
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_latency_ms{{stage="{stage}",quantile="{q}"}} '
+                             f'{values[f"p{round(q * 100)}"]:.4f}')
+            lines.append(f'{prefix}_stage_latency_ms_sum{{stage="{stage}"}} {values["sum"]:.4f}')
+            lines.append(f'{prefix}_stage_latency_ms_count{{stage="{stage}"}} {values["count"]}')
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for event, count in snapshot["counters"].items():
+            lines.append(f'{prefix}_events_total{{event="{event}"}} {count}')
+        lines.append(f"# TYPE {prefix}_event_rate gauge")
+        for event, rate in snapshot["rates"].items():
+            lines.append(f'{prefix}_event_rate{{event="{event}"}} {rate:.4f}')
+        for name, value in snapshot["gauges"].items():
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    # Short text for the preview overlay
+    def summary_lines(self, rate_event="frames_rendered"):
+        snapshot = self.snapshot()
+        lines = [f"FPS {snapshot['rates'].get(rate_event, 0.0):.1f}"]
+        lines += [f"{name.replace('_', ' ')} {value:g}" for name, value in snapshot["gauges"].items()]
+        lines += [f"{stage:<12} p50 {values['p50']:6.1f}  p95 {values['p95']:6.1f}  p99 {values['p99']:6.1f} ms"
+                  for stage, values in snapshot["stages"].items()]
+        return lines
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = self.server.metrics.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# GET http://host:port/metrics in the Prometheus text format, served from a daemon thread
+class MetricsServer:
+    def __init__(self, metrics, host="127.0.0.1", port=9100):
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.metrics = metrics
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+metrics = Metrics()
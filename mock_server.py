@@ -0,0 +1,154 @@
+# Local stand-in for the analysis server, for development and load tests without the real getinfo service.
+#
+#   python mock_server.py --port 8000 --latency 0.2 --error-rate 0.05
+#   python headless.py video.mp4 --enrich --server-url http://127.0.0.1:8000/getinfo
+#
+# POST /getinfo with one multipart "file" part answers like the real server:
+# [json string of the hand analysis, emotion dict, [face dict]]. With several "file" parts it answers
+# {"results": [one such response per crop]}, unless started with --no-batch, in which case it only
+# analyses the first crop like a server that does not know batches.
+import argparse
+import json
+import random
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GESTURES = ("Closed_Fist", "Open_Palm", "Pointing_Up", "Thumb_Down", "Thumb_Up", "Victory", "ILoveYou")
+EMOTIONS = ("angry", "disgust", "fear", "happy", "neutral", "sad", "surprise")
+GENDERS = ("Male", "Female")
+
+
+# Image parts of a multipart/form-data body, in order
+def multipart_files(content_type, body):
+    message = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    if not message.is_multipart():
+        return []
+    return [part.get_payload(decode=True) for part in message.iter_parts()
+            if part.get_param("name", header="content-disposition") == "file"]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server behind nginx
+    # Headers and body are written separately; without TCP_NODELAY every answer waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        mock = self.server.mock
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        files = multipart_files(self.headers.get("Content-Type", ""), body)
+        if not files or not all(files):
+            self._send(400, {"error": "no file"})
+            return
+        if not mock.batching:
+            files = files[:1]
+        mock.count(len(files))
+
+        time.sleep(mock.delay(len(files)))
+        if mock.rng.random() < mock.error_rate:
+            mock.count(0, errors=1)
+            self._send(500, {"error": "simulated failure"})
+            return
+        results = [mock.response() for _ in files]
+        self._send(200, results[0] if len(results) == 1 else {"results": results})
+
+    def _send(self, status, data):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# The server runs on a daemon thread; url is the getinfo URL to give the client.
+# latency (+ per_crop_latency per crop, +- jitter) is slept before every answer, error_rate is the share
+# of requests answered with HTTP 500 and empty_rate the share of crops where nothing was recognised.
+class MockServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, per_crop_latency=0.0, jitter=0.0, error_rate=0.0,
+                 empty_rate=0.0, batching=True, seed=None):
+        self.latency = latency
+        self.per_crop_latency = per_crop_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.empty_rate = empty_rate
+        self.batching = batching
+        self.rng = random.Random(seed)
+
+        self.requests = 0
+        self.crops = 0
+        self.errors = 0
+
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/getinfo"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, crops, errors=0):
+        with self._lock:
+            self.requests += 1 if crops else 0
+            self.crops += crops
+            self.errors += errors
+
+    # Seconds to wait before answering a request with `crops` crops
+    def delay(self, crops):
+        return max(self.latency + self.per_crop_latency * crops + self.rng.uniform(-1, 1) * self.jitter, 0)
+
+    # One response in the shape JsonRead.parse_response expects
+    def response(self):
+        if self.rng.random() < self.empty_rate:
+            hand = {"gestures": [], "totalFingersAmount": 0}
+            return [json.dumps(hand), {"predicted_emotion": None}, [{"gender": None, "age": None}]]
+        hand = {"gestures": [{"name": self.rng.choice(GESTURES)}], "totalFingersAmount": self.rng.randint(0, 10)}
+        return [json.dumps(hand), {"predicted_emotion": self.rng.choice(EMOTIONS)},
+                [{"gender": self.rng.choice(GENDERS), "age": self.rng.randint(5, 80)}]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the getinfo analysis server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--per-crop-latency", type=float, default=0.0, help="extra seconds per crop")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+- seconds of uniform noise")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--empty-rate", type=float, default=0.0, help="share of crops with nothing recognised")
+    parser.add_argument("--no-batch", action="store_true", help="only analyse the first crop of a request")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = MockServer(args.host, args.port, args.latency, args.per_crop_latency, args.jitter, args.error_rate,
+                        args.empty_rate, not args.no_batch, args.seed).start()
+    print(f"Mock analysis server on {server.url}, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"{server.requests} requests, {server.crops} crops, {server.errors} errors")
+
+
+if __name__ == "__main__":
+    main()
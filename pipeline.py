@@ -0,0 +1,290 @@
+import queue
+import threading
+import time
+from collections import deque
+from queue import Empty
+
+import numpy as np
+
+from metrics import metrics
+
+
+# Bounded queue between two pipeline stages.
+# put() never blocks: when the queue is full the oldest item is dropped (latest frame wins),
+# so a slow consumer only ever sees the newest frames and latency stays bounded.
+# `on_drop` is called for every item that is dropped or cleared, e.g. to recycle its buffer.
+class LatestQueue:
+    def __init__(self, maxsize=1, on_drop=None):
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._items = deque()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if self._closed:
+                self._drop(item)
+                return False
+            dropped = False
+            while len(self._items) >= self.maxsize:
+                self._drop(self._items.popleft())
+                self.dropped += 1
+                dropped = True
+            self._items.append(item)
+            self._cond.notify()
+            return not dropped
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                raise Empty
+            if not self._items:
+                raise Empty
+            return self._items.popleft()
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._items:
+                self._drop(self._items.popleft())
+            self._cond.notify_all()
+
+    def _drop(self, item):
+        if self.on_drop is not None:
+            self.on_drop(item)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+# Recycles frame-sized numpy buffers, so the steady state of a pipeline allocates nothing.
+# acquire() only allocates when no free buffer of that shape is left.
+class BufferPool:
+    def __init__(self, max_free=8):
+        self.max_free = max_free
+        self.allocated = 0
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype))
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                return free.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, buffer):
+        key = (buffer.shape, buffer.dtype)
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            if len(free) < self.max_free:
+                free.append(buffer)
+
+
+# Source that yields a single still image, so images go through the same pipeline as videos
+class ImageSource:
+    def __init__(self, image):
+        self._image = image
+
+    def read(self, image=None):
+        image, self._image = self._image, None
+        return image is not None, image
+
+    def release(self):
+        self._image = None
+
+
+# Frames of a capture until it is exhausted, passed through `preprocess` if given
+def iter_frames(capture, preprocess=None):
+    while True:
+        ret, frame = capture.read()
+        if not ret:
+            return
+        yield preprocess(frame) if preprocess is not None else frame
+
+
+# Group `frames` into lists of batch_size on a background thread, so the next batch is decoded
+# while the current one is running through the model. At most `depth` batches are buffered.
+def prefetch_batches(frames, batch_size, depth=2):
+    batches = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        batch = []
+        try:
+            for frame in frames:
+                if stop.is_set():
+                    return
+                batch.append(frame)
+                if len(batch) == batch_size:
+                    batches.put(batch)
+                    batch = []
+            if batch:
+                batches.put(batch)
+        finally:
+            batches.put(done)
+
+    producer = threading.Thread(target=produce, name="batch-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is done:
+                return
+            yield batch
+    finally:
+        stop.set()
+        # Unblock the producer if it is waiting on a full queue
+        while producer.is_alive():
+            try:
+                batches.get(timeout=0.05)
+            except Empty:
+                pass
+
+
+# Three stage frame pipeline: capture thread -> inference worker -> render stage.
+# Stages are connected by LatestQueue, so when inference is slower than the source
+# the capture stage keeps overwriting the pending frame instead of building a backlog.
+# Frames travel in buffers from `buffers` (a BufferPool): the capture decodes into one reused
+# buffer, `preprocess(raw, out)` writes the prepared frame into a pooled buffer (flip, colour
+# conversion with dst=), detection annotates it in place and the buffer is recycled once
+# `on_frame` (run on the render thread) returns, so on_frame must copy what it keeps.
+# `on_finished` is called once the source is exhausted.
+class FramePipeline:
+    def __init__(self, capture, detection, on_frame, preprocess=None, on_finished=None,
+                 source_fps=None, stop_on_read_error=True, queue_size=1, buffers=None):
+        self.capture = capture
+        self.detection = detection
+        self.on_frame = on_frame
+        self.preprocess = preprocess
+        self.on_finished = on_finished
+        self.source_fps = source_fps
+        self.stop_on_read_error = stop_on_read_error
+        self.buffers = buffers or BufferPool()
+
+        self.captured = 0
+        self.processed = 0
+        self.rendered = 0
+
+        self._raw = None
+        self._inferenceQueue = LatestQueue(queue_size, self.buffers.release)
+        self._renderQueue = LatestQueue(queue_size, self.buffers.release)
+        self._running = threading.Event()
+        self._captureDone = threading.Event()
+        self._inferenceDone = threading.Event()
+        self._threads = []
+
+    @property
+    def dropped(self):
+        return self._inferenceQueue.dropped + self._renderQueue.dropped
+
+    def start(self):
+        self._running.set()
+        self._captureDone.clear()
+        self._inferenceDone.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="pipeline-capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="pipeline-inference", daemon=True),
+            threading.Thread(target=self._render_loop, name="pipeline-render", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        self._running.clear()
+        self._inferenceQueue.close()
+        self._renderQueue.close()
+        current = threading.current_thread()
+        for thread in self._threads:
+            if thread is not current:
+                thread.join(timeout)
+        self._threads = []
+
+    def is_running(self):
+        return self._running.is_set()
+
+    # Reads frames as fast as the source delivers them (or at `source_fps` for files)
+    def _capture_loop(self):
+        interval = 1.0 / self.source_fps if self.source_fps else 0.0
+        next_tick = time.perf_counter()
+        while self._running.is_set():
+            with metrics.time("capture"):
+                ret, raw = self.capture.read(self._raw)
+            if not ret:
+                if self.stop_on_read_error:
+                    break
+                print("Error: Could not read frame from source.")
+                time.sleep(0.01)
+                continue
+            self._raw = raw
+            frame = self.buffers.acquire(raw.shape)
+            with metrics.time("convert"):
+                if self.preprocess is not None:
+                    self.preprocess(raw, frame)
+                else:
+                    np.copyto(frame, raw)
+            self.captured += 1
+            metrics.mark("frames_captured")
+            self._inferenceQueue.put(frame)
+
+            if interval:
+                next_tick += interval
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_tick = time.perf_counter()
+        self._captureDone.set()
+
+    def _inference_loop(self):
+        while self._running.is_set():
+            try:
+                frame = self._inferenceQueue.get(timeout=0.05)
+            except Empty:
+                if not self._captureDone.is_set():
+                    continue
+                # The last frame may have been put between the timeout and the check
+                try:
+                    frame = self._inferenceQueue.get_nowait()
+                except Empty:
+                    break
+            try:
+                annotated = self.detection.detect_and_annotate(frame)
+            except Exception as e:
+                print(f"FramePipeline._inference_loop(), Error processing frame: {e}")
+                self.buffers.release(frame)
+                continue
+            if annotated is not frame:
+                self.buffers.release(frame)
+            self.processed += 1
+            metrics.mark("frames_processed")
+            self._renderQueue.put(annotated)
+        self._inferenceDone.set()
+
+    def _render_loop(self):
+        while self._running.is_set():
+            try:
+                frame = self._renderQueue.get(timeout=0.05)
+            except Empty:
+                if not self._inferenceDone.is_set():
+                    continue
+                try:
+                    frame = self._renderQueue.get_nowait()
+                except Empty:
+                    break
+            try:
+                self.on_frame(frame)
+            finally:
+                self.buffers.release(frame)
+            self.rendered += 1
+        if self._running.is_set() and self.on_finished is not None:
+            self.on_finished()
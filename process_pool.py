@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backends import InferenceBackend, create_backend
+from metrics import metrics
+
+MAX_DETECTIONS = 300  # boxes per frame that fit into a ring slot
+DETECTION_FIELDS = 5  # x1, y1, x2, y2, confidence
+
+
+# Fixed number of frame slots in one shared memory block, attached by the parent and every worker.
+# Slot i holds a frame of up to max_shape and the detections of that frame, so neither the frames nor
+# the boxes are pickled; the queues only carry slot numbers and frame shapes.
+class SharedFrameRing:
+    def __init__(self, slots, max_shape, name=None):
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.frame_bytes = int(np.prod(self.max_shape))
+        self.detection_bytes = MAX_DETECTIONS * DETECTION_FIELDS * 4
+        size = slots * (self.frame_bytes + self.detection_bytes)
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.name = self.memory.name
+
+    # Frame view of a slot with the given shape (at most max_shape bytes)
+    def frame(self, slot, shape):
+        offset = slot * self.frame_bytes
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.memory.buf, offset=offset)
+
+    def detections(self, slot):
+        offset = self.slots * self.frame_bytes + slot * self.detection_bytes
+        return np.ndarray((MAX_DETECTIONS, DETECTION_FIELDS), dtype=np.float32, buffer=self.memory.buf,
+                          offset=offset)
+
+    def fits(self, shape):
+        return int(np.prod(shape)) <= self.frame_bytes
+
+    def close(self):
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+# Entry point of a worker process: load the model once, then detect on the frames of its ring slots.
+# Messages: ("attach", ring name, slots, max shape), ("detect", slot, shape, confidence threshold), None to exit.
+def _worker_main(backend_name, model_file, input_size, threads, tasks, results):
+    # Split the cores between the workers instead of every runtime claiming all of them
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import cv2
+
+    cv2.setNumThreads(threads)
+    backend = create_backend(backend_name, model_file, input_size)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    results.put(("ready", os.getpid()))
+
+    ring = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        if task[0] == "attach":
+            if ring is not None:
+                ring.close()
+            _, name, slots, max_shape = task
+            ring = SharedFrameRing(slots, max_shape, name)
+            continue
+
+        _, slot, shape, confidence_threshold = task
+        try:
+            boxes, confidences = backend.detect(ring.frame(slot, shape), confidence_threshold)
+            count = min(len(boxes), MAX_DETECTIONS)
+            detections = ring.detections(slot)
+            detections[:count, :4] = boxes[:count]
+            detections[:count, 4] = confidences[:count]
+            results.put((slot, count, None))
+        except Exception as e:
+            results.put((slot, 0, str(e)))
+    if ring is not None:
+        ring.close()
+
+
+# Inference backend that runs another backend in a pool of worker processes, each loading the model once.
+# detect_batch() spreads the frames over the workers (two slots per worker, so a worker never waits for
+# the parent to refill) and returns the detections in input order. Frames are copied into the shared
+# ring once; tracking, enrichment and annotation stay with the caller because they depend on frame order.
+# Worker processes are spawned, not forked, so they do not inherit the parent's threads and Qt state.
+class ProcessPoolBackend(InferenceBackend):
+    def __init__(self, backend_name="pytorch", model_file="yolov8n.pt", processes=2, input_size=640,
+                 start_timeout=120.0):
+        self.name = f"{backend_name}-x{processes}"
+        self.processes = processes
+        self.ring = None
+
+        context = multiprocessing.get_context("spawn")
+        threads = max(1, (os.cpu_count() or 1) // processes)
+        self._results = context.Queue()
+        self._tasks = [context.Queue() for _ in range(processes)]
+        self._workers = [context.Process(target=_worker_main, name=f"inference-{i}", daemon=True,
+                                         args=(backend_name, model_file, input_size, threads, tasks, self._results))
+                         for i, tasks in enumerate(self._tasks)]
+        self._lock = threading.Lock()
+        for worker in self._workers:
+            worker.start()
+        try:
+            for _ in self._workers:
+                self._receive(start_timeout)
+        except Exception:
+            self.close()
+            raise
+
+    def detect(self, frame, confidence_threshold):
+        return self.detect_batch([frame], confidence_threshold)[0]
+
+    # The workers keep their own metrics; here "inference" is the whole round trip through the workers
+    def detect_batch(self, frames, confidence_threshold):
+        with self._lock, metrics.time("inference"):
+            self._ensure_ring(max((frame.shape for frame in frames), key=np.prod))
+            detections = [None] * len(frames)
+            free = list(range(self.ring.slots))
+            in_flight = {}
+            for index, frame in enumerate(frames):
+                if not free:
+                    free.append(self._collect(in_flight, detections))
+                slot = free.pop()
+                np.copyto(self.ring.frame(slot, frame.shape), frame)
+                in_flight[slot] = index
+                self._tasks[slot % self.processes].put(("detect", slot, frame.shape, confidence_threshold))
+            while in_flight:
+                self._collect(in_flight, detections)
+            return detections
+
+    def close(self):
+        for tasks, worker in zip(self._tasks, self._workers):
+            if worker.is_alive():
+                tasks.put(None)
+        for worker in self._workers:
+            worker.join(2.0)
+            if worker.is_alive():
+                worker.terminate()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    # (Re)create the ring when a frame does not fit, and attach every worker to it
+    def _ensure_ring(self, shape):
+        if self.ring is not None and self.ring.fits(shape):
+            return
+        if self.ring is not None:
+            self.ring.close()
+        self.ring = SharedFrameRing(2 * self.processes, shape)
+        for tasks in self._tasks:
+            tasks.put(("attach", self.ring.name, self.ring.slots, self.ring.max_shape))
+
+    # Wait for one finished slot, store its detections and return the slot
+    def _collect(self, in_flight, detections):
+        slot, count, error = self._receive()
+        index = in_flight.pop(slot)
+        if error is not None:
+            print(f"ProcessPoolBackend.detect_batch(), Error in worker: {error}")
+            detections[index] = self.empty()
+        else:
+            data = self.ring.detections(slot)[:count]
+            detections[index] = data[:, :4].astype(np.int32), data[:, 4].copy()
+        return slot
+
+    # Next message of any worker. Polls, so a worker that died (e.g. while loading the model) is noticed
+    # within a fraction of a second instead of after the whole timeout
+    def _receive(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self._results.get(timeout=0.2)
+            except queue.Empty:
+                for worker in self._workers:
+                    if not worker.is_alive():
+                        raise RuntimeError(f"Inference worker {worker.name} exited with code {worker.exitcode}")
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError("Inference workers did not start in time")
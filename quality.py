@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import Counter, namedtuple
+
+import cv2
+import numpy as np
+
+
+# Quality of one person crop; `reason` names the first failed check, None when the crop passed
+CropScore = namedtuple("CropScore", ["area", "sharpness", "truncated_sides", "aspect", "confidence", "score",
+                                     "reason"])
+
+
+# Cheap quality checks in front of the enrichment uploads.
+# A crop is rejected when it is smaller than min_area pixels, blurred (Laplacian variance of the crop
+# scaled to sharpness_height rows below min_sharpness), cut by more than max_truncated_sides frame
+# edges, has a height / width ratio outside [min_aspect, max_aspect] or a confidence below
+# min_confidence. Of the crops that pass, the best scored ones go forward, at most top_k per
+# `window` seconds; the budget is spent greedily frame by frame, so it never delays an upload.
+# A disabled gate passes every crop but still scores them, so the statistics show what it would have
+# avoided and the enrichment hit rate can be compared with gating on and off.
+class CropGate:
+    def __init__(self, min_area=48 * 96, min_sharpness=40.0, max_truncated_sides=1, min_aspect=1.0,
+                 max_aspect=5.0, min_confidence=0.7, top_k=4, window=1.0, edge_margin=2, sharpness_height=128,
+                 enabled=True):
+        self.enabled = enabled
+        self.min_area = min_area
+        self.min_sharpness = min_sharpness
+        self.max_truncated_sides = max_truncated_sides
+        self.min_aspect = min_aspect
+        self.max_aspect = max_aspect
+        self.min_confidence = min_confidence
+        self.top_k = top_k
+        self.window = window
+        self.edge_margin = edge_margin
+        self.sharpness_height = sharpness_height
+
+        self.scored = 0
+        self.passed = 0
+        self.over_budget = 0
+        self.rejected = Counter()
+        self.results = 0
+        self.useful_results = 0
+
+        self._window_start = None
+        self._window_count = 0
+        self._lock = threading.Lock()
+
+    # Uploads avoided so far: rejected crops plus crops over the per-window budget
+    @property
+    def avoided(self):
+        return sum(self.rejected.values()) + self.over_budget if self.enabled else 0
+
+    def score(self, frame, box, confidence=1.0):
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = (int(v) for v in box)
+        x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, width), min(y2, height)
+        box_width, box_height = max(x2 - x1, 0), max(y2 - y1, 0)
+        area = box_width * box_height
+        aspect = box_height / box_width if box_width else 0.0
+        margin = self.edge_margin
+        truncated_sides = int(x1 <= margin) + int(y1 <= margin) + int(x2 >= width - margin) + \
+            int(y2 >= height - margin)
+        sharpness = self.sharpness(frame[y1:y2, x1:x2]) if area else 0.0
+
+        reason = None
+        if area < self.min_area:
+            reason = "area"
+        elif confidence < self.min_confidence:
+            reason = "confidence"
+        elif not self.min_aspect <= aspect <= self.max_aspect:
+            reason = "aspect"
+        elif truncated_sides > self.max_truncated_sides:
+            reason = "truncated"
+        elif sharpness < self.min_sharpness:
+            reason = "sharpness"
+        score = confidence * np.sqrt(area) * min(sharpness / self.min_sharpness, 3.0)
+        score *= 1 - 0.25 * truncated_sides
+        return CropScore(area, sharpness, truncated_sides, aspect, float(confidence), float(score), reason)
+
+    # Laplacian variance of the grey crop, scaled to a fixed height so small and large crops compare
+    def sharpness(self, crop):
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        scale = self.sharpness_height / gray.shape[0]
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    # Indices of the crops to upload, best first
+    def select(self, frame, boxes, confidences=None):
+        if confidences is None:
+            confidences = np.ones(len(boxes), dtype=np.float32)
+        scores = [self.score(frame, box, confidence) for box, confidence in zip(boxes, confidences)]
+        passing = sorted((i for i, score in enumerate(scores) if score.reason is None),
+                         key=lambda i: scores[i].score, reverse=True)
+
+        now = time.monotonic()
+        with self._lock:
+            if self._window_start is None or now - self._window_start >= self.window:
+                self._window_start = now
+                self._window_count = 0
+            budget = max(self.top_k - self._window_count, 0)
+            selected = passing[:budget]
+            self._window_count += len(selected)
+
+            self.scored += len(scores)
+            self.over_budget += len(passing) - len(selected)
+            self.rejected.update(score.reason for score in scores if score.reason is not None)
+            if not self.enabled:
+                selected = sorted(range(len(scores)), key=lambda i: scores[i].score, reverse=True)
+            self.passed += len(selected)
+        return selected
+
+    # Count an enrichment result; useful when the server recognised a gesture, an emotion or a gender
+    def record_result(self, attributes):
+        useful = any(attributes.get(key) is not None for key in ("gesture", "emotion", "gender"))
+        with self._lock:
+            self.results += 1
+            self.useful_results += int(useful)
+
+    def stats(self):
+        with self._lock:
+            return {"enabled": self.enabled, "scored": self.scored, "passed": self.passed, "avoided": self.avoided,
+                    "over_budget": self.over_budget, "rejected": dict(self.rejected),
+                    "results": self.results, "useful_results": self.useful_results,
+                    "hit_rate": self.useful_results / self.results if self.results else None}
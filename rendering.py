@@ -0,0 +1,37 @@
+import cv2
+from PyQt6.QtGui import QImage
+
+from pipeline import BufferPool
+
+
+# Scales annotated RGB frames to the preview size into recycled buffers and wraps them as QImage
+# without copying. The target size (fit inside width x height, keeping the aspect ratio) is
+# computed once per source resolution. The QImage borrows the buffer: keep the returned buffer
+# alive until the image has been converted to a pixmap, then hand it back with release().
+class PreviewRenderer:
+    def __init__(self, width=1024, height=768, buffers=None):
+        self.width = width
+        self.height = height
+        self.buffers = buffers or BufferPool()
+        self._source_shape = None
+        self._target_size = None
+
+    def render(self, frame):
+        if frame.shape != self._source_shape:
+            self._source_shape = frame.shape
+            height, width = frame.shape[:2]
+            scale = min(self.width / width, self.height / height)
+            self._target_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+        width, height = self._target_size
+        buffer = self.buffers.acquire((height, width, 3))
+        if (width, height) == (frame.shape[1], frame.shape[0]):
+            buffer[...] = frame
+        else:
+            # Bilinear, like the Qt smooth transformation it replaces
+            cv2.resize(frame, (width, height), dst=buffer, interpolation=cv2.INTER_LINEAR)
+        q_image = QImage(buffer.data, width, height, 3 * width, QImage.Format.Format_RGB888)
+        return q_image, buffer
+
+    def release(self, buffer):
+        self.buffers.release(buffer)
@@ -0,0 +1,321 @@
+# Recording of capture sessions and their deterministic replay.
+#
+#   python headless.py 0 --record sessions/entrance --enrich --max-frames 900
+#   python headless.py sessions/entrance --enrich --replay-responses --workers 1
+#   python headless.py sessions/entrance --realtime
+#
+# A session directory holds the frames (MJPG video or lossless chunked raw frames), session.json with
+# the frame format and session.jsonl with the frame timestamps, the detections, the enrichment results
+# and the raw server responses. ReplaySource reads the frames back with the cv2.VideoCapture interface,
+# paced like the recording or as fast as possible, and ReplayServer answers the analysis requests with
+# the recorded responses in recorded order (with the recorded latencies), so runs of two builds see the
+# same frames and the same server and their timings can be compared. With one enrichment worker the
+# responses also reach the same tracks in every run.
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from mock_server import MockServer
+
+SESSION_VERSION = 1
+
+
+# Lossy but compact: MJPG in frames.avi
+class _VideoFrames:
+    def __init__(self, directory, fps):
+        self.directory = directory
+        self.fps = fps
+        self._writer = None
+
+    def write(self, frame):
+        if self._writer is None:
+            height, width = frame.shape[:2]
+            self._writer = cv2.VideoWriter(os.path.join(self.directory, "frames.avi"),
+                                           cv2.VideoWriter_fourcc(*"MJPG"), self.fps, (width, height))
+        self._writer.write(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.release()
+
+
+# Lossless: raw frames in memory-mapped chunk files of chunk_frames frames each (frames-000000.raw, ...)
+class _ChunkedFrames:
+    def __init__(self, directory, chunk_frames):
+        self.directory = directory
+        self.chunk_frames = chunk_frames
+        self.frames = 0
+        self._chunk = None
+
+    @staticmethod
+    def path(directory, chunk):
+        return os.path.join(directory, f"frames-{chunk:06d}.raw")
+
+    def write(self, frame):
+        slot = self.frames % self.chunk_frames
+        if slot == 0:
+            if self._chunk is not None:
+                self._chunk.flush()
+            self._chunk = np.memmap(self.path(self.directory, self.frames // self.chunk_frames), np.uint8, "w+",
+                                    shape=(self.chunk_frames,) + frame.shape)
+        self._chunk[slot] = frame
+        self.frames += 1
+
+    # The last chunk is cut down to the frames it holds
+    def close(self):
+        if self._chunk is None:
+            return
+        self._chunk.flush()
+        path, used = self._chunk.filename, self.frames - (self.frames - 1) // self.chunk_frames * self.chunk_frames
+        size = used * self._chunk[0].nbytes
+        self._chunk = None
+        os.truncate(path, size)
+
+
+# Writes a session directory. Frames come in through RecordingCapture, detections and results through
+# the event store interface (append_detections / append_result, so it can be given to PeopleDetection as
+# `events`; calls are passed on to `events` if given) and server responses through RecordingSession.
+# Detections are stored with the index of the last recorded frame, which is their frame when frames are
+# processed one by one (headless) and the newest captured frame in the threaded GUI pipeline.
+class SessionRecorder:
+    def __init__(self, directory, frame_format="video", fps=30.0, chunk_frames=256, events=None, source=None):
+        if frame_format not in ("video", "raw"):
+            raise ValueError(f"Unknown frame format: {frame_format}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.frame_format = frame_format
+        self.fps = fps
+        self.chunk_frames = chunk_frames
+        self.events = events
+        self.source = source
+
+        self.frames = 0
+        self.shape = None
+        self._frames = _VideoFrames(directory, fps) if frame_format == "video" else _ChunkedFrames(directory,
+                                                                                                  chunk_frames)
+        self._start = None
+        self._last_time = 0.0
+        self._file = open(os.path.join(directory, "session.jsonl"), "w", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    # Seconds since the first frame
+    def clock(self):
+        if self._start is None:
+            self._start = time.monotonic()
+        return time.monotonic() - self._start
+
+    def record_frame(self, frame):
+        with self._lock:
+            offset = self.clock()
+            self._frames.write(frame)
+            self.shape = frame.shape
+            index = self.frames
+            self.frames += 1
+            self._last_time = offset
+            self._write({"type": "frame", "index": index, "t": round(offset, 6)})
+        return index
+
+    def append_detections(self, stream_id, tracks, boxes, confidences=None, timestamp=None):
+        if self.events is not None:
+            self.events.append_detections(stream_id, tracks, boxes, confidences, timestamp)
+        with self._lock:
+            self._write({"type": "detections", "frame": self.frames - 1, "t": round(self.clock(), 6),
+                         "stream": stream_id, "track_ids": [track.track_id for track in tracks],
+                         "boxes": np.asarray(boxes).tolist(),
+                         "confidences": None if confidences is None else np.round(confidences, 4).tolist()})
+
+    def append_result(self, stream_id, track_id, attributes, crop=None, timestamp=None):
+        if self.events is not None:
+            self.events.append_result(stream_id, track_id, attributes, crop, timestamp)
+        with self._lock:
+            self._write({"type": "result", "t": round(self.clock(), 6), "stream": stream_id, "track_id": track_id,
+                         "attributes": attributes})
+
+    def record_response(self, crops, status, content, elapsed):
+        with self._lock:
+            self._write({"type": "response", "t": round(self.clock(), 6), "crops": crops, "status": status,
+                         "elapsed": round(elapsed, 6), "body": content.decode("utf-8", "replace")})
+
+    # Wrap a requests session (e.g. EnrichmentPool.session) so its responses are recorded
+    def session(self, session):
+        return RecordingSession(session, self)
+
+    def close(self):
+        with self._lock:
+            self._frames.close()
+            self._file.close()
+            height, width = self.shape[:2] if self.shape else (0, 0)
+            duration = self._last_time
+            metadata = {"version": SESSION_VERSION, "format": self.frame_format, "frames": self.frames,
+                        "width": width, "height": height, "channels": self.shape[2] if self.shape else 3,
+                        "fps": (self.frames - 1) / duration if duration > 0 else self.fps,
+                        "chunk_frames": self.chunk_frames, "duration": duration, "source": self.source}
+            with open(os.path.join(self.directory, "session.json"), "w", encoding="utf-8") as file:
+                json.dump(metadata, file, indent=2)
+
+    def _write(self, record):
+        if self._file.closed:
+            return  # results arriving after the session was closed
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+# Capture wrapper that records every frame it reads; everything else goes to the wrapped capture
+class RecordingCapture:
+    def __init__(self, capture, recorder):
+        self.capture = capture
+        self.recorder = recorder
+
+    def read(self, image=None):
+        ret, frame = self.capture.read(image) if image is not None else self.capture.read()
+        if ret:
+            self.recorder.record_frame(frame)
+        return ret, frame
+
+    def __getattr__(self, name):
+        return getattr(self.capture, name)
+
+
+# requests session wrapper that records the raw responses (a failed request raises like before)
+class RecordingSession:
+    def __init__(self, session, recorder):
+        self.session = session
+        self.recorder = recorder
+
+    def post(self, url, files=None, data=None, timeout=None, **kwargs):
+        start = time.perf_counter()
+        response = self.session.post(url, files=files, data=data, timeout=timeout, **kwargs)
+        crops = len(files) if isinstance(files, list) else 1
+        self.recorder.record_response(crops, response.status_code, response.content, time.perf_counter() - start)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+def load_records(directory, record_type=None):
+    with open(os.path.join(directory, "session.jsonl"), encoding="utf-8") as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    return [record for record in records if record_type is None or record["type"] == record_type]
+
+
+def is_session(path):
+    return os.path.isfile(os.path.join(path, "session.json"))
+
+
+# Per-crop results and per-request latencies of the successful server responses of a session
+def load_responses(directory):
+    responses, latencies = [], []
+    for record in load_records(directory, "response"):
+        if record["status"] != 200:
+            continue
+        data = json.loads(record["body"])
+        if isinstance(data, dict) and "results" in data:
+            responses.extend(result for result in data["results"] if result is not None)
+        else:
+            responses.append(data)
+        latencies.append(record["elapsed"])
+    return responses, latencies
+
+
+# Frames of a recorded session through the cv2.VideoCapture interface, so it can replace the camera or
+# video capture. With `realtime` the frames are handed out at their recorded times, otherwise as fast
+# as they are read. Raw sessions return read-only views of the memory-mapped chunks (no copy).
+class ReplaySource:
+    def __init__(self, directory, realtime=True):
+        self.directory = directory
+        self.realtime = realtime
+        with open(os.path.join(directory, "session.json"), encoding="utf-8") as file:
+            self.metadata = json.load(file)
+        self.times = np.array([record["t"] for record in load_records(directory, "frame")])
+        self.frames = min(self.metadata["frames"], len(self.times))
+        self.index = 0
+
+        self._start = None
+        self._video = None
+        self._chunks = {}
+        if self.metadata["format"] == "video":
+            self._video = cv2.VideoCapture(os.path.join(directory, "frames.avi"))
+
+    def isOpened(self):
+        return self._video.isOpened() if self._video is not None else True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.metadata["fps"]
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.metadata["width"]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.metadata["height"]
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frames
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.index
+        return 0.0
+
+    def read(self, image=None):
+        if self.index >= self.frames:
+            return False, None
+        if self.realtime:
+            if self._start is None:
+                self._start = time.monotonic() - self.times[self.index]
+            delay = self._start + self.times[self.index] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        if self._video is not None:
+            ret, frame = self._video.read(image) if image is not None else self._video.read()
+        else:
+            ret, frame = True, self._raw_frame(self.index)
+        self.index += 1
+        return ret, frame
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
+        self._chunks = {}
+
+    def _raw_frame(self, index):
+        chunk_frames = self.metadata["chunk_frames"]
+        number = index // chunk_frames
+        chunk = self._chunks.get(number)
+        if chunk is None:
+            frames = min(chunk_frames, self.metadata["frames"] - number * chunk_frames)
+            shape = (frames, self.metadata["height"], self.metadata["width"], self.metadata["channels"])
+            # Only the current chunk stays mapped
+            self._chunks = {number: np.memmap(_ChunkedFrames.path(self.directory, number), np.uint8, "r",
+                                              shape=shape)}
+            chunk = self._chunks[number]
+        return chunk[index % chunk_frames]
+
+
+# Local analysis server answering with the responses recorded in a session, crop by crop in recorded
+# order (starting over when they run out). Raises ValueError for a session without successful responses,
+# check load_responses first to report that. Each request is delayed by the next recorded request time
+# when `recorded_latency` is set, else by the MockServer latency settings.
+class ReplayServer(MockServer):
+    def __init__(self, directory, host="127.0.0.1", port=0, recorded_latency=True, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.recorded_latency = recorded_latency
+        self._responses, self._latencies = load_responses(directory)
+        if not self._responses:
+            raise ValueError(f"ReplayServer(), No recorded responses in {directory}")
+        self._next_response = 0
+        self._next_latency = 0
+        self._replay_lock = threading.Lock()
+
+    def delay(self, crops):
+        if not self.recorded_latency or not self._latencies:
+            return super().delay(crops)
+        with self._replay_lock:
+            latency = self._latencies[self._next_latency % len(self._latencies)]
+            self._next_latency += 1
+        return latency
+
+    def response(self):
+        with self._replay_lock:
+            response = self._responses[self._next_response % len(self._responses)]
+            self._next_response += 1
+        return response
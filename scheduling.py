@@ -0,0 +1,136 @@
+import time
+
+import cv2
+import numpy as np
+
+
+SCHEDULE_MODES = ("every_frame", "fixed", "adaptive")
+
+
+# Decides on which frames the detector runs and carries the boxes forward in between.
+# mode "every_frame" runs the detector on every frame (the original behaviour),
+# "fixed" runs it every keyframe_interval frames and "adaptive" tunes the interval from the
+# measured detection and propagation latency so the average cost per frame fits target_fps.
+# Between keyframes the boxes are moved by the median sparse optical flow of the points inside them,
+# falling back to the box velocity of the previous frame when no point could be tracked.
+class DetectionScheduler:
+    def __init__(self, mode="adaptive", target_fps=30.0, keyframe_interval=1, max_interval=8,
+                 flow_width=320, smoothing=0.2):
+        if mode not in SCHEDULE_MODES:
+            raise ValueError(f"Unknown detection schedule: {mode}")
+        self.mode = mode
+        self.target_fps = target_fps
+        self.keyframe_interval = keyframe_interval if mode != "every_frame" else 1
+        self.max_interval = max_interval
+        self.flow_width = flow_width
+        self.smoothing = smoothing
+
+        self.detect_ms = None
+        self.propagate_ms = None
+        self.keyframes = 0
+        self.propagated = 0
+        self.reset()
+
+    def reset(self):
+        self._prev_gray = None
+        self._prev_shape = None
+        self._boxes = np.empty((0, 4), dtype=np.float32)
+        self._confidences = np.empty((0,), dtype=np.float32)
+        self._velocity = np.empty((0, 2), dtype=np.float32)
+        self._scale = 1.0
+        self._since_keyframe = 0
+
+    def should_detect(self, frame):
+        if self.keyframe_interval <= 1 or self._prev_gray is None:
+            return True
+        if self._prev_shape != frame.shape[:2]:
+            return True
+        return self._since_keyframe >= self.keyframe_interval
+
+    # True when a keyframe is needed or at least `fraction` of the keyframe interval has passed, so a
+    # stream can take an early keyframe together with other streams (streams.StreamManager)
+    def keyframe_due(self, frame, fraction=0.5):
+        return self.should_detect(frame) or self._since_keyframe >= fraction * self.keyframe_interval
+
+    # Store the detector output of a keyframe
+    def keyframe(self, frame, boxes, confidences, detect_ms):
+        self.keyframes += 1
+        self.detect_ms = self._smooth(self.detect_ms, detect_ms)
+        self._since_keyframe = 1
+        self._boxes = boxes.astype(np.float32)
+        self._confidences = confidences
+        self._velocity = np.zeros((len(boxes), 2), dtype=np.float32)
+        if self.keyframe_interval > 1 or self.mode == "adaptive":
+            self._prev_gray = self._gray(frame)
+        self._tune()
+
+    # Estimate the boxes of a non-keyframe from the motion since the previous frame
+    def propagate(self, frame):
+        start = time.perf_counter()
+        gray = self._gray(frame)
+        if len(self._boxes):
+            shift = self._flow(self._prev_gray, gray)
+            self._boxes += np.tile(shift, 2)
+            self._velocity = shift
+            height, width = frame.shape[:2]
+            np.clip(self._boxes, 0, (width, height, width, height), out=self._boxes)
+        self._prev_gray = gray
+        self._since_keyframe += 1
+        self.propagated += 1
+        self.propagate_ms = self._smooth(self.propagate_ms, (time.perf_counter() - start) * 1000)
+        return self._boxes.astype(np.int32), self._confidences
+
+    # Median optical flow of the corners inside each box, in full resolution pixels
+    def _flow(self, prev_gray, gray):
+        shift = self._velocity.copy()
+        small_boxes = self._boxes * self._scale
+        points, owners = [], []
+        for i, (x1, y1, x2, y2) in enumerate(small_boxes.astype(np.int32)):
+            region = prev_gray[y1:y2, x1:x2]
+            if region.size == 0:
+                continue
+            corners = cv2.goodFeaturesToTrack(region, maxCorners=20, qualityLevel=0.01, minDistance=3)
+            if corners is None:
+                continue
+            corners = corners.reshape(-1, 2) + (x1, y1)
+            points.append(corners)
+            owners.append(np.full(len(corners), i))
+        if not points:
+            return shift
+
+        points = np.concatenate(points).astype(np.float32)
+        owners = np.concatenate(owners)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, winSize=(15, 15), maxLevel=2)
+        valid = status.reshape(-1) == 1
+        displacement = (moved.reshape(-1, 2) - points) / self._scale
+        for i in np.unique(owners[valid]):
+            shift[i] = np.median(displacement[valid & (owners == i)], axis=0)
+        return shift
+
+    def _gray(self, frame):
+        self._prev_shape = frame.shape[:2]
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        width = gray.shape[1]
+        self._scale = min(1.0, self.flow_width / width)
+        if self._scale < 1.0:
+            gray = cv2.resize(gray, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+        return gray
+
+    # Smallest interval N with (detect + (N - 1) * propagate) / N <= frame budget
+    def _tune(self):
+        if self.mode != "adaptive" or self.detect_ms is None:
+            return
+        budget = 1000.0 / self.target_fps
+        propagate_ms = self.propagate_ms or 0.0
+        if self.detect_ms <= budget:
+            interval = 1
+        elif propagate_ms >= budget:
+            interval = self.max_interval
+        else:
+            interval = int(np.ceil((self.detect_ms - propagate_ms) / (budget - propagate_ms)))
+        self.keyframe_interval = int(min(max(interval, 1), self.max_interval))
+
+    def _smooth(self, average, value):
+        if average is None:
+            return value
+        return (1 - self.smoothing) * average + self.smoothing * value
@@ -0,0 +1,297 @@
+import threading
+import time
+from collections import namedtuple
+from queue import Empty
+
+import numpy as np
+
+from detection import (DETECTION_SCHEDULE, KEYFRAME_INTERVAL, MAX_KEYFRAME_INTERVAL, TARGET_FPS,
+                       PeopleDetection)
+from pipeline import BufferPool, LatestQueue
+from scheduling import DetectionScheduler
+
+
+# Detections of one frame of one stream. frame_index counts the frames read from the source (dropped
+# ones included), timestamp is the frame's time in seconds since the stream started: its position in
+# the file for sources with a known source_fps, else the capture time.
+StreamResult = namedtuple("StreamResult", ["stream_id", "frame", "boxes", "confidences", "tracks", "frame_index",
+                                           "timestamp"])
+
+
+# One source of a StreamManager. A capture thread keeps only the newest frame (latest frame wins),
+# in a pooled buffer like FramePipeline. Each stream has its own tracker, detection scheduler and
+# result cache, the model itself is shared through the PeopleDetection backend.
+# `max_fps` caps how often the manager takes a frame from this stream (None = as often as possible).
+# With `drop_frames` off the capture thread waits until the manager took the pending frame instead of
+# replacing it, so every frame is processed (file sources).
+class VideoStream:
+    def __init__(self, stream_id, capture, people, preprocess=None, max_fps=None, source_fps=None,
+                 stop_on_read_error=True, buffers=None, on_frame=None, drop_frames=True):
+        self.stream_id = stream_id
+        self.capture = capture
+        self.people = people
+        self.preprocess = preprocess
+        self.max_fps = max_fps
+        self.source_fps = source_fps
+        self.stop_on_read_error = stop_on_read_error
+        self.buffers = buffers or BufferPool()
+        self.on_frame = on_frame
+        self.drop_frames = drop_frames
+
+        self.captured = 0
+        self.processed = 0
+
+        self._raw = None
+        # Items are (frame, frame_index, timestamp)
+        self._queue = LatestQueue(1, lambda item: self.buffers.release(item[0]))
+        self._taken = threading.Event()
+        self._running = threading.Event()
+        self._done = threading.Event()
+        self._next_due = 0.0
+        self._thread = None
+
+    @property
+    def dropped(self):
+        return self._queue.dropped
+
+    def start(self):
+        self._running.set()
+        self._done.clear()
+        self._thread = threading.Thread(target=self._capture_loop, name=f"stream-{self.stream_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._running.clear()
+        self._queue.close()
+        self._taken.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    # Source exhausted and its last frame taken
+    def finished(self):
+        return self._done.is_set() and len(self._queue) == 0
+
+    # Newest (frame, frame_index, timestamp) if the stream is within its FPS budget, else None
+    def take(self, now):
+        if now < self._next_due:
+            return None
+        try:
+            item = self._queue.get(timeout=0)
+        except Empty:
+            return None
+        self._taken.set()
+        if self.max_fps:
+            # Counted from the later of the due time and now: no credit accumulates while the stream had
+            # nothing to deliver
+            self._next_due = max(self._next_due, now) + 1.0 / self.max_fps
+        return item
+
+    # Seconds until the pending frame may be taken, None when no frame is pending
+    def due_in(self, now):
+        if len(self._queue) == 0:
+            return None
+        return max(self._next_due - now, 0.0)
+
+    def _capture_loop(self):
+        # A stream that does not drop frames is paced by the manager taking them
+        interval = 1.0 / self.source_fps if self.source_fps and self.drop_frames else 0.0
+        next_tick = started = time.perf_counter()
+        index = 0
+        while self._running.is_set():
+            ret, raw = self.capture.read(self._raw)
+            if not ret:
+                if self.stop_on_read_error:
+                    break
+                print(f"VideoStream._capture_loop(), Error reading stream {self.stream_id}")
+                time.sleep(0.01)
+                continue
+            self._raw = raw
+            frame = self.buffers.acquire(raw.shape)
+            if self.preprocess is not None:
+                self.preprocess(raw, frame)
+            else:
+                np.copyto(frame, raw)
+            timestamp = index / self.source_fps if self.source_fps else time.perf_counter() - started
+            self.captured += 1
+            self._taken.clear()
+            self._queue.put((frame, index, timestamp))
+            index += 1
+            if self.on_frame is not None:
+                self.on_frame()
+            if not self.drop_frames:
+                while len(self._queue) and self._running.is_set():
+                    self._taken.wait(0.1)
+                    self._taken.clear()
+
+            if interval:
+                next_tick += interval
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_tick = time.perf_counter()
+        self._done.set()
+        if self.on_frame is not None:
+            self.on_frame()
+
+
+# Runs several sources through one shared model.
+# Each round the scheduler thread takes the newest frame of every stream that is within its FPS
+# budget, in round-robin order starting one stream further each round so no stream is starved when
+# the batch is full. Streams whose DetectionScheduler wants a keyframe go into one backend batch, the
+# others propagate their boxes. `on_result` gets a StreamResult per frame (annotated when `annotate`
+# is set) on the scheduler thread; the frame buffer is recycled afterwards, so copy what you keep.
+# `on_finished(stream_id)` is called when a file source is exhausted. Detections and results of all
+# streams are recorded in `events` (an events.EventStore), if given, under their stream ID.
+class StreamManager:
+    def __init__(self, backend, on_result, on_finished=None, crop_sink=None, max_batch=8, annotate=True,
+                 buffers=None, events=None):
+        self.backend = backend
+        self.events = events
+        self.on_result = on_result
+        self.on_finished = on_finished
+        self.crop_sink = crop_sink
+        self.max_batch = max_batch
+        self.annotate = annotate
+        self.buffers = buffers or BufferPool(max_free=16)
+
+        self.batches = 0
+        self.batched_frames = 0
+
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = threading.Event()
+        self._offset = 0
+        self._thread = None
+
+    def add_stream(self, stream_id, capture, preprocess=None, max_fps=None, source_fps=None,
+                   stop_on_read_error=True, schedule=DETECTION_SCHEDULE, drop_frames=True):
+        people = PeopleDetection(backend=self.backend, crop_sink=self.crop_sink, stream_id=stream_id,
+                                 events=self.events,
+                                 scheduler=DetectionScheduler(schedule, max_fps or TARGET_FPS, KEYFRAME_INTERVAL,
+                                                              MAX_KEYFRAME_INTERVAL))
+        stream = VideoStream(stream_id, capture, people, preprocess, max_fps, source_fps, stop_on_read_error,
+                             self.buffers, self._wake.set, drop_frames)
+        with self._lock:
+            if stream_id in self._streams:
+                raise ValueError(f"Stream {stream_id} already exists")
+            self._streams[stream_id] = stream
+        if self._running.is_set():
+            stream.start()
+        return stream
+
+    def remove_stream(self, stream_id):
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+        if stream is not None:
+            stream.stop()
+        return stream
+
+    def stream(self, stream_id):
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def streams(self):
+        with self._lock:
+            return list(self._streams.values())
+
+    # Enrichment results are cached per stream, track IDs are only unique within a stream
+    def store_result(self, stream_id, track_id, attributes, crop=None):
+        stream = self.stream(stream_id)
+        if stream is not None:
+            stream.people.store_result(track_id, attributes, crop)
+
+    def start(self):
+        self._running.set()
+        for stream in self.streams():
+            stream.start()
+        self._thread = threading.Thread(target=self._schedule_loop, name="stream-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._running.clear()
+        self._wake.set()
+        for stream in self.streams():
+            stream.stop(timeout)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_running(self):
+        return self._running.is_set()
+
+    def _schedule_loop(self):
+        while self._running.is_set():
+            self._wake.wait(self._wait_time())
+            self._wake.clear()
+            for stream in self.streams():
+                if stream.finished():
+                    self.remove_stream(stream.stream_id)
+                    if self.on_finished is not None:
+                        self.on_finished(stream.stream_id)
+            batch = self._collect()
+            if batch:
+                self._process(batch)
+                # Other streams may have delivered frames meanwhile
+                self._wake.set()
+
+    # Sleep until the next stream with a pending frame is within its FPS budget (or a new frame arrives)
+    def _wait_time(self):
+        now = time.perf_counter()
+        waits = [wait for wait in (stream.due_in(now) for stream in self.streams()) if wait is not None]
+        return min(waits + [0.05])
+
+    # Up to max_batch (stream, (frame, frame_index, timestamp)) pairs, one per stream, fair round-robin
+    def _collect(self):
+        streams = self.streams()
+        if not streams:
+            return []
+        now = time.perf_counter()
+        start = self._offset % len(streams)
+        self._offset += 1
+        batch = []
+        for stream in streams[start:] + streams[:start]:
+            item = stream.take(now)
+            if item is not None:
+                batch.append((stream, item))
+                if len(batch) == self.max_batch:
+                    break
+        return batch
+
+    # Streams whose scheduler wants a keyframe are detected together with the streams that are at
+    # least halfway to their next keyframe, so the keyframes of the streams line up and share batches
+    # instead of each stream going through the model alone.
+    def _process(self, batch):
+        keyframes = []
+        if any(stream.people.scheduler.should_detect(frame) for stream, (frame, _, _) in batch):
+            keyframes = [(stream, frame) for stream, (frame, _, _) in batch
+                         if stream.people.scheduler.keyframe_due(frame, 0.5)]
+        detections = {}
+        if keyframes:
+            start = time.perf_counter()
+            results = keyframes[0][0].people.detect_batch([frame for _, frame in keyframes])
+            per_frame_ms = (time.perf_counter() - start) * 1000 / len(keyframes)
+            self.batches += 1
+            self.batched_frames += len(keyframes)
+            for (stream, frame), (boxes, confidences) in zip(keyframes, results):
+                stream.people.scheduler.keyframe(frame, boxes, confidences, per_frame_ms)
+                detections[stream.stream_id] = boxes, confidences
+
+        for stream, (frame, frame_index, timestamp) in batch:
+            try:
+                people = stream.people
+                boxes, confidences = detections.get(stream.stream_id) or people.scheduler.propagate(frame)
+                tracks = people.tracker.update(boxes)
+                people.record(boxes, confidences, tracks)
+                people.enrich_tracks(frame, boxes, tracks, confidences)
+                if self.annotate:
+                    people.annotate(frame, boxes, tracks)
+                stream.processed += 1
+                self.on_result(StreamResult(stream.stream_id, frame, boxes, confidences, tracks, frame_index,
+                                            timestamp))
+            except Exception as e:
+                print(f"StreamManager._process(), Error processing stream {stream.stream_id}: {e}")
+            finally:
+                self.buffers.release(frame)
@@ -0,0 +1,19 @@
+# Shared test setup: the modules live at the repository root
+import glob
+import os
+import sys
+
+import cv2
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+# The sample images as RGB arrays
+@pytest.fixture(scope="session")
+def sample_images():
+    images = [cv2.imread(path) for path in sorted(glob.glob(os.path.join(ROOT, "Images", "*")))]
+    return [cv2.cvtColor(image, cv2.COLOR_BGR2RGB) for image in images if image is not None]
@@ -0,0 +1,50 @@
+# Parity of the ONNX backends with the PyTorch reference on the sample images. Needs the model weights
+# (PARITY_MODEL, default yolov8n.pt in the working directory); skipped without them.
+import os
+
+import numpy as np
+import pytest
+
+from backends import create_backend
+from tracking import box_iou
+
+MODEL = os.environ.get("PARITY_MODEL", "yolov8n.pt")
+CONFIDENCE = float(os.environ.get("PARITY_CONFIDENCE", "0.5"))
+
+pytestmark = pytest.mark.skipif(not os.path.isfile(MODEL), reason=f"model weights {MODEL} not found")
+
+
+@pytest.fixture(scope="module")
+def reference(sample_images):
+    backend = create_backend("pytorch", MODEL)
+    try:
+        return [backend.detect(image, CONFIDENCE) for image in sample_images]
+    finally:
+        backend.close()
+
+
+# Every reference person is found again (IoU >= min_iou, confidence within tolerance) and no others
+def assert_parity(reference, detections, min_iou, tolerance):
+    for index, ((ref_boxes, ref_scores), (boxes, scores)) in enumerate(zip(reference, detections)):
+        assert len(boxes) == len(ref_boxes), f"image {index}: {len(boxes)} people instead of {len(ref_boxes)}"
+        if not len(ref_boxes):
+            continue
+        iou = box_iou(ref_boxes, boxes)
+        best = iou.argmax(axis=1)
+        assert (iou.max(axis=1) >= min_iou).all(), f"image {index}: boxes moved, IoU {iou.max(axis=1)}"
+        assert len(set(best.tolist())) == len(best), f"image {index}: two people matched to one box"
+        assert np.abs(scores[best] - ref_scores).max() <= tolerance, f"image {index}: confidences differ"
+
+
+@pytest.mark.parametrize("name, min_iou, tolerance", [
+    ("onnx", 0.9, 0.05),
+    ("onnx-opencv", 0.9, 0.05),
+    ("onnx-int8", 0.7, 0.15),
+])
+def test_backend_parity(name, min_iou, tolerance, reference, sample_images):
+    backend = create_backend(name, MODEL)
+    try:
+        detections = [backend.detect(image, CONFIDENCE) for image in sample_images]
+    finally:
+        backend.close()
+    assert_parity(reference, detections, min_iou, tolerance)
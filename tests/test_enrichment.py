@@ -0,0 +1,73 @@
+import threading
+from queue import Empty
+
+import pytest
+
+from enrichment import DropPolicy, EnrichmentPool, JobQueue
+
+
+def test_drop_oldest_evicts_first_job():
+    queue = JobQueue(maxsize=2, policy=DropPolicy.DROP_OLDEST)
+    for job in (1, 2, 3):
+        assert queue.put(job)
+    assert queue.dropped == 1
+    assert [queue.get(timeout=0), queue.get(timeout=0)] == [2, 3]
+
+
+def test_drop_newest_rejects_new_job():
+    queue = JobQueue(maxsize=2, policy=DropPolicy.DROP_NEWEST)
+    assert queue.put(1) and queue.put(2)
+    assert not queue.put(3)
+    assert queue.dropped == 1
+    assert queue.get_batch(5, timeout=0) == [1, 2]
+
+
+def test_block_waits_for_a_free_slot():
+    queue = JobQueue(maxsize=1, policy=DropPolicy.BLOCK, block_timeout=2.0)
+    queue.put(1)
+    threading.Timer(0.05, queue.get).start()
+    assert queue.put(2)
+    assert queue.get(timeout=0) == 2
+
+
+def test_block_drops_after_timeout():
+    queue = JobQueue(maxsize=1, policy=DropPolicy.BLOCK, block_timeout=0.01)
+    queue.put(1)
+    assert not queue.put(2)
+    assert queue.dropped == 1
+
+
+def test_closed_queue_rejects_jobs():
+    queue = JobQueue()
+    queue.close()
+    assert not queue.put(1)
+    with pytest.raises(Empty):
+        queue.get(timeout=0)
+
+
+# A raising on_result must not stop the worker: every later job is still processed
+def test_worker_survives_callback_error():
+    results, done = [], []
+
+    def on_result(job, result):
+        if job == 1:
+            raise ValueError("bad result")
+        results.append(result)
+
+    pool = EnrichmentPool(lambda job, session, timeout: job * 10, on_result, workers=1, on_done=done.append)
+    pool.start()
+    try:
+        for job in range(4):
+            pool.submit(job)
+        assert pool.join(5.0)
+    finally:
+        pool.stop()
+    assert results == [0, 20, 30]
+    assert done == [0, 1, 2, 3]
+    assert pool.completed == 4
+
+
+def test_join_without_workers_fails():
+    pool = EnrichmentPool(lambda job, session, timeout: job, lambda job, result: None)
+    pool.submit(1)
+    assert not pool.join(1.0)
@@ -0,0 +1,75 @@
+import os
+import threading
+
+import numpy as np
+
+from events import DETECTION, RESULT, ROW_BYTES, EventStore, integer_or_missing
+from tracking import Track
+
+
+def test_append_and_query(tmp_path):
+    store = EventStore(str(tmp_path))
+    tracks = [Track(1, None), Track(2, None)]
+    store.append_detections(0, tracks, np.array([[0, 0, 10, 20], [5, 5, 15, 25]]), np.array([0.9, 0.8]),
+                            timestamp=100.0)
+    store.append_result(0, 2, {"emotion": "happy", "gender": "Female", "age": 30, "fingers": None},
+                        timestamp=101.0)
+    store.append_result(1, 7, {"emotion": "sad", "age": "25-32"}, timestamp=0.0)
+
+    detections = store.query(kind=DETECTION)
+    assert detections["track_id"].tolist() == [1, 2]
+    assert detections["box"][1].tolist() == [5, 5, 15, 25]
+    results = store.query(kind=RESULT, stream=0)
+    assert results["age"].tolist() == [30]
+    assert results["fingers"].tolist() == [-1]
+    # A timestamp of 0 is kept, a non-integer age is stored as missing
+    other = store.query(kind=RESULT, stream=1)
+    assert other["time"].tolist() == [0.0]
+    assert other["age"].tolist() == [-1]
+    assert store.query(kind=DETECTION, min_confidence=0.85, columns=["track_id"])["track_id"].tolist() == [1]
+    assert store.query(start=100.5, columns=["track_id"])["track_id"].tolist() == [2]
+
+    times, labels, counts = store.count_by("emotion", interval=None)
+    assert dict(zip(labels, counts[0].tolist())) == {"happy": 1, "sad": 1}
+    store.close()
+
+
+def test_rotation_and_retention(tmp_path):
+    store = EventStore(str(tmp_path), segment_bytes=64 + 4 * ROW_BYTES, max_segments=2, thumbnails=False)
+    for track_id in range(10):
+        store.append_result(None, track_id, {}, timestamp=float(track_id))
+    segments = [name for name in os.listdir(tmp_path) if name.endswith(".seg")]
+    assert len(segments) == 2
+    assert store.query(columns=["track_id"])["track_id"].tolist() == list(range(4, 10))
+    store.close()
+
+    reopened = EventStore(str(tmp_path), segment_bytes=64 + 4 * ROW_BYTES, max_segments=2, thumbnails=False)
+    reopened.append_result(None, 10, {}, timestamp=10.0)
+    assert reopened.query(columns=["track_id"])["track_id"].tolist()[-1] == 10
+    reopened.close()
+
+
+def test_query_while_segments_rotate(tmp_path):
+    store = EventStore(str(tmp_path), segment_bytes=64 + 4 * ROW_BYTES, max_segments=2, thumbnails=False)
+    errors = []
+
+    def write():
+        try:
+            for track_id in range(2000):
+                store.append_result(None, track_id, {}, timestamp=float(track_id))
+        except Exception as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    while writer.is_alive():
+        track_ids = store.query(columns=["track_id"])["track_id"]
+        assert len(track_ids) <= 8 and np.all(np.diff(track_ids) == 1)
+    writer.join()
+    store.close()
+    assert not errors
+
+
+def test_integer_or_missing():
+    assert [integer_or_missing(value) for value in (30, 30.0, "30", None, "25-32", 2.5, True)] == \
+        [30, 30, 30, -1, -1, -1, -1]
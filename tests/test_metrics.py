@@ -0,0 +1,48 @@
+from urllib.request import urlopen
+
+from metrics import Metrics, MetricsServer
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    first, second = metrics.time("inference"), metrics.time("render")
+    assert first is second  # one shared null context, nothing allocated per call
+    with first:
+        pass
+    metrics.observe("inference", 5.0)
+    metrics.mark("frames_rendered")
+    snapshot = metrics.snapshot()
+    assert snapshot["stages"] == {} and snapshot["counters"] == {}
+    assert metrics.rate("frames_rendered") == 0.0
+
+
+def test_prometheus_output():
+    metrics = Metrics(enabled=True)
+    for elapsed_ms in (1.0, 2.0, 3.0, 4.0):
+        metrics.observe("inference", elapsed_ms)
+    metrics.mark("frames_rendered", 3)
+    metrics.gauge("pending_uploads", lambda: 7)
+    metrics.gauge("broken", lambda: 1 / 0)
+    text = metrics.prometheus()
+    lines = text.splitlines()
+    assert "# TYPE people_stage_latency_ms summary" in lines
+    assert 'people_stage_latency_ms{stage="inference",quantile="0.5"} 2.5000' in lines
+    assert 'people_stage_latency_ms_sum{stage="inference"} 10.0000' in lines
+    assert 'people_stage_latency_ms_count{stage="inference"} 4' in lines
+    assert 'people_events_total{event="frames_rendered"} 3' in lines
+    assert "people_pending_uploads 7" in lines
+    # A gauge that fails to read is left out instead of breaking the scrape
+    assert "broken" not in text
+    assert text.endswith("\n")
+
+
+def test_metrics_server_serves_prometheus_text():
+    metrics = Metrics(enabled=True)
+    metrics.observe("capture", 1.5)
+    server = MetricsServer(metrics, port=0).start()
+    try:
+        with urlopen(server.url, timeout=5) as response:
+            body = response.read().decode()
+    finally:
+        server.stop()
+    assert 'people_stage_latency_ms_count{stage="capture"} 1' in body
@@ -0,0 +1,66 @@
+import threading
+from queue import Empty
+
+import numpy as np
+import pytest
+
+from pipeline import FramePipeline, ImageSource, LatestQueue
+
+
+def test_latest_queue_keeps_newest():
+    dropped = []
+    queue = LatestQueue(maxsize=1, on_drop=dropped.append)
+    assert queue.put(1)
+    assert not queue.put(2)
+    assert queue.get(timeout=0) == 2
+    assert dropped == [1]
+    assert queue.dropped == 1
+
+
+def test_latest_queue_get_times_out():
+    with pytest.raises(Empty):
+        LatestQueue().get(timeout=0.01)
+
+
+def test_latest_queue_close_releases_items():
+    dropped = []
+    queue = LatestQueue(maxsize=2, on_drop=dropped.append)
+    queue.put(1)
+    queue.put(2)
+    queue.close()
+    assert dropped == [1, 2]
+    assert not queue.put(3)
+    assert dropped == [1, 2, 3]
+    with pytest.raises(Empty):
+        queue.get(timeout=0)
+
+
+# Times out in get() until `done` is set, as if the last frame arrived right after the timeout
+class LateQueue(LatestQueue):
+    def __init__(self, done, on_drop):
+        super().__init__(1, on_drop)
+        self.done = done
+
+    def get(self, timeout=None):
+        if timeout:
+            self.done.wait(1.0)
+            raise Empty
+        return super().get(timeout)
+
+
+class PassThrough:
+    def detect_and_annotate(self, frame):
+        return frame
+
+
+def test_pipeline_renders_a_frame_put_right_before_the_source_ends():
+    rendered = []
+    finished = threading.Event()
+    pipeline = FramePipeline(ImageSource(np.zeros((4, 4, 3), dtype=np.uint8)), PassThrough(),
+                             lambda frame: rendered.append(frame.copy()), on_finished=finished.set)
+    pipeline._inferenceQueue = LateQueue(pipeline._captureDone, pipeline.buffers.release)
+    pipeline._renderQueue = LateQueue(pipeline._inferenceDone, pipeline.buffers.release)
+    pipeline.start()
+    assert finished.wait(5.0)
+    pipeline.stop()
+    assert len(rendered) == 1 and pipeline.rendered == 1
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from quality import CropGate
+
+
+@pytest.fixture
+def frame():
+    # Random texture, sharp enough for the Laplacian check
+    return np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+
+
+def test_rejection_reasons(frame):
+    gate = CropGate(min_area=40 * 80, min_confidence=0.7)
+    assert gate.score(frame, (100, 100, 160, 220), 0.9).reason is None
+    assert gate.score(frame, (100, 100, 110, 120), 0.9).reason == "area"
+    assert gate.score(frame, (100, 100, 160, 220), 0.5).reason == "confidence"
+    assert gate.score(frame, (100, 100, 300, 200), 0.9).reason == "aspect"
+    assert gate.score(frame, (0, 0, 100, 480), 0.9).reason == "truncated"
+    assert gate.score(np.full_like(frame, 128), (100, 100, 160, 220), 0.9).reason == "sharpness"
+
+
+def test_budget_per_window(frame):
+    gate = CropGate(min_area=40 * 80, top_k=2, window=60.0)
+    boxes = [(50 + 80 * i, 100, 110 + 80 * i, 220) for i in range(3)]
+    assert len(gate.select(frame, boxes, [0.9, 0.95, 0.8])) == 2
+    assert gate.select(frame, boxes[:1], [0.9]) == []
+    assert gate.over_budget == 2
+    assert gate.avoided == 2
+
+
+def test_disabled_gate_passes_everything(frame):
+    gate = CropGate(enabled=False)
+    selected = gate.select(frame, [(100, 100, 110, 120), (100, 100, 160, 220)], [0.9, 0.9])
+    assert sorted(selected) == [0, 1]
+    assert gate.rejected["area"] == 1
+    assert gate.avoided == 0
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import requests
+
+import detection
+from detection import JsonRead
+from mock_server import MockServer
+from replay import (RecordingCapture, ReplayServer, ReplaySource, SessionRecorder, is_session, load_records,
+                    load_responses)
+from tracking import Track
+
+
+# Smooth frames that differ per index, so they survive MJPG compression recognisably
+class GradientCapture:
+    def __init__(self, count, width=64, height=48):
+        self.count = count
+        self.index = 0
+        ramp = np.linspace(0, 150, width, dtype=np.float32)
+        self.base = np.broadcast_to(ramp, (height, width))
+
+    def read(self, image=None):
+        if self.index == self.count:
+            return False, None
+        self.index += 1
+        return True, self.frame(self.index - 1)
+
+    def frame(self, index):
+        return np.dstack([self.base + 10 * index, self.base, 255 - self.base]).astype(np.uint8)
+
+
+def record_session(directory, frame_format, monkeypatch):
+    server = MockServer(latency=0.0, seed=1).start()
+    monkeypatch.setattr(detection, "server_url", server.url)
+    recorder = SessionRecorder(str(directory), frame_format, fps=30.0, chunk_frames=4)
+    capture = RecordingCapture(GradientCapture(10), recorder)
+    session = recorder.session(requests.Session())
+    recorded = []
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            recorder.append_detections(0, [Track(1, None)], np.array([[1, 2, 30, 40]]), np.array([0.9]))
+            if recorder.frames % 5 == 0:
+                recorded.append(JsonRead.send_image_get_response(frame[:32, :16], session, 5))
+    finally:
+        session.close()
+        recorder.close()
+        server.stop()
+    return recorded
+
+
+@pytest.mark.parametrize("frame_format", ["raw", "video"])
+def test_record_and_replay_frames(tmp_path, monkeypatch, frame_format):
+    record_session(tmp_path, frame_format, monkeypatch)
+    assert is_session(str(tmp_path))
+    detections = load_records(str(tmp_path), "detections")
+    assert [record["frame"] for record in detections] == list(range(10))
+    assert detections[0]["boxes"] == [[1, 2, 30, 40]]
+
+    source = ReplaySource(str(tmp_path), realtime=False)
+    original = GradientCapture(10)
+    replayed = []
+    while True:
+        ret, frame = source.read()
+        if not ret:
+            break
+        replayed.append(frame)
+    source.release()
+    assert len(replayed) == 10
+    for index, frame in enumerate(replayed):
+        difference = np.abs(frame.astype(np.int16) - original.frame(index)).mean()
+        assert difference == 0 if frame_format == "raw" else difference < 4
+
+
+def test_replay_server_answers_with_the_recorded_responses(tmp_path, monkeypatch):
+    recorded = record_session(tmp_path, "raw", monkeypatch)
+    assert len(recorded) == 2 and all(recorded)
+    assert len(load_responses(str(tmp_path))[0]) == 2
+
+    server = ReplayServer(str(tmp_path), recorded_latency=False, latency=0.0).start()
+    monkeypatch.setattr(detection, "server_url", server.url)
+    crop = np.zeros((32, 16, 3), dtype=np.uint8)
+    try:
+        replayed = [JsonRead.send_image_get_response(crop, timeout=5) for _ in range(3)]
+    finally:
+        server.stop()
+    # Recorded order, starting over when the responses run out
+    assert replayed == recorded + recorded[:1]
+
+
+def test_replay_server_needs_recorded_responses(tmp_path):
+    recorder = SessionRecorder(str(tmp_path), "raw")
+    recorder.record_frame(np.zeros((4, 4, 3), dtype=np.uint8))
+    recorder.close()
+    assert load_responses(str(tmp_path)) == ([], [])
+    with pytest.raises(ValueError):
+        ReplayServer(str(tmp_path))
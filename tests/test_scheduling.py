@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from scheduling import DetectionScheduler
+
+
+@pytest.fixture
+def frame():
+    # Textured frame, plenty of corners for the optical flow
+    texture = np.random.default_rng(0).integers(0, 256, (60, 80), dtype=np.uint8)
+    texture = np.kron(texture, np.ones((4, 4), dtype=np.uint8))
+    return np.dstack([texture] * 3)
+
+
+def run(scheduler, frame, frames, detect_ms=1.0):
+    pattern = []
+    for _ in range(frames):
+        detect = scheduler.should_detect(frame)
+        pattern.append(detect)
+        if detect:
+            scheduler.keyframe(frame, np.array([[10, 10, 50, 90]]), np.array([0.9], dtype=np.float32), detect_ms)
+        else:
+            scheduler.propagate(frame)
+    return pattern
+
+
+def test_every_frame_and_fixed_interval(frame):
+    assert run(DetectionScheduler("every_frame", keyframe_interval=4), frame, 4) == [True] * 4
+    assert run(DetectionScheduler("fixed", keyframe_interval=3), frame, 7) == [True, False, False] * 2 + [True]
+
+
+def test_adaptive_interval_fits_the_frame_budget(frame):
+    scheduler = DetectionScheduler("adaptive", target_fps=25.0, max_interval=8)
+    scheduler.keyframe(frame, np.empty((0, 4)), np.empty((0,), dtype=np.float32), 10.0)
+    assert scheduler.keyframe_interval == 1
+
+    scheduler = DetectionScheduler("adaptive", target_fps=25.0, max_interval=8)
+    scheduler.keyframe(frame, np.empty((0, 4)), np.empty((0,), dtype=np.float32), 100.0)
+    # (100 + (N - 1) * 0) / N <= 40 ms
+    assert scheduler.keyframe_interval == 3
+
+    scheduler.propagate_ms = 50.0
+    scheduler.keyframe(frame, np.empty((0, 4)), np.empty((0,), dtype=np.float32), 100.0)
+    assert scheduler.keyframe_interval == 8
+
+
+def test_keyframe_due_allows_early_keyframes(frame):
+    scheduler = DetectionScheduler("fixed", keyframe_interval=4)
+    run(scheduler, frame, 2)
+    assert not scheduler.should_detect(frame) and scheduler.keyframe_due(frame, 0.5)
+    assert not scheduler.keyframe_due(frame, 0.75)
+
+
+def test_boxes_follow_the_motion(frame):
+    scheduler = DetectionScheduler("fixed", keyframe_interval=5, flow_width=320)
+    scheduler.keyframe(frame, np.array([[40, 40, 120, 160]]), np.array([0.9], dtype=np.float32), 1.0)
+    moved = np.roll(frame, (6, 4), axis=(0, 1))
+    boxes, confidences = scheduler.propagate(moved)
+    assert np.abs(boxes[0] - (44, 46, 124, 166)).max() <= 1
+    assert confidences.tolist() == pytest.approx([0.9])
+    assert scheduler.propagated == 1
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        DetectionScheduler("sometimes")
@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+
+from backends import InferenceBackend
+from streams import StreamManager
+
+
+class NoPeople(InferenceBackend):
+    name = "none"
+
+    def __init__(self):
+        self.batches = []
+
+    def detect_batch(self, frames, confidence_threshold):
+        self.batches.append(len(frames))
+        return [self.empty() for _ in frames]
+
+
+# File-like source of `count` frames whose pixels hold the frame number
+class CountingCapture:
+    def __init__(self, count):
+        self.count = count
+        self.index = 0
+
+    def read(self, image=None):
+        if self.index == self.count:
+            return False, None
+        frame = np.full((8, 8, 3), self.index, dtype=np.uint8)
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+
+def offer(stream, value):
+    stream._queue.put((np.full((8, 8, 3), value, dtype=np.uint8), value, 0.0))
+
+
+def test_round_robin_takes_every_stream_in_turn():
+    manager = StreamManager(NoPeople(), lambda result: None, max_batch=2)
+    streams = [manager.add_stream(stream_id, CountingCapture(0)) for stream_id in range(3)]
+    taken = []
+    for _ in range(3):
+        for stream in streams:
+            offer(stream, 0)
+        taken.append([stream.stream_id for stream, _ in manager._collect()])
+    assert taken == [[0, 1], [1, 2], [2, 0]]
+
+
+def test_max_fps_caps_how_often_a_stream_is_taken():
+    manager = StreamManager(NoPeople(), lambda result: None)
+    stream = manager.add_stream(0, CountingCapture(0), max_fps=10)
+    offer(stream, 1)
+    assert stream.take(100.0) is not None
+    offer(stream, 2)
+    assert stream.take(100.05) is None
+    assert abs(stream.due_in(100.05) - 0.05) < 1e-9
+    assert stream.take(100.1)[1] == 2
+    # No credit builds up while the stream had nothing to deliver
+    offer(stream, 3)
+    assert stream.take(200.0) is not None
+    offer(stream, 4)
+    assert stream.take(200.01) is None
+
+
+def test_file_streams_deliver_every_frame_in_batches():
+    backend = NoPeople()
+    results = {0: [], 1: []}
+    finished = set()
+    all_done = threading.Event()
+
+    def on_finished(stream_id):
+        finished.add(stream_id)
+        if len(finished) == 2:
+            all_done.set()
+
+    manager = StreamManager(backend, lambda result: results[result.stream_id].append(
+        (result.frame_index, result.timestamp, int(result.frame[0, 0, 0]))), on_finished=on_finished)
+    for stream_id in results:
+        manager.add_stream(stream_id, CountingCapture(20), source_fps=10.0, schedule="every_frame",
+                           drop_frames=False)
+    manager.start()
+    try:
+        assert all_done.wait(10.0)
+    finally:
+        manager.stop()
+    for frames in results.values():
+        assert frames == [(index, index / 10.0, index) for index in range(20)]
+    assert sum(backend.batches) == 40 and max(backend.batches) <= 2
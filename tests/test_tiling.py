@@ -0,0 +1,101 @@
+import cv2
+import numpy as np
+import pytest
+
+from backends import InferenceBackend
+from tiling import TiledBackend, merge_boxes, tile_grid, tiled_backend
+
+
+# Finds the white rectangles of a frame at full resolution, like a model that sees every person
+class RectangleBackend(InferenceBackend):
+    name = "rectangles"
+
+    def __init__(self):
+        self.inputs = []
+
+    def detect(self, frame, confidence_threshold):
+        self.inputs.append(frame.shape[:2])
+        count, _, stats, _ = cv2.connectedComponentsWithStats((frame[:, :, 0] > 128).astype(np.uint8))
+        boxes = np.array([(x, y, x + w, y + h) for x, y, w, h, _ in stats[1:count]], dtype=np.int32).reshape(-1, 4)
+        return boxes, np.full(len(boxes), 0.9, dtype=np.float32)
+
+
+def scene(width, height, boxes):
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    for x1, y1, x2, y2 in boxes:
+        frame[y1:y2, x1:x2] = 255
+    return frame
+
+
+def sorted_boxes(boxes):
+    return sorted(map(tuple, np.asarray(boxes).tolist()))
+
+
+def test_tile_grid_covers_the_frame():
+    tiles = tile_grid(3840, 2160, 960, 0.2)
+    assert {x2 for _, _, x2, _ in tiles} >= {3840} and {y2 for _, _, _, y2 in tiles} >= {2160}
+    starts = sorted({x1 for x1, _, _, _ in tiles})
+    assert starts[0] == 0 and all(0 < b - a <= 960 * 0.8 for a, b in zip(starts, starts[1:]))
+    assert tile_grid(640, 480, 960) == [(0, 0, 640, 480)]
+
+
+def test_merge_boxes_keeps_overlapping_people_apart():
+    # A child partly in front of an adult: most of the smaller box lies inside the other, IoU stays low
+    boxes = np.array([[100, 100, 160, 260], [120, 150, 170, 260]], dtype=np.float32)
+    merged, _ = merge_boxes(boxes, np.array([0.9, 0.8], dtype=np.float32), np.array([0, 1]),
+                            [(0, 0, 960, 960), (768, 0, 1728, 960)])
+    assert sorted_boxes(merged) == sorted_boxes(boxes)
+
+
+def test_merge_boxes_removes_duplicates():
+    boxes = np.array([[800, 100, 900, 300], [802, 98, 901, 305], [100, 100, 150, 200]], dtype=np.float32)
+    merged, scores = merge_boxes(boxes, np.array([0.7, 0.9, 0.8], dtype=np.float32))
+    assert sorted_boxes(merged) == [(100, 100, 150, 200), (802, 98, 901, 305)]
+    assert sorted(scores.tolist()) == pytest.approx([0.8, 0.9])
+
+
+def test_merge_boxes_joins_a_person_cut_by_a_tile_border():
+    tiles = [(0, 0, 960, 960), (768, 0, 1728, 960)]
+    boxes = np.array([[700, 100, 960, 400], [768, 100, 1000, 400], [700, 500, 960, 800]], dtype=np.float32)
+    merged, _ = merge_boxes(boxes, np.array([0.9, 0.8, 0.9], dtype=np.float32), np.array([0, 1, 0]), tiles)
+    # The third box ends on the same border, but tile 1 found nothing there to join it with
+    assert sorted_boxes(merged) == [(700, 100, 1000, 400), (700, 500, 960, 800)]
+
+
+def test_tiles_find_split_and_close_people():
+    people = [(700, 100, 1000, 400), (100, 100, 160, 260), (165, 100, 220, 260), (1500, 700, 1560, 900)]
+    backend = RectangleBackend()
+    tiled = TiledBackend(backend, tile_size=960, overlap=0.2, full_frame=False)
+    boxes, scores = tiled.detect(scene(1920, 1080, people), 0.5)
+    assert sorted_boxes(boxes) == sorted_boxes(people)
+    assert boxes.dtype == np.int32 and scores.dtype == np.float32
+    assert tiled.tiles_run == len(tile_grid(1920, 1080, 960, 0.2))
+
+
+def test_roi_mode_runs_only_roi_tiles_without_full_frame():
+    people = [(100, 100, 160, 260), (1500, 700, 1560, 900)]
+    roi = [(0, 0), (900, 0), (900, 1080), (0, 1080)]
+    backend = RectangleBackend()
+    tiled = tiled_backend(backend, "roi", 960, 0.2, rois=[roi])
+    boxes, _ = tiled.detect(scene(1920, 1080, people), 0.5)
+    assert sorted_boxes(boxes) == [(100, 100, 160, 260)]
+    assert all(x1 < 900 for x1, _, _, _ in tiled._tiles(1920, 1080)[0])
+    assert tiled.tiles_run == len(tiled._tiles(1920, 1080)[0])
+
+    # With the full-frame pass, it covers only the bounding box of the ROIs
+    backend = RectangleBackend()
+    tiled = tiled_backend(backend, "roi", 960, 0.2, rois=[roi], full_frame=True)
+    tiled.detect(scene(1920, 1080, people), 0.5)
+    assert backend.inputs[-1] == (1080, 901)  # fillPoly includes the polygon edge
+
+
+def test_motion_mode_skips_still_tiles():
+    people = [(100, 100, 160, 260), (1500, 700, 1560, 900)]
+    backend = RectangleBackend()
+    tiled = tiled_backend(backend, "motion", 960, 0.2, refresh_interval=100)
+    frame = scene(1920, 1080, people)
+    first, _ = tiled.detect(frame, 0.5)
+    runs = tiled.tiles_run
+    second, _ = tiled.detect(frame.copy(), 0.5)
+    assert tiled.tiles_run == runs
+    assert sorted_boxes(second) == sorted_boxes(first) == sorted_boxes(people)
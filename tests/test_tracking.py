@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+
+from tracking import IouTracker, ResultCache, box_iou
+
+
+def test_box_iou():
+    iou = box_iou([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]])
+    np.testing.assert_allclose(iou, [[1.0, 1 / 3, 0.0]], rtol=1e-6)
+
+
+def test_tracker_keeps_ids_of_moving_boxes():
+    tracker = IouTracker(iou_threshold=0.3, max_missed=2)
+    first = tracker.update([[0, 0, 10, 20], [50, 0, 60, 20]])
+    second = tracker.update([[52, 0, 62, 20], [1, 0, 11, 20]])
+    assert [track.track_id for track in second] == [first[1].track_id, first[0].track_id]
+    assert second[0].hits == 2
+
+
+def test_tracker_drops_tracks_after_max_missed():
+    tracker = IouTracker(iou_threshold=0.3, max_missed=1)
+    track_id = tracker.update([[0, 0, 10, 20]])[0].track_id
+    tracker.update([])
+    assert len(tracker.tracks) == 1
+    tracker.update([])
+    assert tracker.tracks == []
+    assert tracker.update([[0, 0, 10, 20]])[0].track_id != track_id
+
+
+def test_result_cache_claims_once():
+    cache = ResultCache(ttl=30.0, capacity=4)
+    assert cache.claim(1)
+    assert not cache.claim(1)  # request in flight
+    cache.put(1, {"age": 30})
+    assert not cache.claim(1)
+    assert cache.get(1) == {"age": 30}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_result_cache_release_allows_new_claim():
+    cache = ResultCache()
+    assert cache.claim(1)
+    cache.release(1)
+    assert cache.claim(1)
+    assert cache.misses == 1
+
+
+def test_result_cache_expires_and_evicts():
+    cache = ResultCache(ttl=0.05, capacity=2)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    cache.put(3, "c")
+    assert cache.get(1) is None  # least recently used
+    time.sleep(0.06)
+    assert cache.get(2) is None
+    assert cache.claim(3)
@@ -0,0 +1,120 @@
+import json
+
+import numpy as np
+import pytest
+import requests
+
+import detection
+from detection import JsonRead, PersonJob, enrich_people, enrich_person, upload_batches_supported
+from enrichment import DropPolicy, EnrichmentPool
+from mock_server import MockServer
+
+
+@pytest.fixture(autouse=True)
+def batch_state(monkeypatch):
+    monkeypatch.setattr(JsonRead, "batch_supported", None)
+
+
+def serve(monkeypatch, **options):
+    server = MockServer(latency=0.0, seed=0, **options).start()
+    monkeypatch.setattr(detection, "server_url", server.url)
+    return server
+
+
+def crops(count):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (64, 32, 3), dtype=np.uint8) for _ in range(count)]
+
+
+# Answers every request with the next (status, body) pair
+class ScriptedSession:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.files = []
+
+    def post(self, url, files=None, data=None, timeout=None):
+        self.files.append(len(files) if isinstance(files, list) else 1)
+        status, body = self.answers.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        return response
+
+
+def single_response():
+    hand = {"gestures": [], "totalFingersAmount": 2}
+    return [json.dumps(hand), {"predicted_emotion": "happy"}, [{"gender": "Male", "age": 30}]]
+
+
+def test_batching_server_answers_all_crops_in_one_request(monkeypatch):
+    server = serve(monkeypatch, batching=True)
+    try:
+        results = JsonRead.send_images_get_responses(crops(3), timeout=5)
+    finally:
+        server.stop()
+    assert len(results) == 3 and all(result["emotion"] for result in results)
+    assert server.requests == 1 and server.crops == 3
+    assert JsonRead.batch_supported is True
+
+
+def test_single_crop_server_falls_back_to_one_crop_per_request(monkeypatch):
+    server = serve(monkeypatch, batching=False)
+    try:
+        results = JsonRead.send_images_get_responses(crops(3), timeout=5)
+        assert JsonRead.batch_supported is False and not upload_batches_supported()
+        assert len(results) == 3 and all(result["emotion"] for result in results)
+        assert server.requests == 3
+        JsonRead.send_images_get_responses(crops(2), timeout=5)
+        assert server.requests == 5
+    finally:
+        server.stop()
+
+
+def test_rejected_batch_falls_back_to_single_crops():
+    session = ScriptedSession((400, {"error": "one file only"}), (200, single_response()), (200, single_response()))
+    results = JsonRead.send_images_get_responses(crops(2), session, 5)
+    assert session.files == [2, 1, 1]
+    assert [result["fingers"] for result in results] == [2, 2]
+    assert JsonRead.batch_supported is False
+
+
+def test_results_of_the_wrong_length_give_no_attributes():
+    session = ScriptedSession((200, {"results": [single_response()]}))
+    assert JsonRead.send_images_get_responses(crops(3), session, 5) == [None, None, None]
+    assert JsonRead.batch_supported is None
+
+
+def test_failing_single_crop_does_not_resend_the_others():
+    session = ScriptedSession((200, single_response()), (500, {"error": "busy"}), (200, single_response()))
+    JsonRead.batch_supported = False
+    results = JsonRead.send_images_get_responses(crops(3), session, 5)
+    assert session.files == [1, 1, 1]
+    assert results[1] is None and results[0]["fingers"] == results[2]["fingers"] == 2
+
+
+def test_pool_uploads_single_crops_once_batching_is_unsupported(monkeypatch):
+    server = serve(monkeypatch, batching=False, error_rate=0.2)
+    calls = []
+
+    def handler(job, session, timeout):
+        calls.append(1)
+        return enrich_person(job, session, timeout)
+
+    def batch_handler(jobs, session, timeout):
+        calls.append(len(jobs))
+        return enrich_people(jobs, session, timeout)
+
+    pool = EnrichmentPool(handler, lambda job, attributes: None, workers=1, queue_size=64, policy=DropPolicy.BLOCK,
+                          timeout=5, retries=5, backoff=0.0, batch_handler=batch_handler, batch_size=4,
+                          batch_enabled=upload_batches_supported)
+    for index, crop in enumerate(crops(24)):
+        pool.submit(PersonJob(index, crop))
+    pool.start()
+    try:
+        assert pool.join(timeout=20)
+    finally:
+        pool.stop()
+        server.stop()
+    # Only the first batch (and its retries) goes out batched, every later job is taken on its own
+    assert calls[0] == 4 and set(calls[calls.index(1):]) == {1}
+    assert pool.completed == 24 and pool.failed == 0
@@ -0,0 +1,255 @@
+from itertools import combinations
+
+import cv2
+import numpy as np
+
+from backends import InferenceBackend, nms
+from metrics import metrics
+from tracking import box_iou
+
+INFERENCE_MODES = ("full", "tiles", "roi", "motion")
+
+
+# Overlapping tile_size x tile_size windows (x1, y1, x2, y2) covering a width x height frame: the fewest
+# tiles per row and column that overlap by at least `overlap`, spread evenly from edge to edge.
+# A frame smaller than a tile is one window.
+def tile_grid(width, height, tile_size=960, overlap=0.2):
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        stride = max(int(tile_size * (1 - overlap)), 1)
+        count = int(np.ceil((length - tile_size) / stride)) + 1
+        return [round(i * (length - tile_size) / (count - 1)) for i in range(count)]
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+# Whether `box` ends (within `margin` pixels) on a border of its `tile` that lies inside the `other` tile
+def touches_border(box, tile, other, margin=2):
+    x1, y1, x2, y2 = tile
+    return ((other[0] < x1 < other[2] and box[0] - x1 <= margin) or
+            (other[0] < x2 < other[2] and x2 - box[2] <= margin) or
+            (other[1] < y1 < other[3] and box[1] - y1 <= margin) or
+            (other[1] < y2 < other[3] and y2 - box[3] <= margin))
+
+
+# Joins the boxes of a person cut in parts by tile borders. `sources` holds the index into `tiles` the box
+# was found in (-1: no tile, e.g. the full-frame pass). Two boxes are joined to their union when they come
+# from different tiles, at least one of them ends on a border of its tile inside the other tile, and the
+# parts of the two boxes in the area both tiles cover overlap with an IoU above iou_threshold.
+# Joined boxes keep the best score and get source -1. Returns boxes, scores and sources.
+def join_split_boxes(boxes, scores, sources, tiles, iou_threshold=0.5, margin=2):
+    groups = list(range(len(boxes)))
+
+    def group(index):
+        while groups[index] != index:
+            index = groups[index]
+        return index
+
+    for i, j in combinations(np.flatnonzero(sources >= 0), 2):
+        if sources[i] == sources[j]:
+            continue
+        a, b = tiles[sources[i]], tiles[sources[j]]
+        shared = np.array([max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])], dtype=np.float32)
+        if shared[0] >= shared[2] or shared[1] >= shared[3]:
+            continue
+        if not (touches_border(boxes[i], a, b, margin) or touches_border(boxes[j], b, a, margin)):
+            continue
+        parts = np.clip(boxes[[i, j]], shared[[0, 1, 0, 1]], shared[[2, 3, 2, 3]])
+        if box_iou(parts[:1], parts[1:])[0, 0] > iou_threshold:
+            groups[group(j)] = group(i)
+
+    roots = np.array([group(index) for index in range(len(boxes))])
+    if len(np.unique(roots)) == len(boxes):
+        return boxes, scores, sources
+    joined_boxes, joined_scores, joined_sources = [], [], []
+    for root in np.unique(roots):
+        members = np.flatnonzero(roots == root)
+        joined_boxes.append(np.concatenate([boxes[members, :2].min(axis=0), boxes[members, 2:].max(axis=0)]))
+        joined_scores.append(scores[members].max())
+        joined_sources.append(sources[root] if len(members) == 1 else -1)
+    return (np.array(joined_boxes, dtype=np.float32), np.array(joined_scores, dtype=np.float32),
+            np.array(joined_sources))
+
+
+# Merges the xyxy boxes found in overlapping tiles: people cut by a tile border are joined first
+# (join_split_boxes, when the tile of every box is known), then duplicates are removed by plain IoU NMS,
+# so people standing close together stay apart. Returns the merged boxes and their scores.
+def merge_boxes(boxes, scores, sources=None, tiles=(), iou_threshold=0.5, margin=2):
+    if len(boxes) == 0:
+        return boxes.reshape(0, 4).astype(np.float32), scores.astype(np.float32)
+    boxes, scores = boxes.astype(np.float32), scores.astype(np.float32)
+    if sources is not None and len(tiles) > 1:
+        boxes, scores, _ = join_split_boxes(boxes, scores, np.asarray(sources), tiles, iou_threshold, margin)
+    keep = nms(boxes, scores, iou_threshold)
+    return boxes[keep], scores[keep]
+
+
+# Moving areas of a frame from the difference to the previous frame, computed at `scale` resolution.
+# Returns a boolean mask at that resolution, everything on the first frame or after a size change.
+class MotionMask:
+    def __init__(self, scale=0.25, threshold=25, dilate=5):
+        self.scale = scale
+        self.threshold = threshold
+        self.kernel = np.ones((dilate, dilate), dtype=np.uint8)
+        self._previous = None
+
+    def update(self, frame):
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_RGB2GRAY), (5, 5), 0)
+        previous, self._previous = self._previous, gray
+        if previous is None or previous.shape != gray.shape:
+            return np.ones(gray.shape, dtype=bool)
+        _, moving = cv2.threshold(cv2.absdiff(gray, previous), self.threshold, 255, cv2.THRESH_BINARY)
+        return cv2.dilate(moving, self.kernel) > 0
+
+    def reset(self):
+        self._previous = None
+
+
+# Runs the wrapped backend on overlapping tiles of the frame instead of the whole frame downscaled to the
+# model input, so distant people keep enough pixels to pass the confidence threshold. All tiles of all
+# frames go to the wrapped backend as one batch; detections are shifted back to frame coordinates and
+# merged across the tile borders (merge_boxes). With `full_frame` the downscaled frame is run as well, for
+# people larger than a tile; it is one more model input per frame, and with ROIs it covers only their
+# bounding box.
+# Restricting the work:
+#   rois    polygons [(x, y), ...] in frame pixels; only tiles overlapping them run and only people
+#           whose box centre lies inside a polygon are reported
+#   motion  only tiles with motion since the previous frame run, the boxes found earlier in the other
+#           tiles are kept; every refresh_interval frames all tiles run. The motion state belongs to
+#           the backend, so a backend with motion serves one stream, and frames of a batch run one
+#           after the other.
+class TiledBackend(InferenceBackend):
+    def __init__(self, backend, tile_size=960, overlap=0.2, full_frame=True, rois=None, motion=False,
+                 refresh_interval=15, iou_threshold=0.5, border_margin=2):
+        self.backend = backend
+        self.name = f"{backend.name}-tiled"
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.full_frame = full_frame
+        self.rois = [np.asarray(polygon, dtype=np.int32) for polygon in rois or []]
+        self.motion = MotionMask() if motion else None
+        self.refresh_interval = refresh_interval
+        self.iou_threshold = iou_threshold
+        self.border_margin = border_margin
+
+        self.frames = 0
+        self.tiles_run = 0
+        self._layout = {}
+        self._previous = None
+
+    def detect(self, frame, confidence_threshold):
+        return self.detect_batch([frame], confidence_threshold)[0]
+
+    def detect_batch(self, frames, confidence_threshold):
+        if self.motion is not None and len(frames) > 1:
+            # Each frame's plan depends on the detections of the one before
+            return [self.detect_batch([frame], confidence_threshold)[0] for frame in frames]
+        plans = [self._plan(frame) for frame in frames]
+        crops = [frame[y1:y2, x1:x2] for frame, (tiles, full, _) in zip(frames, plans)
+                 for x1, y1, x2, y2 in tiles + full]
+        results = iter(self.backend.detect_batch(crops, confidence_threshold) if crops else [])
+
+        detections = []
+        for frame, (tiles, full, keep_previous) in zip(frames, plans):
+            boxes, scores, sources = [], [], []
+            # Source of a box: the index of its tile, -1 for the full-frame pass and the carried-over boxes
+            for index, (x1, y1, x2, y2) in enumerate(tiles + full):
+                tile_boxes, tile_scores = next(results)
+                boxes.append(tile_boxes.astype(np.float32) + (x1, y1, x1, y1))
+                scores.append(tile_scores)
+                sources.append(np.full(len(tile_boxes), index if index < len(tiles) else -1))
+            if keep_previous is not None:
+                boxes.append(keep_previous[0].astype(np.float32))
+                scores.append(keep_previous[1])
+                sources.append(np.full(len(keep_previous[0]), -1))
+            with metrics.time("merge"):
+                detections.append(self._merge(frame, boxes, scores, sources, tiles))
+            self._previous = detections[-1]
+        self.frames += len(frames)
+        self.tiles_run += len(crops)
+        return detections
+
+    def close(self):
+        self.backend.close()
+
+    def reset(self):
+        self._previous = None
+        if self.motion is not None:
+            self.motion.reset()
+
+    # Tiles to run for the frame, the full-frame window ([] or one window) and the previous detections to
+    # carry over (motion mode)
+    def _plan(self, frame):
+        height, width = frame.shape[:2]
+        tiles, roi_mask, full = self._tiles(width, height)
+        if self.motion is None:
+            return tiles, full, None
+
+        moving = self.motion.update(frame)
+        if roi_mask is not None:
+            moving &= cv2.resize(roi_mask, moving.shape[::-1], interpolation=cv2.INTER_NEAREST) > 0
+        if self._previous is None or self.frames % self.refresh_interval == 0:
+            return tiles, full, None
+
+        scale = self.motion.scale
+        active = [tile for tile in tiles if moving[int(tile[1] * scale):int(np.ceil(tile[3] * scale)),
+                                                   int(tile[0] * scale):int(np.ceil(tile[2] * scale))].any()]
+        # Keep the previous boxes that lie outside every tile that runs again
+        boxes, scores = self._previous
+        centers = np.column_stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2])
+        stale = np.zeros(len(boxes), dtype=bool)
+        for x1, y1, x2, y2 in active:
+            stale |= (centers[:, 0] >= x1) & (centers[:, 0] < x2) & (centers[:, 1] >= y1) & (centers[:, 1] < y2)
+        return active, [], (boxes[~stale], scores[~stale])
+
+    # Tile grid of a frame size (only tiles overlapping the ROIs), the ROI mask and the full-frame window
+    # (the bounding box of the ROIs, if any), cached per size
+    def _tiles(self, width, height):
+        layout = self._layout.get((width, height))
+        if layout is None:
+            tiles = tile_grid(width, height, self.tile_size, self.overlap)
+            roi_mask = None
+            full = [(0, 0, width, height)]
+            if self.rois:
+                roi_mask = np.zeros((height, width), dtype=np.uint8)
+                cv2.fillPoly(roi_mask, self.rois, 1)
+                tiles = [(x1, y1, x2, y2) for x1, y1, x2, y2 in tiles if roi_mask[y1:y2, x1:x2].any()]
+                ys, xs = np.nonzero(roi_mask)
+                full = [(int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)] if len(xs) else []
+            if not self.full_frame or len(tiles) < 2:
+                full = []
+            layout = self._layout[(width, height)] = tiles, roi_mask, full
+        return layout
+
+    def _merge(self, frame, boxes, scores, sources, tiles):
+        if not boxes:
+            return self.empty()
+        boxes, scores = merge_boxes(np.concatenate(boxes), np.concatenate(scores), np.concatenate(sources), tiles,
+                                    self.iou_threshold, self.border_margin)
+        if len(boxes) and self.rois:
+            _, roi_mask, _ = self._tiles(frame.shape[1], frame.shape[0])
+            x = np.clip(((boxes[:, 0] + boxes[:, 2]) / 2).astype(np.int32), 0, frame.shape[1] - 1)
+            y = np.clip(((boxes[:, 1] + boxes[:, 3]) / 2).astype(np.int32), 0, frame.shape[0] - 1)
+            inside = roi_mask[y, x] > 0
+            boxes, scores = boxes[inside], scores[inside]
+        return boxes.astype(np.int32), scores.astype(np.float32)
+
+
+# Wrap `backend` for an inference mode: "full" (unchanged), "tiles", "roi" (tiles overlapping `rois`)
+# or "motion" (tiles with motion, limited to `rois` if given). `full_frame` None runs the full-frame pass
+# in the tiles and motion modes but not in the roi mode, where the ROIs are usually small enough for tiles.
+def tiled_backend(backend, mode="full", tile_size=960, overlap=0.2, rois=None, full_frame=None,
+                  refresh_interval=15):
+    if mode == "full":
+        return backend
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode: {mode}")
+    if mode == "roi" and not rois:
+        raise ValueError("Inference mode roi needs at least one ROI polygon")
+    if full_frame is None:
+        full_frame = mode != "roi"
+    return TiledBackend(backend, tile_size, overlap, full_frame, rois if mode in ("roi", "motion") else None,
+                        motion=mode == "motion", refresh_interval=refresh_interval)
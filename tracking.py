@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class Track:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.hits = 1
+        self.missed = 0
+
+
+# Pairwise IoU between two sets of xyxy boxes, shape (len(a), len(b))
+def box_iou(a, b):
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+
+# Greedy IoU tracker: every detection is matched to the live track it overlaps most,
+# unmatched detections start new tracks and tracks unseen for max_missed updates are dropped.
+class IouTracker:
+    def __init__(self, iou_threshold=0.3, max_missed=15):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 1
+
+    # Returns the tracks matched in this update, in the same order as `boxes`
+    def update(self, boxes):
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        matched = [None] * len(boxes)
+        free_tracks = set(range(len(self.tracks)))
+
+        if len(boxes) and self.tracks:
+            iou = box_iou(boxes, [track.box for track in self.tracks])
+            for flat_index in np.argsort(iou, axis=None)[::-1]:
+                box_index, track_index = np.unravel_index(flat_index, iou.shape)
+                if iou[box_index, track_index] < self.iou_threshold:
+                    break
+                if matched[box_index] is not None or track_index not in free_tracks:
+                    continue
+                track = self.tracks[track_index]
+                track.box = boxes[box_index]
+                track.hits += 1
+                track.missed = 0
+                matched[box_index] = track
+                free_tracks.discard(track_index)
+
+        for track_index in free_tracks:
+            self.tracks[track_index].missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for box_index, box in enumerate(boxes):
+            if matched[box_index] is None:
+                track = Track(self._next_id, box)
+                self._next_id += 1
+                self.tracks.append(track)
+                matched[box_index] = track
+        return matched
+
+
+# Enrichment results keyed by track ID, with TTL expiry and LRU eviction.
+# A track is marked pending while its request is in flight so it is not submitted twice;
+# a pending mark older than pending_timeout is ignored (the request failed or was dropped).
+class ResultCache:
+    def __init__(self, ttl=30.0, capacity=256, pending_timeout=15.0):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.pending_timeout = pending_timeout
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def get(self, track_id):
+        with self._lock:
+            entry = self._results.get(track_id)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._results[track_id]
+                return None
+            self._results.move_to_end(track_id)
+            return result
+
+    def put(self, track_id, result):
+        with self._lock:
+            self._pending.pop(track_id, None)
+            self._results[track_id] = (time.monotonic(), result)
+            self._results.move_to_end(track_id)
+            while len(self._results) > self.capacity:
+                self._results.popitem(last=False)
+
+    # Undo a claim whose request was not sent, so the track can be claimed again on the next frame
+    def release(self, track_id):
+        with self._lock:
+            if self._pending.pop(track_id, None) is not None:
+                self.misses -= 1
+
+    # True (and marks the track pending) when the track has no fresh result and no request in flight
+    def claim(self, track_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._results.get(track_id)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self.hits += 1
+                return False
+            pending_since = self._pending.get(track_id)
+            if pending_since is not None and now - pending_since <= self.pending_timeout:
+                return False
+            self.misses += 1
+            self._pending[track_id] = now
+            if len(self._pending) > self.capacity:
+                oldest = min(self._pending, key=self._pending.get)
+                del self._pending[oldest]
+            return True